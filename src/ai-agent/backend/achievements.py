@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Let Gemini rewrite unlock messages in the background; the catalog message
+# is served until one is ready
+PERSONALIZE = os.getenv("ACHIEVEMENT_PERSONALIZATION", "true").lower() != "false"
+
+# How long to wait before asking again for a message that failed to generate
+RETRY_SECONDS = float(os.getenv("ACHIEVEMENT_MESSAGE_RETRY_SECONDS", "300"))
+
+# Rules, all evaluated against get_user_stats() output:
+#   {"type": "always"}
+#   {"type": "threshold", "stat": <user_progress column>, "value": n}
+#   {"type": "streak", "days": n}  - longest streak, so a badge stays earned
+#   {"type": "category", "category": <challenge category>, "count": n}
+# ``requirement`` is formatted with the remaining amount and the target.
+CATALOG = [
+    {
+        "id": "first_login", "name": "Welcome Aboard!", "emoji": "👋",
+        "description": "You've started your financial journey",
+        "unlocked_description": "You've started your financial journey",
+        "unlocked_message": "Welcome to BankQuest! Your financial adventure begins now!",
+        "requirement": "Sign in to start",
+        "rule": {"type": "always"},
+    },
+    {
+        "id": "level_up", "name": "Rising Star", "emoji": "⭐",
+        "description": "Reach level 2",
+        "unlocked_description": "Reached level 2",
+        "unlocked_message": "You're leveling up your financial game!",
+        "requirement": "Reach level {target}",
+        "rule": {"type": "threshold", "stat": "level", "value": 2},
+    },
+    {
+        "id": "first_challenge", "name": "Challenge Accepted", "emoji": "🎯",
+        "description": "Complete your first challenge",
+        "unlocked_description": "Completed your first challenge",
+        "unlocked_message": "Great job completing your first challenge!",
+        "requirement": "Complete your first challenge",
+        "rule": {"type": "threshold", "stat": "completed_challenges", "value": 1},
+    },
+    {
+        "id": "challenge_master", "name": "Challenge Master", "emoji": "🏆",
+        "description": "Complete 5 challenges",
+        "unlocked_description": "Completed 5 challenges",
+        "unlocked_message": "You're becoming a financial challenge master!",
+        "requirement": "Complete {remaining} more challenges",
+        "rule": {"type": "threshold", "stat": "completed_challenges", "value": 5},
+    },
+    {
+        "id": "streak_starter", "name": "Streak Starter", "emoji": "🔥",
+        "description": "Build a 3-day streak",
+        "unlocked_description": "Built a 3-day streak",
+        "unlocked_message": "You're on fire with that 3-day streak!",
+        "requirement": "Keep your streak going {remaining} more days",
+        "rule": {"type": "streak", "days": 3},
+    },
+    {
+        "id": "week_warrior", "name": "Week Warrior", "emoji": "💪",
+        "description": "Build a 7-day streak",
+        "unlocked_description": "Built a 7-day streak",
+        "unlocked_message": "Amazing! A full week of consistent financial habits!",
+        "requirement": "Keep your streak going {remaining} more days",
+        "rule": {"type": "streak", "days": 7},
+    },
+    {
+        "id": "goal_setter", "name": "Goal Setter", "emoji": "🎯",
+        "description": "Set your first financial goal",
+        "unlocked_description": "Set your first financial goal",
+        "unlocked_message": "Excellent! You've set your first financial goal!",
+        "requirement": "Set a financial goal",
+        "rule": {"type": "threshold", "stat": "goals_set", "value": 1},
+    },
+    {
+        "id": "xp_collector", "name": "XP Collector", "emoji": "💎",
+        "description": "Earn 100+ XP",
+        "unlocked_description": "Earned 100+ XP",
+        "unlocked_message": "You're collecting XP like a pro!",
+        "requirement": "Earn {remaining} more XP",
+        "rule": {"type": "threshold", "stat": "xp", "value": 100},
+    },
+    {
+        "id": "super_saver", "name": "Super Saver", "emoji": "🐷",
+        "description": "Complete 3 saving challenges",
+        "unlocked_description": "Completed 3 saving challenges",
+        "unlocked_message": "Your savings habit is really taking shape!",
+        "requirement": "Complete {remaining} more saving challenges",
+        "rule": {"type": "category", "category": "save_money", "count": 3},
+    },
+    {
+        "id": "frugal_fighter", "name": "Frugal Fighter", "emoji": "✂️",
+        "description": "Complete 3 spend-less challenges",
+        "unlocked_description": "Completed 3 spend-less challenges",
+        "unlocked_message": "Cutting back like a pro - your wallet thanks you!",
+        "requirement": "Complete {remaining} more spend-less challenges",
+        "rule": {"type": "category", "category": "spend_less", "count": 3},
+    },
+    {
+        "id": "budget_tracker", "name": "Budget Tracker", "emoji": "📊",
+        "description": "Complete 3 expense tracking challenges",
+        "unlocked_description": "Completed 3 expense tracking challenges",
+        "unlocked_message": "You know exactly where your money goes!",
+        "requirement": "Complete {remaining} more expense tracking challenges",
+        "rule": {"type": "category", "category": "track_expenses", "count": 3},
+    },
+    {
+        "id": "first_investment", "name": "Future Builder", "emoji": "📈",
+        "description": "Complete an investing challenge",
+        "unlocked_description": "Completed an investing challenge",
+        "unlocked_message": "Your money is starting to work for you!",
+        "requirement": "Complete an investing challenge",
+        "rule": {"type": "category", "category": "invest_money", "count": 1},
+    },
+    {
+        "id": "side_hustler", "name": "Side Hustler", "emoji": "💼",
+        "description": "Complete 2 earn-more challenges",
+        "unlocked_description": "Completed 2 earn-more challenges",
+        "unlocked_message": "Growing your income - that's next-level thinking!",
+        "requirement": "Complete {remaining} more earn-more challenges",
+        "rule": {"type": "category", "category": "earn_more", "count": 2},
+    },
+]
+
+
+def compile_rule(rule):
+    """Turn a catalog rule into ``(measure, target)``; it is met when
+    ``measure(stats) >= target``"""
+    kind = rule["type"]
+    if kind == "always":
+        return (lambda stats: 1), 1
+    if kind == "threshold":
+        stat = rule["stat"]
+        return (lambda stats: stats.get(stat) or 0), rule["value"]
+    if kind == "streak":
+        return (lambda stats: max(stats.get("longest_streak") or 0, stats.get("current_streak") or 0)), rule["days"]
+    if kind == "category":
+        category = rule["category"]
+        return (lambda stats: (stats.get("category_counts") or {}).get(category, 0)), rule["count"]
+    raise ValueError(f"Unknown achievement rule type: {kind}")
+
+
+class AchievementEngine:
+    """Evaluate the achievement catalog against a user's stats.
+
+    Rules are compiled once, so evaluating the whole catalog is a handful of
+    comparisons. Results have the shape the achievements route has always
+    returned: ``{"achievements": [...], "next_milestone": {...} or None}``.
+    """
+
+    def __init__(self, catalog=CATALOG, personalizer=None):
+        self.personalizer = personalizer
+        self._rules = []
+        seen = set()
+        for achievement in catalog:
+            if achievement["id"] in seen:
+                raise ValueError(f"Duplicate achievement id: {achievement['id']}")
+            seen.add(achievement["id"])
+            measure, target = compile_rule(achievement["rule"])
+            base = {key: achievement[key] for key in ("id", "name", "emoji")}
+            locked = {**base, "description": achievement["description"], "unlocked": False}
+            unlocked = {**base, "description": achievement["unlocked_description"], "unlocked": True}
+            self._rules.append((achievement, measure, target, locked, unlocked))
+
+    def evaluate(self, stats):
+        achievements = []
+        next_milestone = None
+        closest = -1.0
+        for achievement, measure, target, locked, unlocked in self._rules:
+            current = measure(stats)
+            if current >= target:
+                message = self.personalizer.message(achievement) if self.personalizer else None
+                achievements.append({**unlocked, "unlocked_message": message or achievement["unlocked_message"]})
+                continue
+            achievements.append(dict(locked))
+            # The locked achievement the user is proportionally closest to
+            progress = current / target
+            if progress > closest:
+                closest = progress
+                next_milestone = {
+                    "name": achievement["name"],
+                    "emoji": achievement["emoji"],
+                    "description": achievement["description"],
+                    "progress": round(progress, 2),
+                    "requirement": achievement["requirement"].format(remaining=target - current, target=target),
+                }
+        return {"achievements": achievements, "next_milestone": next_milestone}
+
+
+class MessagePersonalizer:
+    """Unlock messages written by ``generate(achievement)``, one per achievement.
+
+    Messages are generated on a background thread the first time an
+    achievement is shown unlocked and kept for the life of the process;
+    until then (or if generation fails) callers get None and use the
+    catalog message.
+    """
+
+    def __init__(self, generate, executor=None, retry_seconds=RETRY_SECONDS):
+        self.generate = generate
+        self.retry_seconds = retry_seconds
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="achievement-messages")
+        self._messages = {}
+        self._pending = set()
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def message(self, achievement):
+        achievement_id = achievement["id"]
+        message = self._messages.get(achievement_id)
+        if message is not None:
+            return message
+        with self._lock:
+            if achievement_id in self._pending:
+                return None
+            if time.monotonic() - self._failed.get(achievement_id, float("-inf")) < self.retry_seconds:
+                return None
+            self._pending.add(achievement_id)
+        self._executor.submit(self._generate, achievement)
+        return None
+
+    def _generate(self, achievement):
+        achievement_id = achievement["id"]
+        message = None
+        try:
+            message = self.generate(achievement)
+        except Exception as e:
+            print(f"Achievement message for {achievement_id} failed: {e}")
+        with self._lock:
+            if isinstance(message, str) and message:
+                self._messages[achievement_id] = message
+            else:
+                self._failed[achievement_id] = time.monotonic()
+            self._pending.discard(achievement_id)
@@ -0,0 +1,194 @@
+import time
+from datetime import datetime
+
+import numpy as np
+
+DAY = 86400
+# Day 0 (1970-01-01) was a Thursday; shifting by 3 makes weeks start on Monday
+WEEK_OFFSET = 3
+# Payments a payee needs, besides the one being scored, for its own history
+# to judge an amount; below that a payment is compared with all outflows
+MIN_PAYEE_HISTORY = 3
+# Floor on the spread of log amounts, so a payee that always charged the
+# same price does not make a small change look infinitely unusual
+MIN_LOG_SPREAD = 0.05
+
+
+def _day(value):
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp() / DAY
+    except ValueError:
+        return np.nan
+
+
+def _label(transaction, outflow):
+    """The description, else the counterparty account (as in transaction_features)"""
+    label = " ".join(str(transaction.get("description") or "").lower().split())[:40]
+    if label:
+        return label
+    counterparty = transaction.get("toAccountNum" if outflow else "fromAccountNum")
+    return f"account ...{str(counterparty)[-4:]}" if counterparty else "unknown"
+
+
+def _median(values):
+    """Upper median: np.partition alone is several times faster than np.median"""
+    middle = len(values) // 2
+    return np.partition(values, middle)[middle]
+
+
+class SpendingAnalytics:
+    """Columnar view of a user's whole transaction history.
+
+    Built once per user context: signed dollar amounts (outflows negative,
+    with the same direction rules as transaction_features), fractional days
+    since the epoch (NaN when a row has no timestamp) and payee codes, as
+    NumPy arrays in ledger order. Building it is the one per-row Python
+    pass; every statistic after that is a few vectorized passes over the
+    arrays, well under a millisecond for tens of thousands of rows.
+    """
+
+    def __init__(self, amounts, days, payees, payee_names):
+        self.amounts = amounts
+        self.days = days
+        self.payees = payees
+        self.payee_names = payee_names
+        # Derived once here, as the history does not change: income and
+        # spending per calendar week and month, and the anomaly scores, the
+        # costliest passes over the history
+        known = ~np.isnan(days)
+        weeks = np.floor((days[known] + WEEK_OFFSET) / 7).astype(np.int64)
+        months = (days[known] * DAY).astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+        self.periods = {"week": self._per_period(weeks, amounts[known]),
+                        "month": self._per_period(months, amounts[known])}
+        self.scores = self._anomaly_scores()
+
+    @staticmethod
+    def _per_period(keys, amounts):
+        """(first key, income per key, spending per key) from the first period to the last"""
+        if not len(keys):
+            return 0, np.zeros(0), np.zeros(0)
+        first = keys.min()
+        return (first, np.bincount(keys - first, weights=np.maximum(amounts, 0)),
+                np.bincount(keys - first, weights=np.maximum(-amounts, 0)))
+
+    @classmethod
+    def from_transactions(cls, transactions, account_id=None):
+        rows = [t for t in transactions or [] if isinstance(t, dict) and isinstance(t.get("amount"), (int, float))]
+        amounts = np.array([t["amount"] for t in rows], dtype=np.float64) / 100
+        senders = np.array([str(t.get("fromAccountNum")) for t in rows])
+        receivers = np.array([str(t.get("toAccountNum")) for t in rows])
+        if account_id is not None and len(rows):
+            sent = (senders == str(account_id)) & (receivers != senders) & (amounts > 0)
+            amounts[sent] = -amounts[sent]
+
+        try:
+            # Ledger timestamps are UTC; NumPy parses them without the offset
+            stamps = np.array([str(t.get("timestamp") or "NaT")[:19] for t in rows], dtype="datetime64[s]")
+            days = stamps.astype(np.float64) / DAY
+            days[np.isnat(stamps)] = np.nan
+        except ValueError:
+            days = np.array([_day(t.get("timestamp")) if t.get("timestamp") else np.nan for t in rows])
+
+        labels = [_label(t, outflow) for t, outflow in zip(rows, amounts < 0)]
+        payee_names, payees = np.unique(np.array(labels, dtype=str), return_inverse=True)
+        return cls(amounts, days, payees.astype(np.int32), payee_names.tolist())
+
+    def recent_spending(self, count=20):
+        """Total outflow, as a positive amount, among the first ``count`` rows
+        (the most recent, in ledger order)"""
+        recent = self.amounts[:count]
+        return round(float(-recent[recent < 0].sum()), 2) or 0.0
+
+    def _window(self, days, now):
+        now_day = (time.time() if now is None else now) / DAY
+        return (self.days > now_day - days) & (self.days <= now_day)
+
+    def spending(self, days, now=None):
+        """Total outflow over the trailing ``days``"""
+        window = self._window(days, now) & (self.amounts < 0)
+        return round(float(-self.amounts[window].sum()), 2) or 0.0
+
+    def rolling_spend(self, window=7, days=30, now=None):
+        """Trailing ``window``-day outflow at the end of each of the last ``days`` days, oldest first"""
+        span = days + window - 1
+        ago = np.floor((time.time() if now is None else now) / DAY) - np.floor(self.days)
+        mask = (ago >= 0) & (ago < span) & (self.amounts < 0)
+        daily = np.bincount((span - 1 - ago[mask]).astype(np.int64), weights=-self.amounts[mask], minlength=span)
+        totals = np.concatenate(([0.0], np.cumsum(daily)))
+        return np.round(totals[window:] - totals[:-window], 2).tolist()
+
+    def totals(self, period="month", limit=6):
+        """Income and spending per calendar week (Monday first) or month, the last ``limit`` periods"""
+        first, income, spent = self.periods[period]
+        periods = []
+        for offset in range(max(0, len(income) - limit), len(income)):
+            key = first + offset
+            if period == "week":
+                label = str(np.datetime64(int(key * 7 - WEEK_OFFSET), "D"))
+            else:
+                label = str(np.datetime64(int(key), "M"))
+            periods.append({"period": label, "income": round(float(income[offset]), 2),
+                            "spending": round(float(spent[offset]), 2)})
+        return periods
+
+    def savings_rate(self, days=90, now=None):
+        """Share of income over the trailing ``days`` not spent, or None without income"""
+        window = self._window(days, now)
+        amounts = self.amounts[window]
+        income = amounts[amounts > 0].sum()
+        if income <= 0:
+            return None
+        return round(float((income + amounts[amounts < 0].sum()) / income), 3)
+
+    def _anomaly_scores(self):
+        """How unusual each outflow's amount is, as a z-score of its log amount.
+
+        Each payment is compared with the rest of its payee's payments
+        (leave-one-out, so an outlier does not hide itself), or with all
+        outflows by their median and MAD while its payee has fewer than
+        MIN_PAYEE_HISTORY others. Income rows score 0.
+        """
+        scores = np.zeros(len(self.amounts))
+        out = self.amounts < 0
+        if not out.any():
+            return scores
+        x = np.log(-self.amounts[out])
+        payees = self.payees[out]
+        names = len(self.payee_names)
+        count = np.bincount(payees, minlength=names)[payees]
+        total = np.bincount(payees, weights=x, minlength=names)[payees]
+        squares = np.bincount(payees, weights=x * x, minlength=names)[payees]
+        others = np.maximum(count - 1, 1)
+        mean = (total - x) / others
+        spread = np.sqrt(np.maximum((squares - x * x) / others - mean * mean, 0))
+        by_payee = (x - mean) / np.maximum(spread, MIN_LOG_SPREAD)
+
+        median = _median(x)
+        mad = 1.4826 * _median(np.abs(x - median))
+        overall = (x - median) / max(mad, MIN_LOG_SPREAD)
+        scores[out] = np.where(count - 1 >= MIN_PAYEE_HISTORY, by_payee, overall)
+        return scores
+
+    def anomalies(self, threshold=3.5, limit=5):
+        """The most unusual outflows scoring above ``threshold``"""
+        scores = self.scores
+        flagged = np.flatnonzero(scores > threshold)
+        flagged = flagged[np.argsort(-scores[flagged])][:limit]
+        return [{
+            "payee": self.payee_names[self.payees[i]],
+            "amount": round(float(-self.amounts[i]), 2),
+            "date": None if np.isnan(self.days[i]) else str(np.datetime64(int(self.days[i]), "D")),
+            "score": round(float(scores[i]), 1),
+        } for i in flagged]
+
+    def insights(self, now=None):
+        """Everything above for GET /insights"""
+        return {
+            "transaction_count": len(self.amounts),
+            "spending": {f"{days}d": self.spending(days, now) for days in (7, 30, 90)},
+            "rolling_7d_spending": self.rolling_spend(7, 30, now),
+            "weekly": self.totals("week", 8),
+            "monthly": self.totals("month", 6),
+            "savings_rate_90d": self.savings_rate(90, now),
+            "anomalies": self.anomalies(),
+        }
@@ -0,0 +1,62 @@
+import threading
+
+from deadline import DeadlineExceeded
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Answer calls that arrive together with one call for all of them.
+
+    The first caller opens a batch and waits up to ``window`` seconds (or
+    until ``max_items`` callers joined), then runs ``run(items)``, which
+    must return one result per item in order. The other callers block and
+    receive their own result (or the exception); a caller that is not the
+    leader gives up after its own ``timeout`` with DeadlineExceeded.
+    """
+
+    def __init__(self, run, max_items=20, window=0.02):
+        self.run = run
+        self.max_items = max_items
+        self.window = window
+        self._lock = threading.Lock()
+        self._open = None
+
+    def submit(self, item, timeout=None):
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            index = len(batch.items)
+            batch.items.append(item)
+            if len(batch.items) >= self.max_items:
+                self._open = None
+                batch.full.set()
+
+        if not leader:
+            if not batch.done.wait(timeout):
+                raise DeadlineExceeded(f"gave up waiting {timeout:.2f}s for the batch")
+            if batch.error is not None:
+                raise batch.error
+            return batch.results[index]
+
+        batch.full.wait(self.window)
+        with self._lock:
+            if self._open is batch:
+                self._open = None
+        try:
+            batch.results = self.run(list(batch.items))
+        except BaseException as e:
+            batch.error = e
+            raise
+        finally:
+            batch.done.set()
+        return batch.results[index]
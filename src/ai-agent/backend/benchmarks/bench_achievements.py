@@ -0,0 +1,37 @@
+"""
+Latency of evaluating the achievement catalog.
+
+Evaluates the compiled catalog against random user stats and reports the
+time per call. Run from src/ai-agent/backend:
+    python -m benchmarks.bench_achievements [calls]
+"""
+import random
+import sys
+import time
+
+from achievements import AchievementEngine
+
+CATEGORIES = ("save_money", "invest_money", "spend_less", "track_expenses", "earn_more")
+
+
+def main(calls=100_000):
+    rng = random.Random(42)
+    users = []
+    for _ in range(1000):
+        xp = rng.randrange(1000)
+        users.append({
+            "xp": xp, "level": xp // 100 + 1, "completed_challenges": rng.randrange(20),
+            "current_streak": rng.randrange(10), "longest_streak": rng.randrange(10, 20),
+            "goals_set": rng.randrange(3),
+            "category_counts": {c: rng.randrange(4) for c in CATEGORIES if rng.random() < 0.5},
+        })
+    engine = AchievementEngine()
+    start = time.perf_counter()
+    for i in range(calls):
+        engine.evaluate(users[i % len(users)])
+    elapsed = time.perf_counter() - start
+    print(f"evaluate: {calls / elapsed:,.0f} calls/s ({elapsed / calls * 1e6:.1f} us/call)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
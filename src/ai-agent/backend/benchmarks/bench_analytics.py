@@ -0,0 +1,54 @@
+"""
+Spending statistics before and after the columnar analytics.
+
+The old path is the per-dict loop build_challenge_profile ran over the 20
+most recent transactions (copying each one to convert cents to dollars);
+the new path builds SpendingAnalytics once from the whole history, as the
+user context does, and then answers recent_spending and every /insights
+statistic over all of it. Timed for ledger-style histories of several
+lengths.
+Run from src/ai-agent/backend:
+    python -m benchmarks.bench_analytics [repeats]
+"""
+import sys
+import time
+
+from analytics import SpendingAnalytics
+from benchmarks.bench_prompts import ACCOUNT, _history
+
+
+def _legacy_recent_spending(transactions):
+    """The loop build_challenge_profile used before analytics"""
+    recent_spending = 0
+    for t in transactions[:20]:
+        if isinstance(t, dict) and 'amount' in t:
+            t_copy = t.copy()
+            if isinstance(t_copy['amount'], (int, float)):
+                t_copy['amount'] = t_copy['amount'] / 100
+            recent_spending += t_copy['amount']
+    return recent_spending
+
+
+def _time(repeats, call):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        call()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def main(repeats=200):
+    for count in (1000, 10000, 50000):
+        transactions = _history(count)
+        legacy_us = _time(repeats, lambda: _legacy_recent_spending(transactions))
+        build_us = _time(max(repeats // 20, 1), lambda: SpendingAnalytics.from_transactions(transactions, ACCOUNT))
+        analytics = SpendingAnalytics.from_transactions(transactions, ACCOUNT)
+        recent_us = _time(repeats, lambda: analytics.recent_spending(20))
+        insights_us = _time(repeats, analytics.insights)
+        print(f"{count:>6} transactions  before: last 20 {legacy_us:>6.1f}us  |  "
+              f"after: build {build_us / 1000:>6.1f}ms (once per context), "
+              f"recent {recent_us:>5.1f}us, full-history insights {insights_us:>6.1f}us")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 200)
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark of database.py operations under concurrent threads.
+
+Compares the old access pattern (a fresh sqlite3 connection per call in
+rollback-journal mode, plus a sqlite_master lookup in get_latest_goal) with
+the per-thread WAL connections now used by database.py. Each thread runs a
+request-like mix: three goal reads, one goal write and one challenge write.
+Run from src/ai-agent/backend:
+    python -m benchmarks.bench_database [threads] [seconds]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+import database
+
+CHALLENGE = {"challenge": "Skip takeout twice this week", "difficulty": "easy",
+             "category": "food", "xp_reward": 50, "time_to_complete": "1 week"}
+
+
+def _legacy_conn():
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _legacy_get_latest_goal(user_id):
+    conn = _legacy_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='goals'")
+    cur.fetchone()
+    cur.execute("SELECT id, goal_text, status, parsed_goal, parse_source, created_at FROM goals "
+                "WHERE user_id=? ORDER BY id DESC LIMIT 1", (user_id,))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+
+def _legacy_set_goal(user_id, goal_text):
+    conn = _legacy_conn()
+    conn.execute("INSERT INTO goals(user_id, goal_text) VALUES(?, ?)", (user_id, goal_text))
+    conn.commit()
+    conn.close()
+
+
+def _legacy_save_challenge(user_id, challenge):
+    conn = _legacy_conn()
+    database._insert_challenge(conn.cursor(), user_id, challenge, 'active')
+    conn.commit()
+    conn.close()
+
+
+LEGACY = (_legacy_get_latest_goal, _legacy_set_goal, _legacy_save_challenge)
+POOLED = (database.get_latest_goal, database.set_goal, database.save_challenge)
+
+
+def _run(ops, threads, seconds):
+    get_latest_goal, set_goal, save_challenge = ops
+    counts = [0] * threads
+    stop = threading.Event()
+
+    def worker(n):
+        user = f"user{n}"
+        while not stop.is_set():
+            for _ in range(3):
+                get_latest_goal(user)
+            set_goal(user, "Save $500 for vacation")
+            save_challenge(user, CHALLENGE)
+            counts[n] += 5
+        database.close_conn()
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    return sum(counts) / seconds
+
+
+def main(threads=4, seconds=3.0):
+    print(f"{threads} threads, {seconds:.0f}s per mode")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = {}
+        for mode, ops in (("legacy", LEGACY), ("pooled", POOLED)):
+            with patch("database.DB_PATH", os.path.join(tmpdir, f"{mode}.db")):
+                if mode == "legacy":
+                    # Schema only, in the default rollback-journal mode
+                    with patch("database.get_conn", _legacy_conn):
+                        database.init_db()
+                else:
+                    database.init_db()
+                    database.close_conn()
+                results[mode] = _run(ops, threads, seconds)
+            print(f"{mode:>6}: {results[mode]:,.0f} ops/s")
+        print(f"speedup: {results['pooled'] / results['legacy']:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 3.0)
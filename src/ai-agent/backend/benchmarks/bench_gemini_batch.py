@@ -0,0 +1,54 @@
+"""
+LLM calls and wall time for streak messages: one call per user vs packed.
+
+Runs generate_streak_message once per user, then generate_streak_messages
+with the default batch size, against a local Gemini stub whose latency is a
+fixed per-call cost plus a per-item cost for the generated output. Figures
+are reported per 1,000 users. Run from src/ai-agent/backend:
+    python -m benchmarks.bench_gemini_batch [users] [call_delay_s] [item_delay_s]
+"""
+import json
+import re
+import sys
+import time
+
+from gemini_client import BATCH_SIZE, STREAK_MESSAGE_EXAMPLE, GeminiClient
+from http_session import create_session
+from tests.gemini_stub import GeminiStub, gemini_response
+
+
+def _responder(item_delay):
+    def respond(path, body):
+        prompt = body["contents"][0]["parts"][0]["text"]
+        indexes = [int(i) for i in re.findall(r"^\s*(\d+)\. Current streak:", prompt, re.M)]
+        time.sleep(item_delay * max(1, len(indexes)))
+        if not indexes:
+            return 200, gemini_response(json.dumps(STREAK_MESSAGE_EXAMPLE))
+        return 200, gemini_response(json.dumps([dict(STREAK_MESSAGE_EXAMPLE, index=i) for i in indexes]))
+    return respond
+
+
+def _run(label, users, fn, stub):
+    before = len(stub.requests)
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    calls = len(stub.requests) - before
+    prompt_chars = sum(len(r["body"]["contents"][0]["parts"][0]["text"]) for r in stub.requests[before:])
+    scale = 1000 / users
+    print(f"{label:>10}: {calls * scale:>7,.0f} calls  {elapsed * scale:>7.1f}s  "
+          f"{prompt_chars * scale / 1000:>7,.0f}k prompt chars  per 1,000 users")
+
+
+def main(users=200, call_delay=0.05, item_delay=0.005):
+    streaks = [{"current_streak": i % 30, "longest_streak": i % 45, "last_challenge": "Skip one coffee",
+                "recent_progress": f"{i % 5} challenges completed this week"} for i in range(users)]
+    with GeminiStub(responder=_responder(item_delay), delay=call_delay) as stub:
+        client = GeminiClient(api_key="bench", base_url=stub.base_url, session=create_session())
+        _run("per-user", users, lambda: [client.generate_streak_message(s) for s in streaks], stub)
+        _run(f"batch={BATCH_SIZE}", users, lambda: client.generate_streak_messages(streaks), stub)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 200, *(float(arg) for arg in args[1:3]))
@@ -0,0 +1,65 @@
+"""
+Compare bare requests.post against the pooled session over TLS.
+
+Run from src/ai-agent/backend:
+    python -m benchmarks.bench_http_session [calls]
+"""
+import sys
+import time
+
+import requests
+
+from gemini_client import GeminiClient
+from http_session import create_session
+from tests.gemini_stub import GeminiStub
+
+
+def _run(client, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        client.generate_challenge({"balance": 1500, "recent_spending": 120})
+    return time.perf_counter() - start
+
+
+class _StubClient(GeminiClient):
+    """GeminiClient that trusts the stub's self-signed certificate"""
+
+    def __init__(self, certfile, **kwargs):
+        super().__init__(**kwargs)
+        self.certfile = certfile
+
+    def _post(self, url, **kwargs):
+        return super()._post(url, verify=self.certfile, **kwargs)
+
+
+class _BareClient(_StubClient):
+    """GeminiClient as it was before pooling: one requests.post per call"""
+
+    def _post(self, url, method=None, **kwargs):
+        return requests.post(url, verify=self.certfile, **kwargs)
+
+
+def main(calls=200):
+    with GeminiStub(tls=True) as stub:
+        bare = _BareClient(stub.certfile, api_key="bench", base_url=stub.base_url)
+        pooled = _StubClient(stub.certfile, api_key="bench", base_url=stub.base_url,
+                             session=create_session())
+
+        # Warm up interpreter and the pooled connection
+        _run(pooled, 5)
+        stub.connections = 0
+        pooled_time = _run(pooled, calls)
+        pooled_conns = stub.connections
+
+        stub.connections = 0
+        bare_time = _run(bare, calls)
+        bare_conns = stub.connections
+
+    print(f"calls:  {calls}")
+    print(f"bare:   {bare_time * 1000 / calls:.2f} ms/call, {bare_conns} TLS handshakes")
+    print(f"pooled: {pooled_time * 1000 / calls:.2f} ms/call, {pooled_conns} TLS handshakes")
+    print(f"saved:  {(bare_time - pooled_time) * 1000 / calls:.2f} ms/call")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
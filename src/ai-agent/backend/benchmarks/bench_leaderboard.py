@@ -0,0 +1,52 @@
+"""
+Throughput of leaderboard rank lookups and XP updates.
+
+Fills a Leaderboard with random XP for N users, then times random XP
+updates, rank lookups, top-10 and neighbor queries. For comparison, the
+rank of a user is also computed by sorting every user's XP (what answering
+the question without a materialized ranking costs). Run from
+src/ai-agent/backend:
+    python -m benchmarks.bench_leaderboard [users]
+"""
+import random
+import sys
+import time
+
+from leaderboard import Leaderboard
+
+
+def _rate(label, count, fn):
+    start = time.perf_counter()
+    for i in range(count):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>22}: {count / elapsed:>12,.0f} ops/s ({elapsed / count * 1e6:.1f} us/op)")
+
+
+def main(users=200_000):
+    rng = random.Random(42)
+    ids = [f"user{i}" for i in range(users)]
+    rows = [(user_id, rng.randrange(10_000)) for user_id in ids]
+    board = Leaderboard()
+    start = time.perf_counter()
+    board.load(lambda since: (None, rows))
+    print(f"loaded {users:,} users in {time.perf_counter() - start:.2f}s")
+
+    picks = [rng.choice(ids) for _ in range(100_000)]
+    xp = dict(board._xp)
+
+    def update(i):
+        user_id = picks[i]
+        xp[user_id] += rng.randrange(10, 100)
+        board.update(user_id, xp[user_id])
+
+    _rate("xp update", 100_000, update)
+    _rate("rank lookup", 100_000, lambda i: board.rank(picks[i]))
+    _rate("top 10", 100_000, lambda i: board.top(10))
+    _rate("neighbors (+/-2)", 100_000, lambda i: board.around(picks[i], 2))
+    _rate("rank by full sort", 5, lambda i: sorted(xp.items(), key=lambda item: (-item[1], item[0]))
+          .index((picks[i], xp[picks[i]])))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
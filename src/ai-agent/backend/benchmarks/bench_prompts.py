@@ -0,0 +1,84 @@
+"""
+Prompt size and Gemini latency before and after transaction features.
+
+Builds the additional-tasks prompt the old way (the repr of the last 10
+transaction dicts, swapped in for the summary) and the new way (the
+fixed-size summary of the whole history), for ledger-style histories of
+several lengths, and sends both to
+a local Gemini stub whose latency is a fixed per-call cost plus a prefill
+cost per 1,000 prompt characters. Also times the feature extraction itself.
+Run from src/ai-agent/backend:
+    python -m benchmarks.bench_prompts [calls] [call_delay_s] [prefill_s_per_1k_chars]
+"""
+import random
+import sys
+import time
+from unittest.mock import patch
+
+from gemini_client import GeminiClient
+from http_session import create_session
+from tests.gemini_stub import GeminiStub, canned_responder
+from transaction_features import summarize_transactions
+
+ACCOUNT = "1011226111"
+PAYEES = [("Coffee", 450), ("Lunch", 1400), ("Groceries", 8500), ("Gas", 4200), ("Netflix", 1599),
+          ("Phone bill", 6500), ("Rent", 150000), ("Amazon", 3200), ("Movie", 1800)]
+
+
+def _history(count, seed=1):
+    rng = random.Random(seed)
+    transactions = []
+    for i in range(count):
+        day = i * 30 // max(count, 1)
+        timestamp = f"2025-06-{day % 28 + 1:02d}T12:00:00.000+00:00"
+        if i % 15 == 0:
+            transactions.append({"transactionId": 9000000 + i, "fromAccountNum": "3000000002",
+                                 "fromRoutingNum": "883745000", "toAccountNum": ACCOUNT, "toRoutingNum": "883745000",
+                                 "amount": 300000, "description": "Payroll", "timestamp": timestamp})
+            continue
+        label, cents = rng.choice(PAYEES)
+        transactions.append({"transactionId": 9000000 + i, "fromAccountNum": ACCOUNT, "fromRoutingNum": "883745000",
+                             "toAccountNum": "2000000001", "toRoutingNum": "883745000",
+                             "amount": cents + rng.randint(0, 99), "description": label, "timestamp": timestamp})
+    return transactions
+
+
+def _legacy_describe(transactions):
+    """Stands in for describe(): the raw repr of the last 10 transactions, as before"""
+    return lambda features, payees=True: f"- Recent transactions: {transactions[:10]}"
+
+
+def _run(label, calls, client, context, stub):
+    before = len(stub.requests)
+    start = time.perf_counter()
+    for _ in range(calls):
+        client.generate_additional_tasks(context)
+    elapsed = (time.perf_counter() - start) / calls
+    prompt = stub.requests[-1]["body"]["contents"][0]["parts"][0]["text"]
+    assert len(stub.requests) - before == calls
+    return f"{label}: {len(prompt):>6,} chars (~{len(prompt) // 4:>5,} tokens) {elapsed * 1000:>6.1f}ms"
+
+
+def main(calls=20, call_delay=0.05, prefill=0.02):
+    def responder(path, body):
+        time.sleep(prefill * len(body["contents"][0]["parts"][0]["text"]) / 1000)
+        return canned_responder(path, body)
+
+    with GeminiStub(responder=responder, delay=call_delay) as stub:
+        client = GeminiClient(api_key="bench", base_url=stub.base_url, session=create_session())
+        for count in (10, 100, 1000):
+            transactions = _history(count)
+            start = time.perf_counter()
+            for _ in range(100):
+                features = summarize_transactions(transactions, ACCOUNT)
+            extract_us = (time.perf_counter() - start) / 100 * 1e6
+            context = {"balance": 2500.0, "user_goal": "Save $500 for vacation", "features": features}
+            with patch("gemini_client.describe", _legacy_describe(transactions)):
+                before = _run("before", calls, client, context, stub)
+            after = _run("after", calls, client, context, stub)
+            print(f"{count:>5} transactions  {before}  |  {after}  (extraction {extract_us:,.0f}us)")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 20, *(float(arg) for arg in args[1:3]))
@@ -0,0 +1,98 @@
+"""
+Load test comparing SERVING_MODE=sync and SERVING_MODE=async per worker.
+
+Starts one gunicorn worker per mode against local Gemini and ledger stubs
+(Gemini answers after a fixed delay) and fires concurrent /challenges
+requests. Run from src/ai-agent/backend:
+    python -m benchmarks.bench_serving_modes [concurrency] [gemini_delay_s]
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from tests.gemini_stub import GeminiStub
+from tests.ledger_stub import LedgerStub
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(mode, gemini, ledger, db_path):
+    port = _free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        SERVING_MODE=mode,
+        WEB_CONCURRENCY="1",
+        GEMINI_API_KEY="bench",
+        GEMINI_BASE_URL=gemini.base_url,
+        BALANCES_API_URL=ledger.url,
+        HISTORY_API_URL=ledger.url,
+        DB_PATH=db_path,
+        LLM_CACHE_ENABLED="false",
+        USER_CONTEXT_TTL="0",
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:create_app()"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if requests.get(f"{url}/ready", timeout=1).status_code == 200:
+                return proc, url
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"gunicorn ({mode}) did not start")
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def _load(url, concurrency):
+    def call(i):
+        start = time.perf_counter()
+        response = requests.get(f"{url}/challenges/user{i}",
+                                headers={"Authorization": "Bearer bench"}, timeout=300)
+        return response.status_code, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def main(concurrency=100, gemini_delay=0.5):
+    print(f"{concurrency} concurrent /challenges requests, Gemini latency {gemini_delay}s, 1 worker")
+    with GeminiStub(delay=gemini_delay) as gemini, LedgerStub() as ledger, \
+            tempfile.TemporaryDirectory() as tmpdir:
+        for mode in ("sync", "async"):
+            gemini.max_in_flight = 0
+            proc, url = _start_server(mode, gemini, ledger, os.path.join(tmpdir, f"{mode}.db"))
+            try:
+                results, elapsed = _load(url, concurrency)
+            finally:
+                proc.terminate()
+                proc.wait()
+            latencies = [latency for status, latency in results if status == 200]
+            print(f"{mode:>5}: {len(latencies)}/{concurrency} ok in {elapsed:.2f}s "
+                  f"({len(latencies) / elapsed:.1f} req/s), "
+                  f"p50 {_percentile(latencies, 0.5):.2f}s, p99 {_percentile(latencies, 0.99):.2f}s, "
+                  f"peak Gemini calls in flight: {gemini.max_in_flight}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 0.5)
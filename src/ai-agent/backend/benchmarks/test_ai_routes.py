@@ -0,0 +1,93 @@
+"""
+End-to-end latency and throughput of every AI route, offline.
+
+Each route runs through the Flask app in-process against the local Gemini
+stub (canned answers, BENCH_GEMINI_DELAY seconds per call plus up to as much
+again in jitter, default 0.05) and the ledger stub. pytest-benchmark reports
+min/mean/max and ops per second; p50, p99 and requests per second are added
+to each result's extra_info. Run from src/ai-agent/backend:
+    python -m pytest benchmarks/test_ai_routes.py --benchmark-columns=median,mean,max,ops
+"""
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import database  # noqa: E402
+import main  # noqa: E402
+from gemini_client import GeminiClient  # noqa: E402
+from http_session import create_session  # noqa: E402
+from tests.gemini_stub import FaultInjector, GeminiStub, canned_responder, canned_stream_responder  # noqa: E402
+from tests.ledger_stub import LedgerStub  # noqa: E402
+
+GEMINI_DELAY = float(os.getenv("BENCH_GEMINI_DELAY", "0.05"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "50"))
+AUTH = {"Authorization": "Bearer bench"}
+
+# (name, method, path, json body)
+ROUTES = [
+    ("challenge", "GET", "/challenges/bench-user", None),
+    ("challenge_stream", "GET", "/challenges/bench-user/stream", None),
+    ("set_goal", "POST", "/goals/bench-user", {"goal": "Save $500 for vacation"}),
+    ("goal_emoji", "POST", "/generate-emoji", {"goal": "Save for a new car"}),
+    ("streak_message", "GET", "/streak-message/bench-user", None),
+    ("leaderboard_context", "GET", "/leaderboard-context/bench-user", None),
+    ("additional_tasks", "GET", "/additional-tasks/bench-user", None),
+    ("achievements", "GET", "/achievements/bench-user", None),
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    tmpdir = tempfile.mkdtemp()
+    responder = FaultInjector(canned_responder, jitter=GEMINI_DELAY, seed=1)
+    with GeminiStub(responder=responder, stream_responder=canned_stream_responder, delay=GEMINI_DELAY) as gemini, \
+            LedgerStub() as ledger:
+        gemini_client = GeminiClient(api_key="bench", base_url=gemini.base_url, session=create_session())
+        patches = [
+            patch("database.DB_PATH", os.path.join(tmpdir, "bench.db")),
+            patch("financial_context.BALANCES_URL", ledger.url),
+            patch("financial_context.HISTORY_URL", ledger.url),
+            patch("main.get_gemini_client", return_value=gemini_client),
+            # Measure the Gemini path, not pre-generated or cached answers
+            patch.object(main.challenge_queue, "target", 0),
+            patch.object(main.user_context_cache, "ttl", 0),
+            patch.object(main.achievement_engine, "personalizer", None),
+        ]
+        for p in patches:
+            p.start()
+        try:
+            yield main.create_app().test_client()
+        finally:
+            database.flush_writes(5)
+            database.close_conn()
+            for p in reversed(patches):
+                p.stop()
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+@pytest.mark.parametrize("name,method,path,body", ROUTES, ids=[route[0] for route in ROUTES])
+def test_route(benchmark, client, name, method, path, body):
+    def call():
+        response = client.open(path, method=method, json=body, headers=AUTH)
+        response.get_data()  # drain streamed responses
+        return response.status_code
+
+    assert benchmark.pedantic(call, rounds=ROUNDS, warmup_rounds=1) == 200
+    if benchmark.stats is None:  # --benchmark-disable: routes run once as a smoke test
+        return
+    timings = benchmark.stats.stats.data
+    benchmark.extra_info.update({
+        "p50_ms": round(_percentile(timings, 0.5) * 1000, 2),
+        "p99_ms": round(_percentile(timings, 0.99) * 1000, 2),
+        "requests_per_second": round(len(timings) / sum(timings), 1),
+    })
@@ -0,0 +1,79 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database import count_queued_challenges, enqueue_challenge, pop_queued_challenge
+from rate_limiter import BACKGROUND, priority
+
+# Ready challenges kept per bucket, and background generators per worker
+QUEUE_TARGET = int(os.getenv("CHALLENGE_QUEUE_SIZE", "3"))
+REFILL_WORKERS = int(os.getenv("CHALLENGE_REFILL_WORKERS", "2"))
+
+
+def challenge_bucket(user_profile):
+    """Group users whose challenge prompts would be near-identical.
+
+    The challenge prompt depends on balance, recent spending and the
+    payee-free spending summary, so users in the same bands with the same
+    top spending category share one queue. The bands match the ones
+    _get_fallback_challenge uses to pick challenges.
+    """
+    categories = (user_profile.get('features') or {}).get('categories')
+    top_category = categories[0][0] if categories else "none"
+    balance = user_profile.get('balance', 0)
+    spending = abs(user_profile.get('recent_spending', 0))
+    if balance > 5000:
+        balance_band = "high"
+    elif balance > 1000:
+        balance_band = "medium"
+    else:
+        balance_band = "low"
+    spending_band = "heavy" if spending > 500 else "light"
+    return f"{balance_band}:{spending_band}:{top_category}"
+
+
+class ChallengeQueue:
+    """Pre-generated challenges stored in the challenges table.
+
+    ``pop`` hands out a ready challenge in one SQLite transaction and
+    schedules a background refill of that bucket. Refills call
+    ``generate(user_profile)``; it must return None instead of a canned
+    fallback, so only real Gemini challenges are queued.
+    """
+
+    def __init__(self, generate, target=QUEUE_TARGET, workers=REFILL_WORKERS):
+        self.generate = generate
+        self.target = target
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="challenge-refill")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def pop(self, user_id, user_profile):
+        bucket = challenge_bucket(user_profile)
+        challenge = pop_queued_challenge(bucket, user_id) if self.target > 0 else None
+        self.request_refill(bucket, user_profile)
+        return challenge
+
+    def request_refill(self, bucket, user_profile):
+        if self.target <= 0:
+            return None
+        with self._lock:
+            if bucket in self._pending:
+                return None
+            self._pending.add(bucket)
+        return self._executor.submit(self._refill, bucket, dict(user_profile))
+
+    def _refill(self, bucket, user_profile):
+        try:
+            while count_queued_challenges(bucket) < self.target:
+                # Nobody is waiting on a refill; users' own calls go first
+                with priority(BACKGROUND):
+                    challenge = self.generate(user_profile)
+                if not challenge:
+                    # Gemini unavailable; try again on the next pop
+                    break
+                enqueue_challenge(bucket, challenge)
+        except Exception as e:
+            print(f"Challenge queue refill for {bucket} failed: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(bucket)
@@ -0,0 +1,126 @@
+import os
+import time
+import threading
+from collections import deque
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Gemini while a breaker is open"""
+
+
+class CircuitBreaker:
+    """Error-rate and latency based circuit breaker for one Gemini method.
+
+    Outcomes of the last ``window`` calls are kept. Once at least
+    ``min_calls`` are recorded, the breaker opens when the share of failed
+    calls reaches ``failure_threshold`` or the share of calls slower than
+    ``slow_call_seconds`` reaches ``slow_call_threshold``. After
+    ``open_seconds`` it lets ``half_open_calls`` probes through: if they all
+    succeed it closes, any failure re-opens it.
+    """
+
+    def __init__(self, name, window=20, min_calls=5, failure_threshold=0.5,
+                 slow_call_seconds=10.0, slow_call_threshold=0.5,
+                 open_seconds=30.0, half_open_calls=1, clock=time.monotonic):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_threshold = slow_call_threshold
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.clock = clock
+        self.state = CLOSED
+        self.rejected = 0
+        self.opened = 0
+        self._outcomes = deque(maxlen=window)  # (failed, slow)
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_passed = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Reserve a call slot or raise CircuitOpenError"""
+        with self._lock:
+            if self.state == OPEN:
+                if self.clock() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Circuit for {self.name} is open")
+                self.state = HALF_OPEN
+                self._probes_started = 0
+                self._probes_passed = 0
+            if self.state == HALF_OPEN:
+                if self._probes_started >= self.half_open_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Circuit for {self.name} is half-open")
+                self._probes_started += 1
+
+    def record(self, success, latency):
+        with self._lock:
+            slow = latency >= self.slow_call_seconds
+            if self.state == HALF_OPEN:
+                if success and not slow:
+                    self._probes_passed += 1
+                    if self._probes_passed >= self.half_open_calls:
+                        self.state = CLOSED
+                        self._outcomes.clear()
+                else:
+                    self._trip()
+                return
+            self._outcomes.append((not success, slow))
+            if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+                calls = len(self._outcomes)
+                failures = sum(1 for failed, _ in self._outcomes if failed)
+                slow_calls = sum(1 for _, was_slow in self._outcomes if was_slow)
+                if failures / calls >= self.failure_threshold or slow_calls / calls >= self.slow_call_threshold:
+                    self._trip()
+
+    def _trip(self):
+        self.state = OPEN
+        self.opened += 1
+        self._opened_at = self.clock()
+        self._outcomes.clear()
+
+
+class CircuitBreakerRegistry:
+    """One breaker per GeminiClient method, created on first use"""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            window=int(os.getenv("GEMINI_BREAKER_WINDOW", "20")),
+            min_calls=int(os.getenv("GEMINI_BREAKER_MIN_CALLS", "5")),
+            failure_threshold=float(os.getenv("GEMINI_BREAKER_FAILURE_RATE", "0.5")),
+            slow_call_seconds=float(os.getenv("GEMINI_BREAKER_SLOW_CALL_SECONDS", "10")),
+            slow_call_threshold=float(os.getenv("GEMINI_BREAKER_SLOW_CALL_RATE", "0.5")),
+            open_seconds=float(os.getenv("GEMINI_BREAKER_OPEN_SECONDS", "30")),
+            half_open_calls=int(os.getenv("GEMINI_BREAKER_HALF_OPEN_CALLS", "1")),
+        )
+
+    def get(self, method):
+        breaker = self._breakers.get(method)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(method, CircuitBreaker(method, **self.settings))
+        return breaker
+
+    def collect(self):
+        """Metric families for metrics.REGISTRY"""
+        breakers = list(self._breakers.values())
+        return [
+            ("gemini_circuit_state", "gauge", "Circuit breaker state per method (0=closed, 1=open, 2=half-open)",
+             [("", {"method": b.name}, STATE_VALUES[b.state]) for b in breakers]),
+            ("gemini_circuit_rejected_total", "counter", "Gemini calls short-circuited to a fallback",
+             [("", {"method": b.name}, b.rejected) for b in breakers]),
+            ("gemini_circuit_opened_total", "counter", "Times a breaker tripped open",
+             [("", {"method": b.name}, b.opened) for b in breakers]),
+        ]
@@ -0,0 +1,86 @@
+import os
+import time
+import hashlib
+import threading
+from singleflight import SingleFlight
+from financial_context import fetch_financial_context
+from database import get_latest_goal
+from transaction_features import summarize_transactions
+from analytics import SpendingAnalytics
+
+# Seconds a user's balance/history/goal snapshot is reused across routes
+CONTEXT_TTL = float(os.getenv("USER_CONTEXT_TTL", "5"))
+
+
+class UserContextCache:
+    """Short-lived per-user cache of the financial context.
+
+    Entries are keyed by user and a hash of the caller's Authorization
+    header, so a cached context is only served to the token that loaded it.
+    Concurrent misses for the same key share one load. ``invalidate`` drops
+    every entry for a user and discards loads already in flight.
+    """
+
+    def __init__(self, ttl=CONTEXT_TTL):
+        self.ttl = ttl
+        self._entries = {}   # user_id -> {token_hash: (expires_at, context)}
+        self._versions = {}  # user_id -> bumped on every invalidation
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._stores = 0
+
+    def get(self, user_id, auth_header, loader):
+        token_hash = hashlib.sha256((auth_header or "").encode()).hexdigest()[:16]
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id, {}).get(token_hash)
+            if entry and entry[0] > now:
+                return entry[1]
+            version = self._versions.get(user_id, 0)
+
+        def load():
+            context = loader()
+            # Partial contexts are served once but never cached
+            if self.ttl > 0 and not context.get("partial"):
+                with self._lock:
+                    if self._versions.get(user_id, 0) == version:
+                        self._entries.setdefault(user_id, {})[token_hash] = (time.monotonic() + self.ttl, context)
+                    self._stores += 1
+                    purge = self._stores % 256 == 0
+                if purge:
+                    self.purge_expired()
+            return context
+
+        context, _ = self._flight.do((user_id, token_hash, version), load)
+        return context
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def purge_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            for user_id in list(self._entries):
+                tokens = self._entries[user_id]
+                for token_hash in [t for t, (expires_at, _) in tokens.items() if expires_at <= now]:
+                    del tokens[token_hash]
+                if not tokens:
+                    del self._entries[user_id]
+
+
+user_context_cache = UserContextCache()
+
+
+def get_user_context(user_id, auth_header):
+    """Balance, transactions (with their prompt features and columnar analytics)
+    and latest goal for a user, cached briefly"""
+    def load():
+        context = fetch_financial_context(user_id, auth_header)
+        context["features"] = summarize_transactions(context["transactions"], user_id)
+        context["analytics"] = SpendingAnalytics.from_transactions(context["transactions"], user_id)
+        context["goal"] = get_latest_goal(user_id)
+        return context
+
+    return user_context_cache.get(user_id, auth_header, load)
@@ -1,97 +1,415 @@
-import os, sqlite3
+import os, sqlite3, json, threading, atexit
+from write_behind import WriteBehindQueue
+from progress import STAT_COLUMNS, apply_completion, current_stats, empty_stats, today
+import metrics
 DB_PATH = os.getenv("DB_PATH", "ai_agent.db")
 
+# AI_AGENT_DB_URI selects the storage backend: sqlite:///<path> (the default,
+# a local file at DB_PATH) or postgresql://... for state shared by replicas
+DB_URI = os.getenv("AI_AGENT_DB_URI", "")
+if DB_URI.startswith("sqlite:///"):
+    DB_PATH = DB_URI[len("sqlite:///"):]
+
+# DB_DURABILITY=sync (the default): request-path writes (challenges served to
+# users) commit inside the request. DB_DURABILITY=batched: they are committed
+# by a background writer in multi-row transactions, and may be lost if the
+# process is killed before they are flushed or if they fail on their own
+# (counted in db_write_behind_failed_total).
+DB_DURABILITY = os.getenv("DB_DURABILITY", "sync").lower()
+WRITE_BATCH_ROWS = int(os.getenv("DB_WRITE_BATCH_ROWS", "100"))
+WRITE_BATCH_MS = int(os.getenv("DB_WRITE_BATCH_MS", "50"))
+
+# Connection tuning; synchronous=NORMAL is durable in WAL mode except for the
+# last transactions before a power loss
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "8192"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+
+try:
+    # Under gevent, threading.local is per greenlet, i.e. per request. sqlite3
+    # calls never yield to the hub, so greenlets can share their OS thread's
+    # connection instead of opening one per request.
+    from gevent.monkey import get_original
+    _local = get_original("threading", "local")()
+except ImportError:
+    _local = threading.local()
+
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+    """Return this thread's connection to DB_PATH, opening it on first use.
+
+    Connections are reused for the life of the thread (and their statement
+    cache with them), so callers commit but never close them.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.key == (DB_PATH, os.getpid()):
+        return conn
+    if conn is not None and _local.key[1] == os.getpid():
+        conn.close()
+    conn = sqlite3.connect(DB_PATH, timeout=SQLITE_BUSY_TIMEOUT, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    _local.conn, _local.key = conn, (DB_PATH, os.getpid())
     return conn
 
+def close_conn():
+    """Close this thread's connection, if it has one"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+write_behind = WriteBehindQueue(get_conn, WRITE_BATCH_ROWS, WRITE_BATCH_MS / 1000)
+
+def _add_missing_columns(cur, table: str, columns: dict):
+    existing = {row["name"] for row in cur.execute(f"PRAGMA table_info({table})")}
+    for name, sql_type in columns.items():
+        if name not in existing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+
+def challenge_row(user_id, challenge: dict, status: str, bucket: str = None):
+    """Column values for an INSERT into challenges, in table order"""
+    return (
+        user_id,
+        challenge.get("challenge"),
+        challenge.get("difficulty"),
+        challenge.get("category"),
+        challenge.get("xp_reward"),
+        challenge.get("time_to_complete"),
+        status,
+        bucket,
+        json.dumps(challenge),
+    )
+
+def _insert_challenge(cur, user_id, challenge: dict, status: str, bucket: str = None):
+    cur.execute("""
+      INSERT INTO challenges(user_id, challenge_text, difficulty, category, xp_reward, time_to_complete, status, bucket, payload)
+      VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, challenge_row(user_id, challenge, status, bucket))
+
+# Shared by both backends; named parameters work in sqlite3 and SQLAlchemy
+STATS_SELECT = f"SELECT {', '.join(STAT_COLUMNS)} FROM user_progress WHERE user_id=:user_id"
+STATS_UPSERT = (
+    f"INSERT INTO user_progress({', '.join(STAT_COLUMNS)}, updated_at)"
+    f" VALUES({', '.join(':' + c for c in STAT_COLUMNS)}, CURRENT_TIMESTAMP)"
+    f" ON CONFLICT(user_id) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in STAT_COLUMNS[1:])},"
+    " updated_at=CURRENT_TIMESTAMP"
+)
+GOALS_SET_INCREMENT = ("INSERT INTO user_progress(user_id, goals_set) VALUES(:user_id, 1)"
+                       " ON CONFLICT(user_id) DO UPDATE SET goals_set=user_progress.goals_set + 1")
+# Re-read rows updated this many seconds before the last cursor, to catch
+# transactions that committed after it with an earlier timestamp
+XP_UPDATES_OVERLAP = 5
+RECENT_CHALLENGES = ("SELECT id, challenge_text, xp_reward, category FROM challenges WHERE user_id=:user_id"
+                     " ORDER BY id DESC LIMIT :limit")
+
+def match_challenge(rows, challenge_text=None):
+    """The user's newest challenge, or the newest one with this text"""
+    for row in rows:
+        if challenge_text is None or row["challenge_text"] == challenge_text:
+            return dict(row)
+    return None
+
+
+class SQLiteStorage:
+    """Agent state in the local SQLite file at DB_PATH (one pod only)"""
+
+    write_behind = write_behind
+    insert_challenge = staticmethod(_insert_challenge)
+
+    def init_db(self):
+        conn = get_conn(); cur = conn.cursor()
+        cur.executescript("""
+        CREATE TABLE IF NOT EXISTS users (
+          id TEXT PRIMARY KEY,
+          name TEXT,
+          jwt_hash TEXT,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS goals (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          user_id TEXT,
+          goal_text TEXT,
+          status TEXT DEFAULT 'active',
+          parsed_goal TEXT,
+          parse_source TEXT,
+          parse_attempts INTEGER DEFAULT 0,
+          last_parse_attempt REAL,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS challenges (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          user_id TEXT,
+          challenge_text TEXT,
+          difficulty TEXT,
+          category TEXT,
+          xp_reward INTEGER,
+          time_to_complete TEXT,
+          status TEXT DEFAULT 'active',
+          bucket TEXT,
+          payload TEXT,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS progress (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          user_id TEXT,
+          challenge_id INTEGER,
+          completion_percentage INTEGER DEFAULT 0,
+          streak_count INTEGER DEFAULT 0,
+          last_activity DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS user_progress (
+          user_id TEXT PRIMARY KEY,
+          xp INTEGER DEFAULT 0,
+          level INTEGER DEFAULT 1,
+          completed_challenges INTEGER DEFAULT 0,
+          current_streak INTEGER DEFAULT 0,
+          longest_streak INTEGER DEFAULT 0,
+          days_active INTEGER DEFAULT 0,
+          last_active_day TEXT,
+          week_start TEXT,
+          weekly_challenges INTEGER DEFAULT 0,
+          goals_set INTEGER DEFAULT 0,
+          last_challenge TEXT,
+          category_counts TEXT,
+          updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        # Databases created before these columns existed
+        _add_missing_columns(cur, "goals", {"parsed_goal": "TEXT", "parse_source": "TEXT",
+                                            "parse_attempts": "INTEGER DEFAULT 0", "last_parse_attempt": "REAL"})
+        _add_missing_columns(cur, "challenges", {"bucket": "TEXT", "payload": "TEXT"})
+        _add_missing_columns(cur, "user_progress", {"category_counts": "TEXT"})
+        # Indexes for the per-user lookups (latest goal/challenge, progress on a
+        # challenge) and the queue pop; created after the columns they cover
+        cur.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_goals_user ON goals(user_id, id);
+        CREATE INDEX IF NOT EXISTS idx_challenges_user ON challenges(user_id, id);
+        CREATE INDEX IF NOT EXISTS idx_challenges_queued ON challenges(bucket, id) WHERE status='queued';
+        CREATE INDEX IF NOT EXISTS idx_progress_user_challenge ON progress(user_id, challenge_id);
+        CREATE INDEX IF NOT EXISTS idx_user_progress_updated ON user_progress(updated_at);
+        """)
+        conn.commit()
+
+    def set_goal(self, user_id, goal_text, parsed_goal=None, parse_source=None):
+        conn = get_conn(); cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO goals(user_id, goal_text, parsed_goal, parse_source) VALUES(?, ?, ?, ?)",
+            (user_id, goal_text, json.dumps(parsed_goal) if parsed_goal is not None else None, parse_source),
+        )
+        goal_id = cur.lastrowid
+        cur.execute(GOALS_SET_INCREMENT, {"user_id": user_id})
+        conn.commit()
+        return goal_id
+
+    def update_parsed_goal(self, goal_id, parsed_goal, parse_source):
+        conn = get_conn(); cur = conn.cursor()
+        cur.execute(
+            "UPDATE goals SET parsed_goal=?, parse_source=? WHERE id=?",
+            (json.dumps(parsed_goal), parse_source, goal_id),
+        )
+        conn.commit()
+
+    def claim_goal_reparse(self, goal_id, attempts, now):
+        conn = get_conn(); cur = conn.cursor()
+        cur.execute(
+            "UPDATE goals SET parse_attempts=?, last_parse_attempt=? WHERE id=? AND COALESCE(parse_attempts, 0)=?",
+            (attempts + 1, now, goal_id, attempts),
+        )
+        conn.commit()
+        return cur.rowcount == 1
+
+    def get_latest_goal(self, user_id):
+        # The schema is created by init_db at startup, not checked per call
+        row = get_conn().execute(
+            "SELECT id, goal_text, status, parsed_goal, parse_source, parse_attempts, last_parse_attempt, created_at FROM goals WHERE user_id=? ORDER BY id DESC LIMIT 1",
+            (user_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def save_challenge(self, user_id, challenge):
+        conn = get_conn(); cur = conn.cursor()
+        _insert_challenge(cur, user_id, challenge, 'active')
+        conn.commit()
+
+    def enqueue_challenge(self, bucket, challenge):
+        conn = get_conn(); cur = conn.cursor()
+        _insert_challenge(cur, None, challenge, 'queued', bucket)
+        conn.commit()
+
+    def count_queued_challenges(self, bucket):
+        conn = get_conn(); cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM challenges WHERE status='queued' AND bucket=?", (bucket,))
+        return cur.fetchone()[0]
+
+    def pop_queued_challenge(self, bucket, user_id):
+        conn = get_conn(); cur = conn.cursor()
+        try:
+            # Take the write lock up front so two workers never pop the same row
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute(
+                "SELECT id, payload FROM challenges WHERE status='queued' AND bucket=? ORDER BY id LIMIT 1",
+                (bucket,),
+            )
+            row = cur.fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            cur.execute(
+                "UPDATE challenges SET user_id=?, status='active', created_at=CURRENT_TIMESTAMP WHERE id=?",
+                (user_id, row["id"]),
+            )
+            conn.commit()
+            return row["payload"]
+        except Exception:
+            # The connection is reused, so never leave the write lock held
+            conn.rollback()
+            raise
+
+    def find_user_challenge(self, user_id, challenge_text=None, recent=10):
+        rows = get_conn().execute(RECENT_CHALLENGES, {"user_id": user_id, "limit": recent}).fetchall()
+        return match_challenge(rows, challenge_text)
+
+    def record_completion(self, user_id, challenge, day):
+        conn = get_conn(); cur = conn.cursor()
+        try:
+            # One writer at a time, so the aggregates are read and replaced atomically
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("SELECT 1 FROM progress WHERE user_id=? AND challenge_id=?", (user_id, challenge["id"]))
+            if cur.fetchone():
+                conn.rollback()
+                return None
+            row = cur.execute(STATS_SELECT, {"user_id": user_id}).fetchone()
+            stats = apply_completion(dict(row) if row else empty_stats(user_id), challenge["xp_reward"], day,
+                                     challenge["challenge_text"], challenge["category"])
+            cur.execute(
+                "INSERT INTO progress(user_id, challenge_id, completion_percentage, streak_count) VALUES(?, ?, 100, ?)",
+                (user_id, challenge["id"], stats["current_streak"]),
+            )
+            cur.execute(STATS_UPSERT, stats)
+            conn.commit()
+            return stats
+        except Exception:
+            conn.rollback()
+            raise
+
+    def get_user_stats(self, user_id):
+        row = get_conn().execute(STATS_SELECT, {"user_id": user_id}).fetchone()
+        return dict(row) if row else None
+
+    def xp_updates(self, since=None):
+        conn = get_conn()
+        now = conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+        if since is None:
+            rows = conn.execute("SELECT user_id, xp FROM user_progress")
+        else:
+            rows = conn.execute("SELECT user_id, xp FROM user_progress WHERE updated_at >= datetime(?, ?)",
+                                (since, f"-{XP_UPDATES_OVERLAP} seconds"))
+        return now, [tuple(row) for row in rows]
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Return the storage backend selected by AI_AGENT_DB_URI"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if DB_URI.startswith(("postgresql:", "postgresql+", "postgres:")):
+                    # Imported lazily so SQLite deployments need no SQLAlchemy
+                    from storage_postgres import PostgresStorage
+                    _storage = PostgresStorage(DB_URI, batch_rows=WRITE_BATCH_ROWS,
+                                               batch_delay=WRITE_BATCH_MS / 1000)
+                else:
+                    _storage = SQLiteStorage()
+                metrics.REGISTRY.register_collector(_storage.write_behind.collect)
+    return _storage
+
+def flush_writes(timeout=None):
+    """Commit every queued write-behind write; called on shutdown"""
+    if _storage is None:
+        return True
+    return _storage.write_behind.flush(timeout)
+
+atexit.register(flush_writes, 10)
+
 def init_db():
-    conn = get_conn(); cur = conn.cursor()
-    cur.executescript("""
-    CREATE TABLE IF NOT EXISTS users (
-      id TEXT PRIMARY KEY,
-      name TEXT,
-      jwt_hash TEXT,
-      created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    );
-    CREATE TABLE IF NOT EXISTS goals (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      user_id TEXT,
-      goal_text TEXT,
-      status TEXT DEFAULT 'active',
-      created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    );
-    CREATE TABLE IF NOT EXISTS challenges (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      user_id TEXT,
-      challenge_text TEXT,
-      difficulty TEXT,
-      category TEXT,
-      xp_reward INTEGER,
-      time_to_complete TEXT,
-      status TEXT DEFAULT 'active',
-      created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    );
-    CREATE TABLE IF NOT EXISTS progress (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      user_id TEXT,
-      challenge_id INTEGER,
-      completion_percentage INTEGER DEFAULT 0,
-      streak_count INTEGER DEFAULT 0,
-      last_activity DATETIME DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
-    conn.commit(); conn.close()
-
-def set_goal(user_id: str, goal_text: str):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("INSERT INTO goals(user_id, goal_text) VALUES(?, ?)", (user_id, goal_text))
-    conn.commit(); conn.close()
+    """Create and migrate the schema; run once at startup"""
+    get_storage().init_db()
+
+def set_goal(user_id: str, goal_text: str, parsed_goal: dict = None, parse_source: str = None):
+    """Store a goal with its parsed structure; returns the new goal id"""
+    return get_storage().set_goal(user_id, goal_text, parsed_goal, parse_source)
+
+def update_parsed_goal(goal_id: int, parsed_goal: dict, parse_source: str):
+    get_storage().update_parsed_goal(goal_id, parsed_goal, parse_source)
+
+def claim_goal_reparse(goal_id: int, attempts: int, now: float):
+    """Record a re-parse attempt if ``attempts`` were made so far; False when
+    another worker claimed it first"""
+    return get_storage().claim_goal_reparse(goal_id, attempts, now)
 
 def get_latest_goal(user_id: str):
     try:
-        print(f"Database: Getting goal for user {user_id}")
-        conn = get_conn()
-        cur = conn.cursor()
-        
-        # First check if the goals table exists
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='goals'")
-        table_exists = cur.fetchone()
-        print(f"Goals table exists: {table_exists is not None}")
-        
-        if not table_exists:
-            print("Goals table doesn't exist, initializing database...")
-            conn.close()
-            init_db()
-            conn = get_conn()
-            cur = conn.cursor()
-        
-        cur.execute("SELECT goal_text, status, created_at FROM goals WHERE user_id=? ORDER BY id DESC LIMIT 1", (user_id,))
-        row = cur.fetchone()
-        print(f"Database query result: {row}")
-        conn.close()
-        return dict(row) if row else None
+        goal = get_storage().get_latest_goal(user_id)
     except Exception as e:
         print(f"Database error in get_latest_goal: {str(e)}")
-        print(f"Database path: {DB_PATH}")
-        try:
-            conn.close()
-        except:
-            pass
+        print(f"Database URI: {DB_URI or 'sqlite:///' + DB_PATH}")
         raise e
+    if goal is None:
+        return None
+    goal["parsed_goal"] = json.loads(goal["parsed_goal"]) if goal["parsed_goal"] else None
+    return goal
 
 def save_challenge(user_id: str, challenge: dict):
-    conn = get_conn(); cur = conn.cursor()
-    cur.execute("""
-      INSERT INTO challenges(user_id, challenge_text, difficulty, category, xp_reward, time_to_complete)
-      VALUES(?, ?, ?, ?, ?, ?)
-    """, (
-        user_id,
-        challenge.get("challenge"),
-        challenge.get("difficulty"),
-        challenge.get("category"),
-        challenge.get("xp_reward"),
-        challenge.get("time_to_complete"),
-    ))
-    conn.commit(); conn.close()
\ No newline at end of file
+    storage = get_storage()
+    if DB_DURABILITY == "batched":
+        storage.write_behind.submit(storage.insert_challenge, user_id, challenge, 'active')
+        return
+    storage.save_challenge(user_id, challenge)
+
+def enqueue_challenge(bucket: str, challenge: dict):
+    """Store a pre-generated challenge, not yet assigned to a user"""
+    get_storage().enqueue_challenge(bucket, challenge)
+
+def count_queued_challenges(bucket: str) -> int:
+    return get_storage().count_queued_challenges(bucket)
+
+def pop_queued_challenge(bucket: str, user_id: str):
+    """Assign the oldest queued challenge in a bucket to a user, or return None"""
+    payload = get_storage().pop_queued_challenge(bucket, user_id)
+    return json.loads(payload) if payload is not None else None
+
+def find_user_challenge(user_id: str, challenge_text: str = None):
+    """The user's most recent challenge (id, challenge_text, xp_reward), or
+    the most recent one with ``challenge_text``; None if there is none"""
+    storage = get_storage()
+    challenge = storage.find_user_challenge(user_id, challenge_text)
+    if challenge is None and flush_writes(2):
+        # It may have been served moments ago and still be in the write-behind queue
+        challenge = storage.find_user_challenge(user_id, challenge_text)
+    return challenge
+
+def record_completion(user_id: str, challenge: dict, day=None):
+    """Record a completed challenge and update the user's aggregates in O(1).
+
+    Returns the new aggregates, or None if this challenge was already completed.
+    """
+    day = day or today()
+    stats = get_storage().record_completion(user_id, challenge, day)
+    return current_stats(stats, day) if stats is not None else None
+
+def leaderboard_updates(since=None):
+    """(cursor, [(user_id, xp)]) for every user, or only those updated since
+    an earlier cursor; feeds leaderboard.Leaderboard"""
+    return get_storage().xp_updates(since)
+
+def get_user_stats(user_id: str, day=None):
+    """XP, level, streaks and weekly counts for a user, as of ``day``"""
+    stats = get_storage().get_user_stats(user_id) or empty_stats(user_id)
+    return current_stats(stats, day or today())
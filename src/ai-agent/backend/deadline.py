@@ -0,0 +1,97 @@
+import os
+import time
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds each route may take end to end, from the ledger lookups to the
+# last Gemini call. ROUTE_BUDGET_<VIEW NAME> overrides one, e.g.
+# ROUTE_BUDGET_GET_CHALLENGE=8
+DEFAULT_ROUTE_BUDGET = float(os.getenv("ROUTE_BUDGET_DEFAULT", "10"))
+ROUTE_BUDGETS = {
+    "get_challenge": 12.0,
+    "stream_challenge": 30.0,
+    "set_goal": 8.0,
+    "get_goal": 8.0,
+    "generate_emoji": 3.0,
+    "get_streak_message": 6.0,
+    "get_leaderboard_context": 6.0,
+    "get_additional_tasks": 12.0,
+}
+
+_current = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting work the request no longer has time for"""
+
+
+class Deadline:
+    """A point in time a request must answer by"""
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def __repr__(self):
+        return f"Deadline({self.remaining():.3f}s of {self.seconds}s left)"
+
+
+@contextmanager
+def activate(deadline):
+    """Make ``deadline`` the current one inside the block"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def current():
+    """The deadline of the request being handled, or None outside one"""
+    return _current.get()
+
+
+def timeout(default, reserve=0.0):
+    """``default`` seconds, cut to what is left of the current deadline
+    (less ``reserve`` kept back for later hops)"""
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    return max(0.0, min(default, deadline.remaining() - reserve))
+
+
+def within(deadline, iterable):
+    """Iterate ``iterable`` with ``deadline`` current for each step.
+
+    For generators that run after the view returned, such as streamed
+    response bodies.
+    """
+    iterator = iter(iterable)
+    while True:
+        with activate(deadline):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def route_budget(name):
+    return float(os.getenv(f"ROUTE_BUDGET_{name.upper()}", ROUTE_BUDGETS.get(name, DEFAULT_ROUTE_BUDGET)))
+
+
+def route_deadline(view):
+    """Run a Flask view under a deadline of its route's budget"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with activate(Deadline(route_budget(view.__name__))):
+            return view(*args, **kwargs)
+    return wrapper
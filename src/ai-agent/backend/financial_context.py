@@ -0,0 +1,120 @@
+import os
+import random
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from http_session import get_session
+from deadline import timeout as request_timeout
+
+BALANCES_URL = os.getenv("BALANCES_API_URL", "http://balancereader:8080")
+HISTORY_URL = os.getenv("HISTORY_API_URL", "http://transactionhistory:8080")
+# Overall budget in seconds for both ledger lookups together
+FETCH_DEADLINE = float(os.getenv("LEDGER_FETCH_DEADLINE", "2"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LEDGER_FETCH_WORKERS", "16")),
+    thread_name_prefix="ledger-fetch",
+)
+
+
+def _get_balance(user_id, headers, timeout):
+    response = get_session().get(f"{BALANCES_URL}/balances/{user_id}", headers=headers, timeout=timeout)
+    balance_raw = response.json() if response.status_code == 200 else 0
+    # Convert from cents to dollars
+    return balance_raw / 100 if isinstance(balance_raw, (int, float)) else 0
+
+
+def _get_transactions(user_id, headers, timeout):
+    response = get_session().get(f"{HISTORY_URL}/transactions/{user_id}", headers=headers, timeout=timeout)
+    return response.json() if response.status_code == 200 else []
+
+
+def _fake_context():
+    """Stand-in data when the ledger services are not reachable (local runs)"""
+    balance = random.choice([1500.0, 2500.0, 5000.0, 7500.0])
+    transactions = [
+        {"amount": random.choice([-15.99, -8.50, -25.00, -12.75]), "description": random.choice(["Coffee", "Lunch", "Gas", "Groceries"])},
+        {"amount": random.choice([-45.00, -32.99, -67.50]), "description": random.choice(["Shopping", "Entertainment", "Dining"])},
+        {"amount": random.choice([-120.00, -89.99, -156.75]), "description": random.choice(["Utilities", "Phone bill", "Subscription"])}
+    ]
+    print(f"DEBUG: Using fake balance: {balance}, fake transactions: {len(transactions)}")
+    return balance, transactions
+
+
+def _apply_demo_data(user_id, balance, transactions):
+    # For demo purposes, if balance is 0 and user_id is 'demo_user', give them some demo balance
+    if balance == 0 and user_id == 'demo_user':
+        balance = 1500.00  # Demo balance for testing
+        print(f"DEBUG: Setting demo balance for user {user_id}: {balance}")
+
+    # For demo purposes, if no transactions and user_id is 'demo_user', add some demo transactions
+    if len(transactions) == 0 and user_id == 'demo_user':
+        transactions = [
+            {"amount": 2500, "fromAccountNum": "demo_user", "toAccountNum": "demo_user", "description": "Initial deposit"},
+            {"amount": -150, "fromAccountNum": "demo_user", "toAccountNum": "1011226112", "description": "Coffee purchase"},
+            {"amount": -75, "fromAccountNum": "demo_user", "toAccountNum": "1011226113", "description": "Lunch"}
+        ]
+        print(f"DEBUG: Setting demo transactions for user {user_id}: {len(transactions)} transactions")
+    return balance, transactions
+
+
+def fetch_financial_context(user_id, auth_header, deadline=None):
+    """Fetch balance (in dollars) and raw transaction history concurrently.
+
+    Both ledger calls share one overall deadline, by default FETCH_DEADLINE
+    cut to what is left of the request's own deadline. Whatever has not
+    arrived by then is replaced with an empty default and listed in
+    ``partial``; if neither service is reachable at all, local fake data is
+    used. With no time left, neither lookup is sent.
+    """
+    deadline = request_timeout(FETCH_DEADLINE) if deadline is None else deadline
+    if deadline <= 0:
+        print(f"DEBUG: No time left to fetch the financial context for {user_id}")
+        balance, transactions = _apply_demo_data(user_id, 0, [])
+        return {
+            "balance": balance,
+            "transactions": transactions,
+            "partial": ["balance", "transactions"],
+        }
+    headers = {"Authorization": auth_header}
+    start = time.monotonic()
+    futures = {
+        "balance": _executor.submit(_get_balance, user_id, headers, deadline),
+        "transactions": _executor.submit(_get_transactions, user_id, headers, deadline),
+    }
+    wait(futures.values(), timeout=deadline)
+
+    defaults = {"balance": 0, "transactions": []}
+    results, partial, unreachable = {}, [], 0
+    for name, future in futures.items():
+        if not future.done():
+            print(f"DEBUG: {name} lookup missed the {deadline}s deadline")
+            partial.append(name)
+            results[name] = defaults[name]
+            continue
+        try:
+            results[name] = future.result()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            print(f"DEBUG: {name} lookup failed: {e}")
+            unreachable += 1
+            partial.append(name)
+            results[name] = defaults[name]
+        except requests.exceptions.JSONDecodeError as e:
+            print(f"DEBUG: {name} returned invalid JSON: {e}")
+            partial.append(name)
+            results[name] = defaults[name]
+
+    if unreachable == len(futures):
+        # Running locally - no Kubernetes services available
+        balance, transactions = _fake_context()
+        partial = []
+    else:
+        balance, transactions = results["balance"], results["transactions"]
+
+    balance, transactions = _apply_demo_data(user_id, balance, transactions)
+    print(f"DEBUG: Financial context for {user_id} fetched in {(time.monotonic() - start) * 1000:.0f}ms, partial={partial}")
+    return {
+        "balance": balance,
+        "transactions": transactions,
+        "partial": partial,
+    }
@@ -1,33 +1,315 @@
-import requests
 import os
 import logging
 import json
+import threading
+import time
 from dotenv import load_dotenv
+from http_session import get_session
+from response_cache import create_response_cache
+from streaming import JsonFieldStream
+from circuit_breaker import CircuitBreakerRegistry
+from singleflight import SingleFlight
+from hedging import Hedger
+from transaction_features import describe, summarize_transactions
+from deadline import DeadlineExceeded, current as current_deadline, timeout as request_timeout
+from rate_limiter import BACKGROUND, EMOJI, INTERACTIVE, RateLimiter, current_priority, retry_after
+import metrics
+import tracing
 
 # Load environment variables
 load_dotenv()
 
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+# Challenges are meant to vary between users, so identical challenge prompts
+# are never collapsed into one call
+UNCOALESCED_METHODS = {'generate_challenge', 'stream_challenge'}
+
+# Rate limiter priority for methods that are never user-facing; everything
+# else is interactive unless called inside rate_limiter.priority(...)
+METHOD_PRIORITIES = {
+    'generate_goal_emoji': EMOJI,
+    'generate_achievement_message': BACKGROUND,
+}
+
+COALESCED_CALLS = metrics.Counter(
+    "gemini_coalesced_calls_total",
+    "Gemini calls answered by an identical request already in flight (upstream calls saved)")
+UPSTREAM_CALLS = metrics.Counter(
+    "gemini_upstream_calls_total", "Gemini calls sent upstream")
+CALL_SECONDS = metrics.Histogram(
+    "gemini_call_seconds", "Latency of upstream Gemini calls by method and HTTP status (error: no response)")
+PROMPT_CHARS = metrics.Counter(
+    "gemini_prompt_chars_total", "Characters of prompt text sent to Gemini")
+TOKENS = metrics.Counter(
+    "gemini_tokens_total", "Tokens reported in usageMetadata, by kind (prompt, output, thoughts)")
+FINISH_REASONS = metrics.Counter(
+    "gemini_finish_reasons_total", "Gemini candidates by finishReason")
+FALLBACKS = metrics.Counter(
+    "gemini_fallbacks_total", "Calls answered by a local fallback instead of Gemini")
+DEADLINE_SKIPS = metrics.Counter(
+    "gemini_deadline_skipped_calls_total",
+    "Gemini calls not attempted because too little of the request's deadline was left")
+BATCH_ITEMS = metrics.Counter(
+    "gemini_batch_items_total",
+    "Items requested through batch methods, by how they were answered (cached, batched, single, retried)")
+
+# Least time worth giving a Gemini call; with less of the request's deadline
+# left, callers go straight to their fallback
+MIN_CALL_SECONDS = float(os.getenv('GEMINI_MIN_CALL_SECONDS', '1.0'))
+
+# Items packed into one prompt by the batch methods
+BATCH_SIZE = int(os.getenv('GEMINI_BATCH_SIZE', '20'))
+
+STREAK_MESSAGE_EXAMPLE = {
+    "motivational_message": "You're building amazing financial habits! Keep it up!",
+    "streak_milestone": "Special message if they hit a milestone",
+    "next_goal": "Focus on completing one challenge this week",
+    "emoji": "🔥",
+    "encouragement_level": "high",
+}
+LEADERBOARD_CONTEXT_EXAMPLE = {
+    "position_message": "You're doing great! Currently ranked #3",
+    "improvement_tip": "Complete more challenges to climb higher",
+    "weekly_goal": "Try to complete 3 challenges this week",
+    "competitor_insight": "You're on track to advance your financial skills",
+    "motivation_boost": "Every challenge completed makes you financially stronger!",
+}
+
+
+def get_gemini_client():
+    """Return the GeminiClient shared by every request in this worker"""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                cache = None
+                if os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true':
+                    cache = create_response_cache()
+                breakers = CircuitBreakerRegistry.from_env()
+                metrics.REGISTRY.register_collector(breakers.collect)
+                if cache is not None:
+                    metrics.REGISTRY.register_collector(cache.collect)
+                coalescer = None
+                if os.getenv('GEMINI_COALESCE_ENABLED', 'true').lower() == 'true':
+                    coalescer = SingleFlight()
+                limiter = RateLimiter.from_env()
+                if limiter is not None:
+                    metrics.REGISTRY.register_collector(limiter.collect)
+                hedger = Hedger.from_env()
+                if hedger is not None:
+                    metrics.REGISTRY.register_collector(hedger.collect)
+                _shared_client = GeminiClient(cache=cache, breakers=breakers, coalescer=coalescer,
+                                              limiter=limiter, hedger=hedger)
+    return _shared_client
+
+
 class GeminiClient:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, base_url=None, session=None, cache=None, breakers=None,
+                 coalescer=None, limiter=None, hedger=None):
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta"
+        self.base_url = base_url or os.getenv('GEMINI_BASE_URL', "https://generativelanguage.googleapis.com/v1beta")
         self.logger = logging.getLogger(__name__)
+        self._session = session
+        self.cache = cache
+        self.breakers = breakers
+        self.coalescer = coalescer
+        self.limiter = limiter
+        self.hedger = hedger
+
+    @property
+    def session(self):
+        # Resolved on every call so a forked worker picks up its own pool
+        return self._session or get_session()
+
+    def _post(self, url, method=None, **kwargs):
+        """Send a request to Gemini over the pooled keep-alive session.
+
+        With a coalescer, concurrent requests with the same method and body
+        share one upstream call and all receive the same response. Streamed
+        requests and UNCOALESCED_METHODS always go upstream on their own.
+
+        Inside a request deadline (see deadline.py) the HTTP timeout is cut to
+        the time left, and DeadlineExceeded is raised instead of calling
+        Gemini when less than MIN_CALL_SECONDS remain. A coalesced caller
+        waits no longer than its own deadline for the shared call either.
+        """
+        kwargs = self._within_deadline(method, kwargs)
+        if (self.coalescer is None or method in UNCOALESCED_METHODS
+                or kwargs.get('stream') or 'json' not in kwargs):
+            return self._send(url, method, **kwargs)
+        key = (method, url, json.dumps(kwargs['json'], sort_keys=True))
+        wait = kwargs['timeout'] if current_deadline() is not None else None
+        response, shared = self.coalescer.do(key, lambda: self._send(url, method, **kwargs), wait)
+        if shared:
+            COALESCED_CALLS.inc(method=method or 'unknown')
+        return response
+
+    @staticmethod
+    def _within_deadline(method, kwargs):
+        """``kwargs`` with the timeout cut to the current request's deadline"""
+        if current_deadline() is None:
+            return kwargs
+        timeout = request_timeout(kwargs.get('timeout', 30))
+        if timeout < MIN_CALL_SECONDS:
+            DEADLINE_SKIPS.inc(method=method or 'unknown')
+            raise DeadlineExceeded(f"{timeout:.2f}s left for {method}, {MIN_CALL_SECONDS}s needed")
+        return dict(kwargs, timeout=timeout)
+
+    def _send(self, url, method=None, **kwargs):
+        """Make an upstream call, hedged when a hedger is configured.
+
+        Only interactive, non-streamed calls are hedged: nobody is waiting
+        on background work, and a stream has answered once it starts.
+        """
+        priority = current_priority(METHOD_PRIORITIES.get(method, INTERACTIVE))
+        if self.hedger is None or priority != INTERACTIVE or kwargs.get('stream'):
+            return self._send_limited(url, method, priority, **kwargs)
+        return self.hedger.call(method, lambda hedge: self._send_limited(url, method, priority, hedge, **kwargs))
+
+    def _send_limited(self, url, method, priority, hedge=False, **kwargs):
+        """Make an upstream call, within the rate limit when one is configured.
+
+        The call first waits for a token at its priority; RateLimitedError
+        (no token before the priority's deadline) is turned into a fallback
+        by callers like any other failure. A 429 backs the limiter off and
+        the call is retried up to ``limiter.retries`` times. A hedge only
+        goes out if a token is free right now, and is never retried. Waits
+        for a token end early enough to leave MIN_CALL_SECONDS of the
+        request's deadline for the call itself.
+        """
+        if self.limiter is None:
+            return self._send_once(url, method, **self._within_deadline(method, kwargs))
+        attempts = 1 if hedge else self.limiter.retries + 1
+        for attempt in range(attempts):
+            wait = 0 if hedge else request_timeout(self.limiter.max_wait[priority], reserve=MIN_CALL_SECONDS)
+            self.limiter.acquire(priority, timeout=wait)
+            response = self._send_once(url, method, **self._within_deadline(method, kwargs))
+            if response.status_code != 429:
+                self.limiter.succeeded()
+                return response
+            self.limiter.throttled(retry_after(response))
+            if attempt < attempts - 1:
+                response.close()
+        return response
+
+    def _send_once(self, url, method=None, **kwargs):
+        """Make one upstream call.
+
+        When breakers are configured, ``method`` selects the circuit breaker;
+        an open breaker raises CircuitOpenError without touching the network,
+        which every caller already turns into its fallback.
+        """
+        UPSTREAM_CALLS.inc(method=method or 'unknown')
+        breaker = self.breakers.get(method) if self.breakers and method else None
+        if breaker is not None:
+            breaker.before_call()
+        with tracing.span("gemini.generateContent", **{"gemini.method": method}) as span:
+            start = time.monotonic()
+            try:
+                response = self._read(self.session.post(url, **kwargs), kwargs)
+            except Exception:
+                elapsed = time.monotonic() - start
+                if breaker is not None:
+                    breaker.record(False, elapsed)
+                self._observe_call(method, kwargs, None, elapsed, span)
+                raise
+            elapsed = time.monotonic() - start
+            if breaker is not None:
+                # 5xx and 429 mean Gemini is unhealthy; other 4xx are our own bugs
+                healthy = response.status_code < 500 and response.status_code != 429
+                breaker.record(healthy, elapsed)
+            if self.hedger is not None and response.status_code == 200:
+                self.hedger.record(method, elapsed)
+            self._observe_call(method, kwargs, response, elapsed, span)
+            return response
+
+    def _observe_call(self, method, kwargs, response, elapsed, span):
+        """Record latency, prompt size and, for whole responses, token usage"""
+        method = method or 'unknown'
+        status = str(response.status_code) if response is not None else 'error'
+        CALL_SECONDS.observe(elapsed, method=method, status=status)
+        body = kwargs.get('json') or {}
+        prompt_chars = sum(len(part.get('text', '')) for content in body.get('contents', [])
+                           for part in content.get('parts', []))
+        PROMPT_CHARS.inc(prompt_chars, method=method)
+        span.set_attributes({"gemini.prompt_chars": prompt_chars, "http.status_code": status,
+                             "gemini.latency_ms": round(elapsed * 1000, 1)})
+        # Streamed responses report usage in their last chunk (see stream_challenge)
+        if response is not None and response.status_code == 200 and not kwargs.get('stream'):
+            try:
+                self._observe_usage(method, response.json(), span)
+            except ValueError:
+                pass
+
+    @staticmethod
+    def _observe_usage(method, result, span=None):
+        """Record usageMetadata token counts and the finishReason of a response"""
+        if not isinstance(result, dict):
+            return
+        span = span or tracing.current_span()
+        usage = result.get('usageMetadata') or {}
+        for kind, field in (('prompt', 'promptTokenCount'), ('output', 'candidatesTokenCount'),
+                            ('thoughts', 'thoughtsTokenCount')):
+            if usage.get(field):
+                TOKENS.inc(usage[field], method=method, kind=kind)
+                span.set_attribute(f"gemini.{kind}_tokens", usage[field])
+        candidates = result.get('candidates') or [{}]
+        finish_reason = candidates[0].get('finishReason') if isinstance(candidates[0], dict) else None
+        if finish_reason:
+            FINISH_REASONS.inc(method=method, reason=finish_reason)
+            span.set_attribute("gemini.finish_reason", finish_reason)
+
+    @staticmethod
+    def _fallback(method):
+        """Note that ``method`` was answered locally because Gemini could not"""
+        FALLBACKS.inc(method=method)
+        tracing.current_span().set_attribute("gemini.fallback", True)
+
+    @staticmethod
+    def _read(response, kwargs):
+        # Load the body before the response can be handed to coalesced waiters,
+        # so they never race on the underlying connection
+        if not kwargs.get('stream'):
+            response.content
+        return response
+
+    def _cached(self, method, inputs, loader, cacheable=lambda value: value is not None):
+        """Serve ``method`` from the response cache when one is configured"""
+        with tracing.span(f"GeminiClient.{method}", **{"gemini.method": method}) as span:
+            if self.cache is None:
+                return loader()
+            loaded = []
+
+            def load():
+                loaded.append(True)
+                return loader()
+
+            value = self.cache.get_or_load(method, inputs, load, cacheable)
+            span.set_attribute("gemini.cache_hit", not loaded)
+            return value
+
+    @staticmethod
+    def _is_success(result):
+        return isinstance(result, dict) and 'error' not in result
     
-    def generate_challenge(self, user_profile, user_goal=None):
+    def generate_challenge(self, user_profile, user_goal=None, allow_fallback=True):
+        """Generate a challenge; without ``allow_fallback`` a failure returns None"""
+        challenge = self._request_challenge(user_profile, user_goal)
+        if challenge is None and allow_fallback:
+            self._fallback('generate_challenge')
+            return self._get_fallback_challenge(user_profile, user_goal)
+        return challenge
+
+    def _challenge_prompt(self, user_profile):
         balance = user_profile.get('balance', 0)
-        transactions = user_profile.get('transactions', [])
-        transaction_count = user_profile.get('transaction_count', 0)
         recent_spending = user_profile.get('recent_spending', 0)
-
-        # Simplify transaction data to avoid token limits
-        recent_transactions_summary = f"{len(transactions)} recent transactions" if transactions else "No recent transactions"
-        if transactions and len(transactions) > 0:
-            # Show just the last 3 transactions with amounts
-            recent_3 = transactions[:3]
-            transaction_summary = ", ".join([f"${t.get('amount', 0):.2f}" for t in recent_3])
-            recent_transactions_summary = f"Recent amounts: {transaction_summary}"
+        # Payee names stay out: queued challenges are shared within a bucket
+        history = describe(user_profile.get('features'), payees=False)
 
         prompt = f"""Create a fun, diverse financial challenge for someone with ${balance} balance, ${recent_spending} recent spending.
+{history}
 
 Return JSON:
 {{
@@ -42,10 +324,16 @@ Return JSON:
 }}
 
 Make it creative and varied - think investing, coffee savings, journaling, side hustles, etc."""
-        
+        return prompt
+
+    def _request_challenge(self, user_profile, user_goal=None):
+        """Ask Gemini for a challenge, returning None if it could not"""
+        prompt = self._challenge_prompt(user_profile)
+
         try:
-            response = requests.post(
+            response = self._post(
                 f"{self.base_url}/models/gemini-2.5-flash:generateContent",
+                method='generate_challenge',
                 headers={
                     "x-goog-api-key": self.api_key,
                     "Content-Type": "application/json"
@@ -72,7 +360,7 @@ Make it creative and varied - think investing, coffee savings, journaling, side
                         # Check if Gemini hit token limit FIRST
                         if candidate.get("finishReason") == "MAX_TOKENS":
                             self.logger.error(f"Gemini hit MAX_TOKENS limit: {result}")
-                            return self._get_fallback_challenge(user_profile, user_goal)
+                            return None
                         
                         # Check if content has parts
                         if "content" in candidate and "parts" in candidate["content"] and len(candidate["content"]["parts"]) > 0:
@@ -81,10 +369,10 @@ Make it creative and varied - think investing, coffee savings, journaling, side
                             challenge_text = candidate["text"]
                         else:
                             self.logger.error(f"Unexpected response structure: {result}")
-                            return self._get_fallback_challenge(user_profile, user_goal)
+                            return None
                     else:
                         self.logger.error(f"No candidates in response: {result}")
-                        return self._get_fallback_challenge(user_profile, user_goal)
+                        return None
                     
                     # Clean up the response text
                     challenge_text = challenge_text.strip()
@@ -101,19 +389,81 @@ Make it creative and varied - think investing, coffee savings, journaling, side
                         return challenge_data
                     except json.JSONDecodeError as e:
                         self.logger.error(f"JSON parsing failed: {e}, raw text: {challenge_text}")
-                        return self._get_fallback_challenge(user_profile, user_goal)
+                        return None
                         
                 except KeyError as e:
                     self.logger.error(f"KeyError accessing response: {e}, response: {result}")
-                    return self._get_fallback_challenge(user_profile, user_goal)
+                    return None
             else:
                 self.logger.error(f"Gemini API error: {response.status_code} - {response.text}")
-                return self._get_fallback_challenge(user_profile, user_goal)
+                return None
                 
         except Exception as e:
             self.logger.error(f"Error calling Gemini API: {e}")
-            return self._get_fallback_challenge(user_profile, user_goal)
+            return None
     
+    CHALLENGE_FIELDS = ("title", "challenge", "difficulty", "category", "xp_reward",
+                        "time_to_complete", "goal_recommendation", "tips")
+
+    def stream_challenge(self, user_profile, user_goal=None):
+        """Stream a challenge from Gemini field by field.
+
+        Yields ``("field", name, value)`` as soon as each top-level field of
+        the JSON answer is complete. If the stream fails or ends without a
+        full challenge, yields ``("reset", None, None)`` (only when fields
+        were already sent) followed by the fields of a fallback challenge.
+        """
+        parser = JsonFieldStream()
+        sent = {}
+        try:
+            response = self._post(
+                f"{self.base_url}/models/gemini-2.5-flash:streamGenerateContent?alt=sse",
+                method='stream_challenge',
+                headers={
+                    "x-goog-api-key": self.api_key,
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "contents": [{"parts": [{"text": self._challenge_prompt(user_profile)}]}],
+                    "generationConfig": {
+                        "maxOutputTokens": 2000,
+                        "temperature": 1.2
+                    }
+                },
+                timeout=30,
+                stream=True
+            )
+            try:
+                if response.status_code != 200:
+                    self.logger.error(f"Gemini streaming error: {response.status_code} - {response.text}")
+                else:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        chunk = json.loads(line[len("data:"):])
+                        candidate = (chunk.get("candidates") or [{}])[0]
+                        if candidate.get("finishReason"):
+                            self._observe_usage('stream_challenge', chunk)
+                        for part in candidate.get("content", {}).get("parts", []):
+                            for name, value in parser.feed(part.get("text", "")):
+                                sent[name] = value
+                                yield "field", name, value
+                        if candidate.get("finishReason") == "MAX_TOKENS":
+                            self.logger.error("Gemini stream hit MAX_TOKENS limit")
+                            break
+            finally:
+                response.close()
+        except Exception as e:
+            self.logger.error(f"Error streaming challenge from Gemini: {e}")
+
+        if parser.done and all(field in sent for field in self.CHALLENGE_FIELDS):
+            return
+        if sent:
+            yield "reset", None, None
+        self._fallback('stream_challenge')
+        for name, value in self._get_fallback_challenge(user_profile, user_goal).items():
+            yield "field", name, value
+
     def _get_fallback_challenge(self, user_profile, user_goal=None):
         import random
         
@@ -218,7 +568,19 @@ Make it creative and varied - think investing, coffee savings, journaling, side
             earning_saving = [c for c in challenge_options if c["category"] in ["earn_more", "save_money"]]
             return random.choice(earning_saving + challenge_options[:3])
     
-    def parse_goal(self, goal_text):
+    def parse_goal(self, goal_text, allow_fallback=True):
+        """Parse a goal with Gemini; without ``allow_fallback`` a failure returns None"""
+        parsed = self._cached('parse_goal', {'goal': goal_text}, lambda: self._request_goal_parsing(goal_text))
+        if not parsed:
+            if not allow_fallback:
+                return None
+            self._fallback('parse_goal')
+            return self._get_fallback_goal_parsing(goal_text)
+        # Cache keys are normalized, so echo back the caller's exact text
+        return {**parsed, "raw_text": goal_text}
+
+    def _request_goal_parsing(self, goal_text):
+        """Ask Gemini to parse a goal, returning None if it could not"""
         try:
             prompt = f"""
             Parse this financial goal text and extract key information:
@@ -247,8 +609,9 @@ Make it creative and varied - think investing, coffee savings, journaling, side
                 }]
             }
             
-            response = requests.post(
+            response = self._post(
                 f"{self.base_url}/models/gemini-2.5-flash:generateContent?key={self.api_key}",
+                method='parse_goal',
                 json=payload,
                 headers={"Content-Type": "application/json"},
                 timeout=30
@@ -267,10 +630,10 @@ Make it creative and varied - think investing, coffee savings, journaling, side
                             response_text = candidate["text"]
                         else:
                             self.logger.error(f"Unexpected response structure: {result}")
-                            return self._get_fallback_goal_parsing(goal_text)
+                            return None
                     else:
                         self.logger.error(f"No candidates in response: {result}")
-                        return self._get_fallback_goal_parsing(goal_text)
+                        return None
                     
                     # Clean up the response text
                     response_text = response_text.strip()
@@ -285,14 +648,14 @@ Make it creative and varied - think investing, coffee savings, journaling, side
                     return parsed_goal
                 except (KeyError, json.JSONDecodeError) as e:
                     self.logger.error(f"Error parsing goal response: {e}, response: {result}")
-                    return self._get_fallback_goal_parsing(goal_text)
+                    return None
             else:
                 self.logger.error(f"Gemini API error for goal parsing: {response.status_code} - {response.text}")
-                return self._get_fallback_goal_parsing(goal_text)
+                return None
                 
         except Exception as e:
             self.logger.error(f"Error parsing goal with Gemini: {e}")
-            return self._get_fallback_goal_parsing(goal_text)
+            return None
 
     def _get_fallback_goal_parsing(self, goal_text):
         """Fallback goal parsing if Gemini fails"""
@@ -354,44 +717,28 @@ Make it creative and varied - think investing, coffee savings, journaling, side
             "raw_text": goal_text
         }
     
-    def generate_achievements(self, user_stats):
-        """Generate personalized achievement badges based on user progress"""
+    def generate_achievement_message(self, achievement):
+        """Write an unlock message for a catalog achievement, or None on failure"""
         prompt = f"""
-        Generate personalized achievement badges for a user with these stats:
-        - Current XP: {user_stats.get('xp', 0)}
-        - Current Level: {user_stats.get('level', 1)}
-        - Completed Challenges: {user_stats.get('completed_challenges', 0)}
-        - Current Streak: {user_stats.get('streak', 0)}
-        - Days Active: {user_stats.get('days_active', 0)}
-        - Total Goals Set: {user_stats.get('goals_set', 0)}
+        Write a short unlock message for a badge in a personal finance game:
+        - Badge: {achievement['emoji']} {achievement['name']}
+        - Earned for: {achievement['description']}
 
         Return a JSON response with this exact structure:
         {{
-            "achievements": [
-                {{
-                    "id": "first_goal",
-                    "name": "Goal Setter",
-                    "emoji": "🎯",
-                    "description": "Set your first financial goal",
-                    "unlocked": true,
-                    "unlocked_message": "Congratulations! You've taken the first step toward financial success!"
-                }}
-            ],
-            "next_milestone": {{
-                "name": "Next Achievement",
-                "emoji": "🏆",
-                "description": "What they need to do next",
-                "progress": 0.7,
-                "requirement": "Complete 5 more challenges"
-            }}
+            "message": "Celebratory, encouraging message under 20 words"
         }}
 
-        Create 6-8 achievements that feel personal and motivating. Make some unlocked based on their current stats.
-        Include creative achievement names and make the unlocked_message feel personal and encouraging.
+        Make it feel personal and specific to the financial habit behind the badge.
         """
-        
-        return self._make_request(prompt)
-    
+
+        inputs = {key: achievement[key] for key in ('id', 'name', 'description')}
+        result = self._cached('generate_achievement_message', inputs,
+                              lambda: self._make_request(prompt, 'generate_achievement_message'), self._is_success)
+        if self._is_success(result) and isinstance(result.get('message'), str) and result['message'].strip():
+            return result['message'].strip()
+        return None
+
     def generate_streak_message(self, streak_data):
         """Generate motivational streak messages"""
         prompt = f"""
@@ -414,7 +761,7 @@ Make it creative and varied - think investing, coffee savings, journaling, side
         If streak is 0, focus on starting fresh. If high streak, celebrate their consistency.
         """
         
-        return self._make_request(prompt)
+        return self._cached('generate_streak_message', streak_data, lambda: self._make_request(prompt, 'generate_streak_message'), self._is_success)
     
     def generate_leaderboard_context(self, user_stats, leaderboard_position):
         """Generate personalized leaderboard messages and insights"""
@@ -437,10 +784,129 @@ Make it creative and varied - think investing, coffee savings, journaling, side
         Make it encouraging regardless of position. Focus on personal growth over competition.
         """
         
-        return self._make_request(prompt)
+        inputs = {'stats': user_stats, 'position': leaderboard_position}
+        return self._cached('generate_leaderboard_context', inputs, lambda: self._make_request(prompt, 'generate_leaderboard_context'), self._is_success)
+
+    def generate_streak_messages(self, streak_data_list, batch_size=BATCH_SIZE):
+        """generate_streak_message for many users, packing ``batch_size`` users per call"""
+        return self._generate_batch(
+            'generate_streak_message', list(streak_data_list), batch_size,
+            task="Generate a personalized motivational message about their financial habit streak",
+            guidance="Make each message personal, encouraging, and specific to financial habits. "
+                     "If streak is 0, focus on starting fresh. If high streak, celebrate their consistency.",
+            describe=lambda streak_data: (
+                f"Current streak: {streak_data.get('current_streak', 0)} days; "
+                f"Longest streak: {streak_data.get('longest_streak', 0)} days; "
+                f"Last challenge completed: {streak_data.get('last_challenge', 'None')}; "
+                f"Recent progress: {streak_data.get('recent_progress', 'New user')}"),
+            example=STREAK_MESSAGE_EXAMPLE,
+            inputs=lambda streak_data: streak_data,
+            single=self.generate_streak_message,
+        )
+
+    def generate_leaderboard_contexts(self, entries, batch_size=BATCH_SIZE):
+        """generate_leaderboard_context for many ``(user_stats, position)`` pairs"""
+        return self._generate_batch(
+            'generate_leaderboard_context', list(entries), batch_size,
+            task="Generate personalized leaderboard insights",
+            guidance="Make it encouraging regardless of position. Focus on personal growth over competition.",
+            describe=lambda entry: (
+                f"Current position: #{entry[1]}; User XP: {entry[0].get('xp', 0)}; "
+                f"User level: {entry[0].get('level', 1)}; "
+                f"Challenges completed this week: {entry[0].get('weekly_challenges', 0)}"),
+            example=LEADERBOARD_CONTEXT_EXAMPLE,
+            inputs=lambda entry: {'stats': entry[0], 'position': entry[1]},
+            single=lambda entry: self.generate_leaderboard_context(*entry),
+        )
+
+    def _generate_batch(self, method, items, batch_size, task, guidance, describe, example, inputs, single):
+        """Answer ``method`` for every item with as few upstream calls as possible.
+
+        Items already in the response cache are served from it. The rest are
+        packed ``batch_size`` to a prompt asking for a JSON array with one
+        object per item (a lone item just goes through ``single``); each
+        object is checked against the fields of ``example``, and only the
+        items whose answer is missing or invalid are retried one at a time
+        through ``single``. Batched answers are cached
+        under the same keys ``single`` uses, so precomputed results serve
+        later per-user requests. Returns the results in item order.
+        """
+        results = [None] * len(items)
+        use_cache = self.cache is not None and self.cache.ttl_for(method) > 0
+        pending = []
+        for i, item in enumerate(items):
+            if use_cache:
+                hit, value = self.cache.get(method, inputs(item))
+                if hit:
+                    results[i] = value
+                    BATCH_ITEMS.inc(method=method, outcome='cached')
+                    continue
+            pending.append(i)
+
+        failed = []
+        for start in range(0, len(pending), max(1, batch_size)):
+            chunk = pending[start:start + max(1, batch_size)]
+            if len(chunk) == 1:
+                results[chunk[0]] = single(items[chunk[0]])
+                BATCH_ITEMS.inc(method=method, outcome='single')
+                continue
+            answers = self._request_batch(method, [items[i] for i in chunk], task, guidance, describe, example)
+            for i, answer in zip(chunk, answers):
+                if answer is None:
+                    failed.append(i)
+                    continue
+                results[i] = answer
+                if use_cache:
+                    self.cache.set(method, inputs(items[i]), answer)
+                BATCH_ITEMS.inc(method=method, outcome='batched')
+
+        for i in failed:
+            results[i] = single(items[i])
+            BATCH_ITEMS.inc(method=method, outcome='retried')
+        return results
+
+    def _request_batch(self, method, items, task, guidance, describe, example):
+        """One upstream call for ``items``: the valid answer or None per item"""
+        users = "\n".join(f"        {i}. {describe(item)}" for i, item in enumerate(items))
+        structure = json.dumps({"index": 0, **example}, ensure_ascii=False, indent=4)
+        prompt = f"""
+        {task} for each of these {len(items)} users:
+{users}
+
+        Return a JSON array with exactly {len(items)} objects, one per user, where "index" is
+        the user's number from the list above. Each object has this exact structure:
+        {structure}
+
+        {guidance}
+        """
+
+        result = self._make_request(prompt, f'{method}_batch',
+                                    max_output_tokens=1000 + 300 * len(items), timeout=60)
+        answers = [None] * len(items)
+        if not isinstance(result, list):
+            self.logger.error(f"Batch {method} for {len(items)} items returned no array")
+            return answers
+        for position, answer in enumerate(result):
+            if not isinstance(answer, dict):
+                continue
+            index = answer.get('index', position)
+            if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < len(items):
+                continue
+            if answers[index] is None and all(isinstance(answer.get(field), str) and answer[field].strip()
+                                              for field in example):
+                answers[index] = {field: answer[field] for field in example}
+        return answers
 
     def generate_goal_emoji(self, goal_text):
         """Generate an appropriate emoji for a financial goal"""
+        emoji = self._cached('generate_goal_emoji', {'goal': goal_text}, lambda: self._request_goal_emoji(goal_text))
+        if not emoji:
+            self._fallback('generate_goal_emoji')
+            return '💰'
+        return emoji
+
+    def _request_goal_emoji(self, goal_text):
+        """Ask Gemini for a goal emoji, returning None if it could not"""
         try:
             prompt = f"""
             Generate a single appropriate emoji for this financial goal: "{goal_text}"
@@ -461,8 +927,9 @@ Make it creative and varied - think investing, coffee savings, journaling, side
             Just return the emoji character, nothing else.
             """
             
-            response = requests.post(
+            response = self._post(
                 f"{self.base_url}/models/gemini-2.5-flash:generateContent",
+                method='generate_goal_emoji',
                 headers={
                     "x-goog-api-key": self.api_key,
                     "Content-Type": "application/json"
@@ -485,20 +952,21 @@ Make it creative and varied - think investing, coffee savings, journaling, side
                 if len(emoji) <= 4 and emoji:  # Emojis can be 1-4 characters
                     return emoji
                 else:
-                    # Fallback to default
-                    return '💰'
+                    # Caller falls back to default
+                    return None
             else:
-                return '💰'
+                return None
                 
         except Exception as e:
             self.logger.error(f"Error generating emoji: {e}")
-            return '💰'
+            return None
 
-    def _make_request(self, prompt):
+    def _make_request(self, prompt, method='make_request', max_output_tokens=2000, timeout=30):
         """Helper method to make requests to Gemini API"""
         try:
-            response = requests.post(
+            response = self._post(
                 f"{self.base_url}/models/gemini-2.5-flash:generateContent",
+                method=method,
                 headers={
                     "x-goog-api-key": self.api_key,
                     "Content-Type": "application/json"
@@ -506,11 +974,11 @@ Make it creative and varied - think investing, coffee savings, journaling, side
                 json={
                     "contents": [{"parts": [{"text": prompt}]}],
                     "generationConfig": {
-                        "maxOutputTokens": 2000,
+                        "maxOutputTokens": max_output_tokens,
                         "temperature": 0.8
                     }
                 },
-                timeout=30
+                timeout=timeout
             )
             
             if response.status_code == 200:
@@ -559,14 +1027,14 @@ Make it creative and varied - think investing, coffee savings, journaling, side
     def generate_additional_tasks(self, user_context):
         """Generate 3 additional micro-tasks based on user's financial situation"""
         balance = user_context.get('balance', 0)
-        recent_transactions = user_context.get('recent_transactions', [])
+        features = user_context.get('features') or summarize_transactions(user_context.get('recent_transactions'))
         user_goal = user_context.get('user_goal', 'No goal set')
 
         prompt = f"""
         Generate 3 quick actionable micro-tasks for a user based on their financial situation:
         - Current balance: ${balance}
-        - Recent transactions: {recent_transactions}
         - User goal: {user_goal}
+        {describe(features)}
 
         Return a JSON array with this exact structure:
         [
@@ -603,8 +1071,9 @@ Make it creative and varied - think investing, coffee savings, journaling, side
         """
 
         try:
-            response = requests.post(
+            response = self._post(
                 f"{self.base_url}/models/gemini-2.5-flash:generateContent",
+                method='generate_additional_tasks',
                 headers={
                     "x-goog-api-key": self.api_key,
                     "Content-Type": "application/json"
@@ -664,6 +1133,7 @@ Make it creative and varied - think investing, coffee savings, journaling, side
 
     def _get_fallback_tasks(self):
         """Fallback tasks if Gemini fails"""
+        self._fallback('generate_additional_tasks')
         return [
             {
                 "id": 1,
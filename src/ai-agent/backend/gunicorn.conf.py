@@ -0,0 +1,29 @@
+import os
+
+# SERVING_MODE=sync: classic threaded workers, one request per thread.
+# SERVING_MODE=async: gevent workers; requests, the ledger fetch pool and
+# Gemini calls are cooperatively scheduled, so a single worker can keep
+# hundreds of slow LLM calls in flight.
+serving_mode = os.getenv("SERVING_MODE", "async").lower()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = 5
+
+if serving_mode == "async":
+    worker_class = "gevent"
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+    # Greenlets are cheap: size the fetch, hedge and keep-alive pools to match
+    os.environ.setdefault("LEDGER_FETCH_WORKERS", "256")
+    os.environ.setdefault("GEMINI_HEDGE_WORKERS", "256")
+    os.environ.setdefault("HTTP_POOL_MAXSIZE", "128")
+else:
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+
+def worker_exit(server, worker):
+    # Commit challenges still queued by the write-behind writer
+    from database import flush_writes
+    flush_writes(10)
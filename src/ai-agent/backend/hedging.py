@@ -0,0 +1,230 @@
+import os
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import tracing
+from circuit_breaker import CircuitOpenError
+from deadline import DeadlineExceeded
+from rate_limiter import RateLimitedError
+
+# Raised by a send before anything goes upstream: a hedge that fails with one
+# of these was never sent, so its budget credit is given back
+NOT_SENT = (RateLimitedError, DeadlineExceeded, CircuitOpenError)
+
+
+class LatencyTracker:
+    """Latencies of the last ``window`` successful calls per method"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, seconds):
+        with self._lock:
+            samples = self._samples.get(method)
+            if samples is None:
+                samples = self._samples[method] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, method, pct):
+        """The ``pct`` (0-1) latency of ``method``, or None until it has min_samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(method, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct))]
+
+
+def _answered(future):
+    """Whether a finished attempt got a usable answer (not an error, 5xx or 429)"""
+    if future.cancelled() or future.exception() is not None:
+        return False
+    status = future.result().status_code
+    return status < 500 and status != 429
+
+
+def _close(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class Hedger:
+    """Hedged requests against Gemini's latency tail.
+
+    A call to one of ``methods`` that has not answered after the method's
+    recent ``percentile`` latency gets a second, identical request, and the
+    first usable answer wins. The loser is cancelled if it has not started
+    and its response is closed when it arrives; a request already in flight
+    cannot be aborted, so it runs to completion in the background.
+
+    Hedges are paid for from a budget: every eligible call earns ``budget``
+    of a hedge (up to ``max_credit`` saved up), so hedges stay under that
+    share of the calls even when Gemini is slow across the board. Only
+    hedges that go upstream are paid for: one refused before sending (see
+    NOT_SENT) or cancelled while still queued gets its credit back.
+
+    Only hedges run on the pool of ``workers`` threads. A primary goes out
+    at once on a thread of its own (a greenlet under gevent, like the
+    request itself), so it never waits in the pool's queue behind other
+    calls or their hedges; a hedge still queued when the primary answers
+    is simply cancelled.
+    """
+
+    def __init__(self, methods, percentile=0.95, budget=0.05, max_credit=10, min_delay=0.05,
+                 window=200, min_samples=20, workers=16):
+        self.methods = set(methods)
+        self.percentile = percentile
+        self.budget = budget
+        self.max_credit = max_credit
+        self.min_delay = min_delay
+        self.tracker = LatencyTracker(window, min_samples)
+        self.fired = {}
+        self.won = {}
+        self.denied = {}
+        self.unsent = {}
+        self._credit = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini-hedge")
+
+    @classmethod
+    def from_env(cls):
+        """The hedger described by GEMINI_HEDGE_*, or None when disabled"""
+        budget = float(os.getenv("GEMINI_HEDGE_BUDGET", "0.05"))
+        if budget <= 0:
+            return None
+        methods = os.getenv("GEMINI_HEDGE_METHODS", "generate_challenge,generate_additional_tasks")
+        return cls(
+            methods=[method.strip() for method in methods.split(",") if method.strip()],
+            percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", "0.95")),
+            budget=budget,
+            min_delay=float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "0.05")),
+            workers=int(os.getenv("GEMINI_HEDGE_WORKERS", "16")),
+        )
+
+    def record(self, method, seconds):
+        """Feed the latency of a successful upstream call"""
+        self.tracker.record(method, seconds)
+
+    def delay(self, method):
+        """Seconds to wait before hedging ``method``, or None while too few calls are known"""
+        latency = self.tracker.percentile(method, self.percentile)
+        return None if latency is None else max(self.min_delay, latency)
+
+    def _spend(self, method):
+        """Take one hedge's credit, if there is that much saved up"""
+        with self._lock:
+            if self._credit < 1:
+                self.denied[method] = self.denied.get(method, 0) + 1
+                return False
+            self._credit -= 1
+            return True
+
+    def _settle(self, method, sent):
+        """Count a hedge that went upstream, or give back the credit of one that did not"""
+        with self._lock:
+            if sent:
+                self.fired[method] = self.fired.get(method, 0) + 1
+            else:
+                self._credit = min(self.max_credit, self._credit + 1)
+                self.unsent[method] = self.unsent.get(method, 0) + 1
+
+    def _hedge(self, method, send):
+        """``send`` for the hedge, settling its credit before its future completes"""
+        def attempt(hedge):
+            try:
+                response = send(hedge)
+            except NOT_SENT:
+                self._settle(method, False)
+                raise
+            except BaseException:
+                self._settle(method, True)
+                raise
+            self._settle(method, True)
+            return response
+        return attempt
+
+    def _submit(self, send, hedge):
+        # Each attempt runs in a copy of the caller's context, so the rate
+        # limiter priority, request deadline and current trace span carry over
+        return self._executor.submit(contextvars.copy_context().run, send, hedge)
+
+    @staticmethod
+    def _start(send, hedge):
+        """Run ``send(hedge)`` on a new thread now, outside the pool (in a copy of the caller's context too)"""
+        future = Future()
+        context = contextvars.copy_context()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(context.run(send, hedge))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="gemini-primary", daemon=True).start()
+        return future
+
+    def call(self, method, send):
+        """Return ``send(hedge)``'s response, racing a hedge when it is slow.
+
+        ``send(False)`` makes the primary request and ``send(True)`` the
+        hedge; both must return a requests.Response or raise.
+        """
+        if method not in self.methods:
+            return send(False)
+        with self._lock:
+            self._credit = min(self.max_credit, self._credit + self.budget)
+        delay = self.delay(method)
+        if delay is None:
+            return send(False)
+
+        primary = self._start(send, False)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._spend(method):
+            return primary.result()
+        tracing.current_span().set_attribute("gemini.hedged", True)
+        hedge = self._submit(self._hedge(method, send), True)
+
+        pending = {primary, hedge}
+        winner = None
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Prefer the primary when both finished in the same instant
+            for future in sorted(done, key=lambda f: f is not primary):
+                if _answered(future):
+                    winner = future
+                    break
+        if winner is None:
+            # Neither answered; report the primary's failure
+            return primary.result()
+        if winner is hedge:
+            with self._lock:
+                self.won[method] = self.won.get(method, 0) + 1
+        loser = primary if winner is hedge else hedge
+        if loser.cancel() and loser is hedge:
+            self._settle(method, False)
+        loser.add_done_callback(_close)
+        return winner.result()
+
+    def collect(self):
+        """Metric families for metrics.REGISTRY"""
+        with self._lock:
+            fired, won, denied, unsent = dict(self.fired), dict(self.won), dict(self.denied), dict(self.unsent)
+        delays = {method: self.delay(method) for method in self.methods}
+        return [
+            ("gemini_hedges_fired_total", "counter", "Second requests sent because Gemini was slow to answer",
+             [("", {"method": method}, count) for method, count in fired.items()]),
+            ("gemini_hedges_won_total", "counter", "Hedged calls answered by the second request",
+             [("", {"method": method}, count) for method, count in won.items()]),
+            ("gemini_hedges_denied_total", "counter", "Hedges skipped because the hedge budget was spent",
+             [("", {"method": method}, count) for method, count in denied.items()]),
+            ("gemini_hedges_unsent_total", "counter", "Hedges refused before sending, their budget given back",
+             [("", {"method": method}, count) for method, count in unsent.items()]),
+            ("gemini_hedge_delay_seconds", "gauge", "Current wait before a call is hedged",
+             [("", {"method": method}, delay) for method, delay in delays.items() if delay is not None]),
+        ]
@@ -0,0 +1,53 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Pool tuning (all optional)
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))   # distinct hosts kept in the pool
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))          # keep-alive connections per host
+POOL_BLOCK = os.getenv("HTTP_POOL_BLOCK", "false").lower() == "true"  # wait for a free connection instead of opening extra ones
+
+_session = None
+_session_pid = None
+_lock = threading.Lock()
+
+
+def create_session(pool_connections=None, pool_maxsize=None, pool_block=None):
+    """Build a requests.Session backed by a keep-alive connection pool"""
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections or POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize or POOL_MAXSIZE,
+        pool_block=POOL_BLOCK if pool_block is None else pool_block,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+def get_session():
+    """Return the process-wide pooled session.
+
+    The session is created lazily and re-created after a fork, so every
+    gunicorn worker gets its own pool instead of sharing sockets with the master.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            if _session is None or _session_pid != pid:
+                _session = create_session()
+                _session_pid = pid
+    return _session
+
+
+def reset_session():
+    """Close the shared session (mainly for tests and shutdown)"""
+    global _session, _session_pid
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pid = None
@@ -0,0 +1,234 @@
+import os
+import random
+import threading
+import time
+from progress import level_for_xp
+
+# How stale the in-memory ranking may get relative to user_progress, which
+# other workers and replicas also write to
+REFRESH_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "15"))
+
+_MAX_LEVEL = 32
+
+
+class _Node:
+    __slots__ = ("key", "next", "span")
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level
+        # span[i]: how many positions next[i] is ahead of this node
+        self.span = [0] * level
+
+
+class IndexableSkipList:
+    """Sorted set of keys with O(log n) insert, remove, rank and index lookup.
+
+    Each forward pointer records how many positions it skips, so ranks are
+    summed on the way down instead of counted (the layout Redis uses for
+    sorted sets). Keys must be unique and comparable.
+    """
+
+    def __init__(self, seed=None):
+        self._head = _Node(None, _MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_sorted(cls, keys, seed=None):
+        """Build from keys already in ascending order in O(n)"""
+        skiplist = cls(seed)
+        last = [skiplist._head] * _MAX_LEVEL
+        last_position = [0] * _MAX_LEVEL
+        position = 0
+        for position, key in enumerate(keys, 1):
+            level = skiplist._random_level()
+            node = _Node(key, level)
+            for i in range(level):
+                last[i].next[i] = node
+                last[i].span[i] = position - last_position[i]
+                last[i], last_position[i] = node, position
+            skiplist._level = max(skiplist._level, level)
+        for i in range(skiplist._level):
+            last[i].span[i] = position - last_position[i]
+        skiplist._size = position
+        return skiplist
+
+    def __len__(self):
+        return self._size
+
+    def _random_level(self):
+        level = 1
+        while level < _MAX_LEVEL and self._random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key):
+        update = [self._head] * _MAX_LEVEL
+        rank = [0] * _MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while node.next[i] is not None and node.next[i].key < key:
+                rank[i] += node.span[i]
+                node = node.next[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                rank[i] = 0
+                update[i] = self._head
+                self._head.span[i] = self._size
+            self._level = level
+
+        new = _Node(key, level)
+        for i in range(level):
+            new.next[i] = update[i].next[i]
+            update[i].next[i] = new
+            new.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+        self._size += 1
+
+    def remove(self, key):
+        """Remove ``key``; returns False if it was not present"""
+        update = [self._head] * _MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key < key:
+                node = node.next[i]
+            update[i] = node
+        node = node.next[0]
+        if node is None or node.key != key:
+            return False
+        for i in range(self._level):
+            if update[i].next[i] is node:
+                update[i].span[i] += node.span[i] - 1
+                update[i].next[i] = node.next[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def rank(self, key):
+        """1-based position of ``key``, or None"""
+        node = self._head
+        rank = 0
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key <= key:
+                rank += node.span[i]
+                node = node.next[i]
+            if node is not self._head and node.key == key:
+                return rank
+        return None
+
+    def _node_at(self, rank):
+        node = self._head
+        traversed = 0
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and traversed + node.span[i] <= rank:
+                traversed += node.span[i]
+                node = node.next[i]
+            if traversed == rank:
+                return node
+        return None
+
+    def slice(self, start, count):
+        """Up to ``count`` keys starting at 1-based position ``start``"""
+        node = self._node_at(max(start, 1))
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class Leaderboard:
+    """XP ranking of every user, highest first; ties go to the lower user id.
+
+    Fed directly by completions in this process and refreshed incrementally
+    from the user_progress table (rows updated since the last refresh), which
+    is where the rankings are persisted.
+    """
+
+    def __init__(self, refresh_seconds=REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._xp = {}
+        self._list = IndexableSkipList()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._since = None
+        self._refreshed = 0.0
+
+    def __len__(self):
+        return len(self._list)
+
+    def update(self, user_id, xp):
+        with self._lock:
+            old = self._xp.get(user_id)
+            if old == xp:
+                return
+            if old is not None:
+                self._list.remove((-old, user_id))
+            self._xp[user_id] = xp
+            self._list.insert((-xp, user_id))
+
+    def rank(self, user_id):
+        """1-based position, or None for users with no XP recorded"""
+        with self._lock:
+            xp = self._xp.get(user_id)
+            return None if xp is None else self._list.rank((-xp, user_id))
+
+    def top(self, k):
+        with self._lock:
+            return self._entries(1, k)
+
+    def around(self, user_id, n=2):
+        """The user with up to ``n`` users either side of them"""
+        with self._lock:
+            xp = self._xp.get(user_id)
+            if xp is None:
+                return []
+            rank = self._list.rank((-xp, user_id))
+            start = max(1, rank - n)
+            return self._entries(start, rank + n - start + 1)
+
+    def _entries(self, start, count):
+        return [{"rank": start + i, "user_id": user_id, "xp": -neg_xp, "level": level_for_xp(-neg_xp)}
+                for i, (neg_xp, user_id) in enumerate(self._list.slice(start, count))]
+
+    def load(self, fetch):
+        """Rebuild from ``fetch(None)``, which returns (cursor, [(user_id, xp)])"""
+        since, rows = fetch(None)
+        xp_by_user = dict(rows)
+        board = IndexableSkipList.from_sorted(sorted((-xp, user_id) for user_id, xp in xp_by_user.items()))
+        with self._lock:
+            self._xp, self._list = xp_by_user, board
+            self._since, self._refreshed = since, time.monotonic()
+
+    def maybe_refresh(self, fetch):
+        """Apply rows changed since the last refresh once it is stale.
+
+        Only one caller refreshes at a time; the rest keep reading the
+        current ranking.
+        """
+        if time.monotonic() - self._refreshed < self.refresh_seconds:
+            return False
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            since, rows = fetch(self._since)
+            for user_id, xp in rows:
+                self.update(user_id, xp)
+            self._since, self._refreshed = since, time.monotonic()
+            return True
+        finally:
+            self._refresh_lock.release()
+
+
+leaderboard = Leaderboard()
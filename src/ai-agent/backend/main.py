@@ -1,189 +1,43 @@
-import os, requests, re
-from flask import Flask, jsonify, request
+import os, re, json, threading, time
+import jwt
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-from gemini_client import GeminiClient
-from database import init_db, set_goal as db_set_goal, get_latest_goal, save_challenge
-
-def generate_static_achievements(user_stats):
-    """Generate static achievements when AI fails"""
-    achievements = []
-    
-    # Basic achievements that everyone can get
-    achievements.append({
-        "id": "first_login",
-        "name": "Welcome Aboard!",
-        "emoji": "👋",
-        "description": "You've started your financial journey",
-        "unlocked": True,
-        "unlocked_message": "Welcome to BankQuest! Your financial adventure begins now!"
-    })
-    
-    # Level-based achievements
-    if user_stats.get('level', 1) >= 2:
-        achievements.append({
-            "id": "level_up",
-            "name": "Rising Star",
-            "emoji": "⭐",
-            "description": "Reached level 2",
-            "unlocked": True,
-            "unlocked_message": "You're leveling up your financial game!"
-        })
-    else:
-        achievements.append({
-            "id": "level_up",
-            "name": "Rising Star",
-            "emoji": "⭐",
-            "description": "Reach level 2",
-            "unlocked": False
-        })
-    
-    # Challenge-based achievements
-    if user_stats.get('completed_challenges', 0) >= 1:
-        achievements.append({
-            "id": "first_challenge",
-            "name": "Challenge Accepted",
-            "emoji": "🎯",
-            "description": "Completed your first challenge",
-            "unlocked": True,
-            "unlocked_message": "Great job completing your first challenge!"
-        })
-    else:
-        achievements.append({
-            "id": "first_challenge",
-            "name": "Challenge Accepted",
-            "emoji": "🎯",
-            "description": "Complete your first challenge",
-            "unlocked": False
-        })
-    
-    if user_stats.get('completed_challenges', 0) >= 5:
-        achievements.append({
-            "id": "challenge_master",
-            "name": "Challenge Master",
-            "emoji": "🏆",
-            "description": "Completed 5 challenges",
-            "unlocked": True,
-            "unlocked_message": "You're becoming a financial challenge master!"
-        })
-    else:
-        achievements.append({
-            "id": "challenge_master",
-            "name": "Challenge Master",
-            "emoji": "🏆",
-            "description": "Complete 5 challenges",
-            "unlocked": False
-        })
-    
-    # Streak-based achievements
-    if user_stats.get('streak', 0) >= 3:
-        achievements.append({
-            "id": "streak_starter",
-            "name": "Streak Starter",
-            "emoji": "🔥",
-            "description": "Built a 3-day streak",
-            "unlocked": True,
-            "unlocked_message": "You're on fire with that 3-day streak!"
-        })
-    else:
-        achievements.append({
-            "id": "streak_starter",
-            "name": "Streak Starter",
-            "emoji": "🔥",
-            "description": "Build a 3-day streak",
-            "unlocked": False
-        })
-    
-    if user_stats.get('streak', 0) >= 7:
-        achievements.append({
-            "id": "week_warrior",
-            "name": "Week Warrior",
-            "emoji": "💪",
-            "description": "Built a 7-day streak",
-            "unlocked": True,
-            "unlocked_message": "Amazing! A full week of consistent financial habits!"
-        })
-    else:
-        achievements.append({
-            "id": "week_warrior",
-            "name": "Week Warrior",
-            "emoji": "💪",
-            "description": "Build a 7-day streak",
-            "unlocked": False
-        })
-    
-    # Goal-based achievements
-    if user_stats.get('goals_set', 0) >= 1:
-        achievements.append({
-            "id": "goal_setter",
-            "name": "Goal Setter",
-            "emoji": "🎯",
-            "description": "Set your first financial goal",
-            "unlocked": True,
-            "unlocked_message": "Excellent! You've set your first financial goal!"
-        })
-    else:
-        achievements.append({
-            "id": "goal_setter",
-            "name": "Goal Setter",
-            "emoji": "🎯",
-            "description": "Set your first financial goal",
-            "unlocked": False
-        })
-    
-    # XP-based achievements
-    if user_stats.get('xp', 0) >= 100:
-        achievements.append({
-            "id": "xp_collector",
-            "name": "XP Collector",
-            "emoji": "💎",
-            "description": "Earned 100+ XP",
-            "unlocked": True,
-            "unlocked_message": "You're collecting XP like a pro!"
-        })
-    else:
-        achievements.append({
-            "id": "xp_collector",
-            "name": "XP Collector",
-            "emoji": "💎",
-            "description": "Earn 100+ XP",
-            "unlocked": False
-        })
-    
-    # Calculate next milestone
-    unlocked_count = len([a for a in achievements if a.get('unlocked', False)])
-    total_count = len(achievements)
-    
-    next_milestone = None
-    if unlocked_count < total_count:
-        # Find next unlockable achievement
-        for achievement in achievements:
-            if not achievement.get('unlocked', False):
-                next_milestone = {
-                    "name": achievement['name'],
-                    "emoji": achievement['emoji'],
-                    "description": achievement['description'],
-                    "progress": unlocked_count / total_count,
-                    "requirement": f"Currently {unlocked_count}/{total_count} achievements unlocked"
-                }
-                break
-    
-    return {
-        "achievements": achievements,
-        "next_milestone": next_milestone
-    }
+from gemini_client import BATCH_SIZE, get_gemini_client
+from context_cache import get_user_context, user_context_cache
+from challenge_queue import ChallengeQueue
+from batcher import MicroBatcher
+import metrics
+import tracing
+from database import init_db, set_goal as db_set_goal, get_latest_goal, save_challenge, update_parsed_goal
+from database import claim_goal_reparse
+from database import find_user_challenge, record_completion, get_user_stats, leaderboard_updates
+from leaderboard import leaderboard
+from progress import level_for_xp, xp_for_reward
+from achievements import PERSONALIZE, AchievementEngine, MessagePersonalizer
+from rate_limiter import BACKGROUND, priority
+from deadline import DeadlineExceeded, current as current_deadline, route_deadline, within
+from transaction_features import summarize_transactions
+from analytics import SpendingAnalytics
 
 def parse_goal(goal_text):
     """Parse goal text with AI fallback to regex"""
+    parsed, _ = parse_goal_with_source(goal_text)
+    return parsed
+
+def parse_goal_with_source(goal_text):
+    """Parse goal text, returning (parsed_goal, 'ai' or 'fallback')"""
     try:
-        gemini = GeminiClient()
-        parsed = gemini.parse_goal(goal_text)
+        gemini = get_gemini_client()
+        parsed = gemini.parse_goal(goal_text, allow_fallback=False)
         if parsed and 'error' not in parsed:
-            return parsed
+            return parsed, 'ai'
     except Exception as e:
         print(f"AI goal parsing failed: {e}")
-    
-    # Fallback to regex parsing
-    import re
+    return parse_goal_fallback(goal_text), 'fallback'
+
+def parse_goal_fallback(goal_text):
+    """Regex goal parsing used when Gemini is unavailable"""
     
     # Extract amount - try multiple patterns
     amount = 0
@@ -235,12 +89,135 @@ def parse_goal(goal_text):
         "raw_text": goal_text
     }
 
+def build_challenge_profile(context):
+    """Turn a user context into (user_profile, user_goal) for challenge prompts"""
+    transactions = context["transactions"]
+    analytics = context.get("analytics") or SpendingAnalytics.from_transactions(transactions)
+
+    # User's goal comes with the cached context
+    goal_row = context["goal"]
+    user_goal = goal_row["goal_text"] if goal_row else None
+
+    user_profile = {
+        'balance': context["balance"],
+        'transaction_count': len(transactions),
+        'recent_spending': analytics.recent_spending(20),
+        'features': context.get("features") or summarize_transactions(transactions)
+    }
+    return user_profile, user_goal
+
+def token_account(auth_header, public_key):
+    """The ``acct`` claim of a bearer token signed with the ledger's key, or
+    None if the token is invalid or there is no key to check it with"""
+    if not public_key:
+        print("DEBUG: PUB_KEY_PATH is not set, cannot verify tokens")
+        return None
+    try:
+        payload = jwt.decode(auth_header.split(" ")[-1], key=public_key, algorithms="RS256")
+    except jwt.exceptions.InvalidTokenError as e:
+        print(f"DEBUG: Rejected token: {e}")
+        return None
+    return payload.get("acct")
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Challenges are generated ahead of time and popped by GET /challenges
+challenge_queue = ChallengeQueue(
+    lambda user_profile: get_gemini_client().generate_challenge(user_profile, allow_fallback=False)
+)
+
+# Streak and leaderboard requests arriving within GEMINI_BATCH_WINDOW_MS of
+# each other share one packed Gemini call
+BATCH_WINDOW = int(os.getenv("GEMINI_BATCH_WINDOW_MS", "20")) / 1000
+streak_batcher = MicroBatcher(
+    lambda items: get_gemini_client().generate_streak_messages(items), BATCH_SIZE, BATCH_WINDOW)
+leaderboard_context_batcher = MicroBatcher(
+    lambda entries: get_gemini_client().generate_leaderboard_contexts(entries), BATCH_SIZE, BATCH_WINDOW)
+
+def batched(batcher, item):
+    """``item``'s answer from ``batcher``, waiting no longer than the request
+    deadline; a missed deadline gives the same error shape as a failed call"""
+    deadline = current_deadline()
+    try:
+        return batcher.submit(item, deadline.remaining() if deadline else None)
+    except DeadlineExceeded as e:
+        return {"error": f"Request failed: {str(e)}"}
+
+# Achievements are evaluated by rules; Gemini only rewords unlock messages,
+# in the background
+achievement_engine = AchievementEngine(personalizer=MessagePersonalizer(
+    lambda achievement: get_gemini_client().generate_achievement_message(achievement)
+) if PERSONALIZE else None)
+
+# Goals stored with regex-parsed fields are re-parsed off the request path,
+# at most GOAL_REPARSE_ATTEMPTS times per goal, waiting GOAL_REPARSE_BACKOFF
+# seconds after the first attempt and doubling the wait after each one
+_reparse_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="goal-reparse")
+_reparse_pending = set()
+_reparse_lock = threading.Lock()
+GOAL_REPARSE_ATTEMPTS = int(os.getenv("GOAL_REPARSE_ATTEMPTS", "5"))
+GOAL_REPARSE_BACKOFF = float(os.getenv("GOAL_REPARSE_BACKOFF", "60"))
+
+def schedule_goal_reparse(goal_id, goal_text, attempts=0, last_attempt=None):
+    """Retry AI parsing for a stored goal in the background, if one is due.
+
+    ``attempts`` and ``last_attempt`` come from the goal row; the attempt is
+    claimed on the row, so reads on any worker queue at most one re-parse
+    per backoff window.
+    """
+    attempts = attempts or 0
+    if attempts >= GOAL_REPARSE_ATTEMPTS:
+        return
+    now = time.time()
+    if last_attempt is not None and now < last_attempt + GOAL_REPARSE_BACKOFF * 2 ** (attempts - 1):
+        return
+    with _reparse_lock:
+        if goal_id in _reparse_pending:
+            return
+        _reparse_pending.add(goal_id)
+    try:
+        claimed = claim_goal_reparse(goal_id, attempts, now)
+    except Exception as e:
+        print(f"Could not claim goal re-parse: {e}")
+        claimed = False
+    if not claimed:
+        with _reparse_lock:
+            _reparse_pending.discard(goal_id)
+        return
+
+    def reparse():
+        try:
+            with priority(BACKGROUND):
+                parsed = get_gemini_client().parse_goal(goal_text, allow_fallback=False)
+            if parsed and 'error' not in parsed:
+                update_parsed_goal(goal_id, parsed, 'ai')
+                print(f"Re-parsed goal {goal_id} with AI")
+        except Exception as e:
+            print(f"Background goal re-parse failed: {e}")
+        finally:
+            with _reparse_lock:
+                _reparse_pending.discard(goal_id)
+
+    _reparse_executor.submit(reparse)
+
 
 def create_app():
     app = Flask(__name__)
     
     # Enable CORS for frontend requests - allow all origins for development
     CORS(app, origins="*", supports_credentials=True)
+
+    if os.getenv("ENABLE_TRACING", "false") == "true":
+        print("Tracing enabled, exporting spans to Cloud Trace")
+        tracing.setup(app)
+    else:
+        print("Tracing disabled")
+
+    # Public half of the userservice's JWT key, as mounted for the other
+    # Bank of Anthos services; routes that change XP verify tokens with it
+    pub_key_path = os.getenv("PUB_KEY_PATH")
+    app.config["PUBLIC_KEY"] = open(pub_key_path, "r").read() if pub_key_path else None
     
     # Initialize database on startup
     try:
@@ -250,6 +227,8 @@ def create_app():
         # Test database connection
         test_goal = get_latest_goal("test_user")
         print(f"Database test query result: {test_goal}")
+        leaderboard.load(leaderboard_updates)
+        print(f"Leaderboard loaded with {len(leaderboard)} users")
     except Exception as e:
         print(f"Database initialization error: {str(e)}")
         print("Continuing without database (will cause errors)")
@@ -269,70 +248,15 @@ def create_app():
                 print("DEBUG: No Authorization header")
                 return jsonify({"error": "Authorization header required"}), 401
             
-            headers = {"Authorization": auth_header}
-            print(f"DEBUG: Using headers: {headers}")
-            
-            # Check if running locally (no Kubernetes services available)
-            try:
-                # Try to get balance and transactions with authentication
-                print("DEBUG: Calling balancereader service...")
-                balance_response = requests.get(f"http://balancereader:8080/balances/{user_id}", headers=headers, timeout=2)
-                print(f"DEBUG: Balance response status: {balance_response.status_code}")
-                balance_raw = balance_response.json() if balance_response.status_code == 200 else 0
-                # Convert from cents to dollars
-                balance = balance_raw / 100 if isinstance(balance_raw, (int, float)) else 0
-                print(f"DEBUG: Balance (raw): {balance_raw}, Balance (converted): {balance}")
-                
-                print("DEBUG: Calling transactionhistory service...")
-                history_response = requests.get(f"http://transactionhistory:8080/transactions/{user_id}", headers=headers, timeout=2)
-                print(f"DEBUG: History response status: {history_response.status_code}")
-                transactions = history_response.json() if history_response.status_code == 200 else []
-                print(f"DEBUG: Transactions count: {len(transactions)}")
-                
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-                print(f"DEBUG: Running locally - using fake data: {e}")
-                # Use fake data for local testing
-                import random
-                balance = random.choice([1500.0, 2500.0, 5000.0, 7500.0])
-                transactions = [
-                    {"amount": random.choice([-15.99, -8.50, -25.00, -12.75]), "description": random.choice(["Coffee", "Lunch", "Gas", "Groceries"])},
-                    {"amount": random.choice([-45.00, -32.99, -67.50]), "description": random.choice(["Shopping", "Entertainment", "Dining"])},
-                    {"amount": random.choice([-120.00, -89.99, -156.75]), "description": random.choice(["Utilities", "Phone bill", "Subscription"])}
-                ]
-                print(f"DEBUG: Using fake balance: {balance}, fake transactions: {len(transactions)}")
-            
-<<<<<<< HEAD
-            # For demo purposes, if balance is 0 and user_id is 'demo_user', give them some demo balance
-            if balance == 0 and user_id == 'demo_user':
-                balance = 1500.00  # Demo balance for testing
-                print(f"DEBUG: Setting demo balance for user {user_id}: {balance}")
-
-            # For demo purposes, if no transactions and user_id is 'demo_user', add some demo transactions
-            if len(transactions) == 0 and user_id == 'demo_user':
-                transactions = [
-                    {"amount": 2500, "fromAccountNum": "demo_user", "toAccountNum": "demo_user", "description": "Initial deposit"},
-                    {"amount": -150, "fromAccountNum": "demo_user", "toAccountNum": "1011226112", "description": "Coffee purchase"},
-                    {"amount": -75, "fromAccountNum": "demo_user", "toAccountNum": "1011226113", "description": "Lunch"}
-=======
-            # For demo purposes, if balance is 0 and user_id is '1011226111', give them some demo balance
-            if balance == 0 and user_id == '1011226111':
-                balance = 1500.00  # Demo balance for testing
-                print(f"DEBUG: Setting demo balance for user {user_id}: {balance}")
-
-            # For demo purposes, if no transactions and user_id is '1011226111', add some demo transactions
-            if len(transactions) == 0 and user_id == '1011226111':
-                transactions = [
-                    {"amount": 2500, "fromAccountNum": "1011226111", "toAccountNum": "1011226111", "description": "Initial deposit"},
-                    {"amount": -150, "fromAccountNum": "1011226111", "toAccountNum": "1011226112", "description": "Coffee purchase"},
-                    {"amount": -75, "fromAccountNum": "1011226111", "toAccountNum": "1011226113", "description": "Lunch"}
->>>>>>> d0e866a498243d821f8d358895ff6268792f5cd0
-                ]
-                print(f"DEBUG: Setting demo transactions for user {user_id}: {len(transactions)} transactions")
+            # Balance, history and goal (shared briefly across dashboard routes)
+            context = get_user_context(user_id, auth_header)
+            balance = context["balance"]
+            transactions = context["transactions"]
 
             recent_transactions = transactions[:5]  # Get last 5 transactions for display
 
-            # Get user's goal from database
-            goal_row = get_latest_goal(user_id)
+            # User's goal comes with the cached context
+            goal_row = context["goal"]
             user_goal = goal_row["goal_text"] if goal_row else None
 
             # Validate transaction data and convert amounts from cents to dollars
@@ -346,7 +270,6 @@ def create_app():
                     valid_transactions.append(t_copy)
             
             # Get user name from JWT token
-            import jwt
             try:
                 token = auth_header.replace('Bearer ', '')
                 decoded = jwt.decode(token, options={"verify_signature": False})
@@ -368,12 +291,19 @@ def create_app():
             print(f"DEBUG: Exception in get_user_profile: {str(e)}")
             return jsonify({"error": f"Failed to get user profile: {str(e)}"}), 500
     
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """Prometheus metrics (circuit breakers, LLM cache)"""
+        get_gemini_client()  # registers the shared client's collectors
+        return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
     @app.route('/version', methods=['GET'])
     def version():
         return os.environ.get('VERSION', '1.0.0'), 200
     
     # Set user goal endpoint - now with database
     @app.route('/goals/<user_id>', methods=['POST'])
+    @route_deadline
     def set_goal(user_id):
         try:
             goal_data = request.get_json(silent=True) or {}
@@ -382,11 +312,12 @@ def create_app():
             if not goal_text:
                 return jsonify({"error": "Goal is required"}), 400
             
-            # Parse goal for frontend display
-            parsed_goal = parse_goal(goal_text)
-            
-            # Store goal in database
-            db_set_goal(user_id, goal_text)
+            # Parse goal once and store it with the goal row
+            parsed_goal, parse_source = parse_goal_with_source(goal_text)
+            goal_id = db_set_goal(user_id, goal_text, parsed_goal, parse_source)
+            user_context_cache.invalidate(user_id)
+            if parse_source == 'fallback':
+                schedule_goal_reparse(goal_id, goal_text)
             
             return jsonify({
                 "message": "Goal set successfully",
@@ -400,6 +331,7 @@ def create_app():
     
     # Get user goal endpoint - now with database
     @app.route('/goals/<user_id>', methods=['GET'])
+    @route_deadline
     def get_goal(user_id):
         try:
             print(f"Attempting to get goal for user: {user_id}")
@@ -415,8 +347,16 @@ def create_app():
                     "parsed_goal": None
                 }), 200
             
-            # Parse goal for frontend display
-            parsed_goal = parse_goal(goal_row["goal_text"])
+            parsed_goal = goal_row["parsed_goal"]
+            if parsed_goal is None:
+                # Goal stored before parsed goals were persisted: parse it once
+                parsed_goal, parse_source = parse_goal_with_source(goal_row["goal_text"])
+                update_parsed_goal(goal_row["id"], parsed_goal, parse_source)
+            else:
+                parse_source = goal_row["parse_source"]
+            if parse_source == 'fallback':
+                schedule_goal_reparse(goal_row["id"], goal_row["goal_text"],
+                                      goal_row.get("parse_attempts"), goal_row.get("last_parse_attempt"))
             print(f"Parsed goal: {parsed_goal}")
             
             return jsonify({
@@ -439,6 +379,7 @@ def create_app():
             }), 200
     
     @app.route('/challenges/<user_id>', methods=['GET'])
+    @route_deadline
     def get_challenge(user_id):
         try:
             # Get JWT token from Authorization header
@@ -446,90 +387,19 @@ def create_app():
             if not auth_header:
                 return jsonify({"error": "Authorization header required"}), 401
             
-            headers = {"Authorization": auth_header}
-            
-            # Check if running locally (no Kubernetes services available)
-            try:
-                # Try to get balance and transactions with authentication
-                balance_response = requests.get(f"http://balancereader:8080/balances/{user_id}", headers=headers, timeout=2)
-                balance_raw = balance_response.json() if balance_response.status_code == 200 else 0
-                # Convert from cents to dollars
-                balance = balance_raw / 100 if isinstance(balance_raw, (int, float)) else 0
-                
-                history_response = requests.get(f"http://transactionhistory:8080/transactions/{user_id}", headers=headers, timeout=2)
-                transactions = history_response.json() if history_response.status_code == 200 else []
-                
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-                print(f"DEBUG: Running locally - using fake data: {e}")
-                # Use fake data for local testing
-                import random
-                balance = random.choice([1500.0, 2500.0, 5000.0, 7500.0])
-                transactions = [
-                    {"amount": random.choice([-15.99, -8.50, -25.00, -12.75]), "description": random.choice(["Coffee", "Lunch", "Gas", "Groceries"])},
-                    {"amount": random.choice([-45.00, -32.99, -67.50]), "description": random.choice(["Shopping", "Entertainment", "Dining"])},
-                    {"amount": random.choice([-120.00, -89.99, -156.75]), "description": random.choice(["Utilities", "Phone bill", "Subscription"])}
-                ]
-                print(f"DEBUG: Using fake balance: {balance}, fake transactions: {len(transactions)}")
-            
-<<<<<<< HEAD
-            # For demo purposes, if balance is 0 and user_id is 'demo_user', give them some demo balance
-            if balance == 0 and user_id == 'demo_user':
-                balance = 1500.00  # Demo balance for testing
-                print(f"DEBUG: Setting demo balance for user {user_id}: {balance}")
-
-            # For demo purposes, if no transactions and user_id is 'demo_user', add some demo transactions
-            if len(transactions) == 0 and user_id == 'demo_user':
-                transactions = [
-                    {"amount": 2500, "fromAccountNum": "demo_user", "toAccountNum": "demo_user", "description": "Initial deposit"},
-                    {"amount": -150, "fromAccountNum": "demo_user", "toAccountNum": "1011226112", "description": "Coffee purchase"},
-                    {"amount": -75, "fromAccountNum": "demo_user", "toAccountNum": "1011226113", "description": "Lunch"}
-=======
-            # For demo purposes, if balance is 0 and user_id is '1011226111', give them some demo balance
-            if balance == 0 and user_id == '1011226111':
-                balance = 1500.00  # Demo balance for testing
-                print(f"DEBUG: Setting demo balance for user {user_id}: {balance}")
-
-            # For demo purposes, if no transactions and user_id is '1011226111', add some demo transactions
-            if len(transactions) == 0 and user_id == '1011226111':
-                transactions = [
-                    {"amount": 2500, "fromAccountNum": "1011226111", "toAccountNum": "1011226111", "description": "Initial deposit"},
-                    {"amount": -150, "fromAccountNum": "1011226111", "toAccountNum": "1011226112", "description": "Coffee purchase"},
-                    {"amount": -75, "fromAccountNum": "1011226111", "toAccountNum": "1011226113", "description": "Lunch"}
->>>>>>> d0e866a498243d821f8d358895ff6268792f5cd0
-                ]
-                print(f"DEBUG: Setting demo transactions for user {user_id}: {len(transactions)} transactions")
-
-            recent_transactions = transactions[:20]
-
-            # Get user's goal from database
-            goal_row = get_latest_goal(user_id)
-            user_goal = goal_row["goal_text"] if goal_row else None
-
-            # Validate transaction data and calculate spending safely (convert amounts from cents to dollars)
-            valid_transactions = []
-            recent_spending = 0
-            for t in recent_transactions:
-                if isinstance(t, dict) and 'amount' in t:
-                    # Convert amount from cents to dollars
-                    t_copy = t.copy()
-                    if isinstance(t_copy['amount'], (int, float)):
-                        t_copy['amount'] = t_copy['amount'] / 100
-                    valid_transactions.append(t_copy)
-                    recent_spending += t_copy['amount']
-
-            user_profile = {
-                'balance': balance,
-                'transactions': valid_transactions,
-                'transaction_count': len(transactions),
-                'recent_spending': recent_spending
-            }
+            # Balance, history and goal (shared briefly across dashboard routes)
+            context = get_user_context(user_id, auth_header)
+            user_profile, user_goal = build_challenge_profile(context)
             
-            # Generate AI challenge with user's goal
-            gemini = GeminiClient()
-            challenge_data = gemini.generate_challenge(user_profile, user_goal)
+            # Serve a pre-generated challenge when one is ready
+            challenge_data = challenge_queue.pop(user_id, user_profile)
+            if challenge_data is None:
+                # Queue empty - generate AI challenge with user's goal
+                gemini = get_gemini_client()
+                challenge_data = gemini.generate_challenge(user_profile, user_goal)
 
-            # Save challenge to database
-            save_challenge(user_id, challenge_data)
+                # Save challenge to database
+                save_challenge(user_id, challenge_data)
 
             return jsonify({
                 "title": challenge_data.get("title", ""),
@@ -541,69 +411,145 @@ def create_app():
                 "goal_recommendation": challenge_data["goal_recommendation"],
                 "tips": challenge_data["tips"],
                 "user_goal": user_goal,
-                "user_balance": balance,
-                "transaction_count": len(transactions),
-                "recent_spending": recent_spending
+                "user_balance": user_profile['balance'],
+                "transaction_count": user_profile['transaction_count'],
+                "recent_spending": user_profile['recent_spending']
             }), 200
             
         except Exception as e:
             return jsonify({"error": f"Failed to get user data: {str(e)}"}), 500
+
+    @app.route('/challenges/<user_id>/stream', methods=['GET'])
+    @route_deadline
+    def stream_challenge(user_id):
+        """Stream a challenge as Server-Sent Events, one event per field"""
+        auth_header = request.headers.get('Authorization')
+        if not auth_header:
+            return jsonify({"error": "Authorization header required"}), 401
+        try:
+            context = get_user_context(user_id, auth_header)
+            user_profile, user_goal = build_challenge_profile(context)
+            queued = challenge_queue.pop(user_id, user_profile)
+        except Exception as e:
+            return jsonify({"error": f"Failed to get user data: {str(e)}"}), 500
+        # The body is generated after the view returns; keep its deadline
+        deadline = current_deadline()
+
+        def events():
+            challenge_data = {}
+            if queued is not None:
+                stream = (("field", name, value) for name, value in queued.items())
+            else:
+                stream = within(deadline, get_gemini_client().stream_challenge(user_profile, user_goal))
+            for event, name, value in stream:
+                if event == "reset":
+                    challenge_data = {}
+                    yield sse_event("reset", {})
+                else:
+                    challenge_data[name] = value
+                    yield sse_event("field", {name: value})
+            if queued is None:
+                try:
+                    save_challenge(user_id, challenge_data)
+                except Exception as e:
+                    print(f"Failed to save streamed challenge: {e}")
+            yield sse_event("done", {
+                **challenge_data,
+                "user_goal": user_goal,
+                "user_balance": user_profile['balance'],
+                "transaction_count": user_profile['transaction_count'],
+                "recent_spending": user_profile['recent_spending']
+            })
+
+        return Response(events(), mimetype='text/event-stream', headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # let nginx forward events immediately
+        })
     
+    @app.route('/challenges/<user_id>/complete', methods=['POST'])
+    def complete_challenge(user_id):
+        """Record a completed challenge; XP comes from the stored challenge"""
+        try:
+            auth_header = request.headers.get('Authorization')
+            if not auth_header:
+                return jsonify({"error": "Authorization header required"}), 401
+            account = token_account(auth_header, app.config["PUBLIC_KEY"])
+            if account is None:
+                return jsonify({"error": "Authentication denied"}), 401
+            if account != user_id:
+                return jsonify({"error": "Token does not belong to this user"}), 403
+            data = request.get_json(silent=True) or {}
+            challenge_text = data.get('challenge')
+            if not isinstance(challenge_text, str) or not challenge_text.strip():
+                return jsonify({"error": "Challenge is required"}), 400
+            challenge = find_user_challenge(user_id, challenge_text)
+            if challenge is None:
+                return jsonify({"error": "No matching challenge for this user"}), 404
+
+            stats = record_completion(user_id, challenge)
+            if stats is None:
+                return jsonify({"error": "Challenge already completed", **get_user_stats(user_id)}), 409
+            leaderboard.update(user_id, stats['xp'])
+
+            xp_gained = xp_for_reward(challenge['xp_reward'])
+            return jsonify({
+                **stats,
+                "xp_gained": xp_gained,
+                "level_up": level_for_xp(stats['xp'] - xp_gained) < stats['level']
+            }), 200
+
+        except Exception as e:
+            return jsonify({"error": f"Failed to record completion: {str(e)}"}), 500
+
+    @app.route('/insights/<user_id>', methods=['GET'])
+    def get_insights(user_id):
+        """Spending analytics over the user's whole transaction history"""
+        try:
+            auth_header = request.headers.get('Authorization')
+            if not auth_header:
+                return jsonify({"error": "Authorization header required"}), 401
+            context = get_user_context(user_id, auth_header)
+            analytics = context.get("analytics") or SpendingAnalytics.from_transactions(context["transactions"])
+            return jsonify({**analytics.insights(), "partial": context.get("partial", [])}), 200
+        except Exception as e:
+            return jsonify({"error": f"Failed to get insights: {str(e)}"}), 500
+
+    @app.route('/progress/<user_id>', methods=['GET'])
+    def get_progress(user_id):
+        """Server-side XP, level, streaks and weekly counts"""
+        try:
+            return jsonify(get_user_stats(user_id)), 200
+        except Exception as e:
+            return jsonify({"error": f"Failed to get progress: {str(e)}"}), 500
+
     @app.route('/achievements/<user_id>', methods=['GET'])
     def get_achievements(user_id):
-        """Get achievement badges for user (AI-generated with fallback)"""
+        """Get achievement badges for user from the achievement catalog"""
         try:
-            # Get user stats from query parameters or database
-            xp = int(request.args.get('xp', 0))
-            level = int(request.args.get('level', 1))
-            completed_challenges = int(request.args.get('completed_challenges', 0))
-            streak = int(request.args.get('streak', 0))
-            days_active = int(request.args.get('days_active', 1))
-            goals_set = int(request.args.get('goals_set', 0))
-            
-            user_stats = {
-                'xp': xp,
-                'level': level,
-                'completed_challenges': completed_challenges,
-                'streak': streak,
-                'days_active': days_active,
-                'goals_set': goals_set
-            }
-            
-            # Try AI first, fallback to static achievements
-            try:
-                gemini = GeminiClient()
-                achievements_data = gemini.generate_achievements(user_stats)
-                if achievements_data and 'error' not in achievements_data:
-                    return jsonify(achievements_data), 200
-            except Exception as ai_error:
-                print(f"AI achievements failed: {ai_error}")
-            
-            # Fallback to static achievements based on user stats
-            achievements = generate_static_achievements(user_stats)
-            return jsonify(achievements), 200
-            
+            # Stats come from the progress engine, not the client
+            return jsonify(achievement_engine.evaluate(get_user_stats(user_id))), 200
         except Exception as e:
             return jsonify({"error": f"Failed to generate achievements: {str(e)}"}), 500
     
     @app.route('/streak-message/<user_id>', methods=['GET'])
+    @route_deadline
     def get_streak_message(user_id):
         """Get AI-generated motivational streak message"""
         try:
-            current_streak = int(request.args.get('current_streak', 0))
-            longest_streak = int(request.args.get('longest_streak', 0))
-            last_challenge = request.args.get('last_challenge', 'None')
-            recent_progress = request.args.get('recent_progress', 'New user')
-            
+            stats = get_user_stats(user_id)
+            if stats['completed_challenges']:
+                recent_progress = f"{stats['weekly_challenges']} challenges completed this week"
+            else:
+                recent_progress = 'New user'
+
             streak_data = {
-                'current_streak': current_streak,
-                'longest_streak': longest_streak,
-                'last_challenge': last_challenge,
+                'current_streak': stats['current_streak'],
+                'longest_streak': stats['longest_streak'],
+                'last_challenge': stats['last_challenge'] or 'None',
                 'recent_progress': recent_progress
             }
             
-            gemini = GeminiClient()
-            streak_message = gemini.generate_streak_message(streak_data)
+            streak_message = batched(streak_batcher, streak_data)
             
             return jsonify(streak_message), 200
             
@@ -611,29 +557,53 @@ def create_app():
             return jsonify({"error": f"Failed to generate streak message: {str(e)}"}), 500
     
     @app.route('/leaderboard-context/<user_id>', methods=['GET'])
+    @route_deadline
     def get_leaderboard_context(user_id):
         """Get AI-generated leaderboard insights and motivation"""
         try:
-            position = int(request.args.get('position', 1))
-            xp = int(request.args.get('xp', 0))
-            level = int(request.args.get('level', 1))
-            weekly_challenges = int(request.args.get('weekly_challenges', 0))
-            
+            # Users without XP yet rank just below everyone else
+            leaderboard.maybe_refresh(leaderboard_updates)
+            position = leaderboard.rank(user_id) or len(leaderboard) + 1
+            stats = get_user_stats(user_id)
             user_stats = {
-                'xp': xp,
-                'level': level,
-                'weekly_challenges': weekly_challenges
+                'xp': stats['xp'],
+                'level': stats['level'],
+                'weekly_challenges': stats['weekly_challenges']
             }
             
-            gemini = GeminiClient()
-            leaderboard_context = gemini.generate_leaderboard_context(user_stats, position)
+            leaderboard_context = batched(leaderboard_context_batcher, (user_stats, position))
             
             return jsonify(leaderboard_context), 200
             
         except Exception as e:
             return jsonify({"error": f"Failed to generate leaderboard context: {str(e)}"}), 500
 
+    @app.route('/leaderboard', methods=['GET'])
+    def get_leaderboard():
+        """Top users by XP"""
+        try:
+            limit = min(int(request.args.get('limit', 10)), 100)
+            leaderboard.maybe_refresh(leaderboard_updates)
+            return jsonify({"top": leaderboard.top(limit), "total_users": len(leaderboard)}), 200
+        except Exception as e:
+            return jsonify({"error": f"Failed to get leaderboard: {str(e)}"}), 500
+
+    @app.route('/leaderboard/<user_id>', methods=['GET'])
+    def get_leaderboard_position(user_id):
+        """A user's rank with the users just above and below them"""
+        try:
+            neighbors = min(int(request.args.get('neighbors', 2)), 25)
+            leaderboard.maybe_refresh(leaderboard_updates)
+            return jsonify({
+                "rank": leaderboard.rank(user_id),
+                "neighbors": leaderboard.around(user_id, neighbors),
+                "total_users": len(leaderboard)
+            }), 200
+        except Exception as e:
+            return jsonify({"error": f"Failed to get leaderboard position: {str(e)}"}), 500
+
     @app.route('/generate-emoji', methods=['POST'])
+    @route_deadline
     def generate_emoji():
         """Generate an appropriate emoji for a financial goal using Gemini"""
         try:
@@ -643,7 +613,7 @@ def create_app():
             if not goal:
                 return jsonify({'emoji': '💰'})
             
-            gemini = GeminiClient()
+            gemini = get_gemini_client()
             emoji = gemini.generate_goal_emoji(goal)
             
             return jsonify({'emoji': emoji})
@@ -654,6 +624,7 @@ def create_app():
             return jsonify({'emoji': '💰'})
 
     @app.route('/additional-tasks/<user_id>', methods=['GET'])
+    @route_deadline
     def get_additional_tasks(user_id):
         try:
             # Get JWT token from Authorization header
@@ -661,24 +632,19 @@ def create_app():
             if not auth_header:
                 return jsonify({"error": "Authorization header required"}), 401
             
-            headers = {"Authorization": auth_header}
-            
-            # Get user context for task generation
-            balance_response = requests.get(f"http://balancereader:8080/balances/{user_id}", headers=headers)
-            balance = balance_response.json() if balance_response.status_code == 200 else 0
+            # Get user context for task generation (shared briefly across dashboard routes)
+            context = get_user_context(user_id, auth_header)
+            balance = context["balance"]
 
-            history_response = requests.get(f"http://transactionhistory:8080/transactions/{user_id}", headers=headers)
-            transactions = history_response.json() if history_response.status_code == 200 else []
-
-            # Get user goal from database
-            goal_row = get_latest_goal(user_id)
+            # User's goal comes with the cached context
+            goal_row = context["goal"]
             user_goal = goal_row["goal_text"] if goal_row else None
 
             # Generate additional tasks using Gemini
-            gemini = GeminiClient()
+            gemini = get_gemini_client()
             user_context = {
                 'balance': balance,
-                'recent_transactions': transactions[:10],  # Last 10 transactions
+                'features': context.get("features") or summarize_transactions(context["transactions"]),
                 'user_goal': user_goal
             }
             
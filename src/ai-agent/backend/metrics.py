@@ -0,0 +1,133 @@
+import bisect
+import threading
+
+# A metric family is (name, type, help, samples) where each sample is
+# (name_suffix, labels, value). Rendered in the Prometheus text format.
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def collect(self):
+        with self._lock:
+            samples = [("", dict(key), value) for key, value in self._values.items()]
+        return [(self.name, self.type, self.documentation, samples)]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """Distribution of observed values over fixed bucket upper bounds"""
+
+    type = "histogram"
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (not cumulative), then sum and count
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * len(self.buckets) + [0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def count(self, **labels):
+        counts = self._values.get(tuple(sorted(labels.items())))
+        return counts[-1] if counts else 0
+
+    def sum(self, **labels):
+        counts = self._values.get(tuple(sorted(labels.items())))
+        return counts[-2] if counts else 0
+
+    def collect(self):
+        samples = []
+        with self._lock:
+            values = [(dict(key), list(counts)) for key, counts in self._values.items()]
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append(("_bucket", {**labels, "le": repr(float(bound))}, cumulative))
+            samples.append(("_bucket", {**labels, "le": "+Inf"}, counts[-1]))
+            samples.append(("_sum", labels, counts[-2]))
+            samples.append(("_count", labels, counts[-1]))
+        return [(self.name, self.type, self.documentation, samples)]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def register_collector(self, collector):
+        """Add a callable returning metric families, evaluated at scrape time"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            sources = [m.collect for m in self._metrics] + list(self._collectors)
+        lines = []
+        for source in sources:
+            for name, metric_type, documentation, samples in source():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for suffix, labels, value in samples:
+                    lines.append(f"{name}{suffix}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
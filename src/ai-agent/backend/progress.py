@@ -0,0 +1,91 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+
+# Same curve as the dashboard: 100 XP per level, starting at level 1
+XP_PER_LEVEL = 100
+# Most XP one challenge can grant; xp_reward is whatever Gemini returned
+MAX_CHALLENGE_XP = XP_PER_LEVEL
+
+# Per-user aggregates kept in the user_progress table. Every completion
+# updates them in O(1) from the previous row, so reads never scan history.
+STAT_COLUMNS = (
+    "user_id", "xp", "level", "completed_challenges", "current_streak", "longest_streak",
+    "days_active", "last_active_day", "week_start", "weekly_challenges", "goals_set", "last_challenge",
+    "category_counts",
+)
+
+
+def level_for_xp(xp):
+    return xp // XP_PER_LEVEL + 1
+
+
+def xp_for_reward(xp_reward):
+    """XP granted for a stored challenge's xp_reward (may be missing or text)"""
+    try:
+        return min(MAX_CHALLENGE_XP, max(0, int(xp_reward or 0)))
+    except (TypeError, ValueError):
+        return 0
+
+
+def week_start(day):
+    """Monday of the week containing ``day``"""
+    return day - timedelta(days=day.weekday())
+
+
+def today():
+    return datetime.now(timezone.utc).date()
+
+
+def empty_stats(user_id):
+    return {
+        "user_id": user_id, "xp": 0, "level": 1, "completed_challenges": 0,
+        "current_streak": 0, "longest_streak": 0, "days_active": 0,
+        "last_active_day": None, "week_start": None, "weekly_challenges": 0,
+        "goals_set": 0, "last_challenge": None, "category_counts": None,
+    }
+
+
+def apply_completion(stats, xp_reward, day, challenge_text=None, category=None):
+    """Return the aggregates after one completed challenge on ``day``.
+
+    A streak counts consecutive days with at least one completion; a second
+    completion on the same day leaves it unchanged.
+    """
+    stats = dict(stats)
+    last = date.fromisoformat(stats["last_active_day"]) if stats["last_active_day"] else None
+    if last != day:
+        stats["current_streak"] = stats["current_streak"] + 1 if last == day - timedelta(days=1) else 1
+        stats["days_active"] += 1
+        stats["last_active_day"] = day.isoformat()
+    stats["longest_streak"] = max(stats["longest_streak"], stats["current_streak"])
+
+    week = week_start(day).isoformat()
+    if stats["week_start"] != week:
+        stats["week_start"] = week
+        stats["weekly_challenges"] = 0
+    stats["weekly_challenges"] += 1
+
+    stats["xp"] += xp_for_reward(xp_reward)
+    stats["level"] = level_for_xp(stats["xp"])
+    stats["completed_challenges"] += 1
+    if challenge_text:
+        stats["last_challenge"] = challenge_text
+    if category:
+        # Stored as JSON text: {category: completed count}
+        counts = json.loads(stats["category_counts"] or "{}")
+        counts[category] = counts.get(category, 0) + 1
+        stats["category_counts"] = json.dumps(counts, sort_keys=True)
+    return stats
+
+
+def current_stats(stats, day):
+    """Aggregates as of ``day``: a streak missed yesterday reads as broken
+    and a new week starts from zero, without rewriting the stored row"""
+    stats = dict(stats)
+    last = date.fromisoformat(stats["last_active_day"]) if stats["last_active_day"] else None
+    if last is None or last < day - timedelta(days=1):
+        stats["current_streak"] = 0
+    if stats["week_start"] != week_start(day).isoformat():
+        stats["weekly_challenges"] = 0
+    stats["category_counts"] = json.loads(stats["category_counts"] or "{}")
+    return stats
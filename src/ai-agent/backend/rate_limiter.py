@@ -0,0 +1,197 @@
+import os
+import re
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Priority classes, most important first. Interactive requests are users
+# waiting on a route; background work (queue refills, re-parses, batch
+# precomputation) can wait longer; emoji have a default and go last.
+INTERACTIVE, BACKGROUND, EMOJI = "interactive", "background", "emoji"
+PRIORITIES = {INTERACTIVE: 0, BACKGROUND: 1, EMOJI: 2}
+
+# Longest a call may queue for a token before giving up
+DEFAULT_MAX_WAIT = {INTERACTIVE: 5.0, BACKGROUND: 60.0, EMOJI: 2.0}
+
+_priority = ContextVar("gemini_priority", default=None)
+
+
+class RateLimitedError(Exception):
+    """Raised when a call could not get a token before its deadline"""
+
+
+@contextmanager
+def priority(name):
+    """Run Gemini calls made inside the block at priority ``name``"""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority(default=INTERACTIVE):
+    return _priority.get() or default
+
+
+def retry_after(response):
+    """Seconds to back off from a 429: Retry-After, else Gemini's RetryInfo"""
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            pass
+    try:
+        details = response.json().get("error", {}).get("details", [])
+    except (ValueError, AttributeError):
+        return None
+    for detail in details:
+        match = re.fullmatch(r"([\d.]+)s", str(detail.get("retryDelay", "")))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class RateLimiter:
+    """Token bucket in front of Gemini with prioritized, deadline-bound queueing.
+
+    Tokens refill at ``rate`` per second up to ``burst``. Callers that find
+    the bucket empty queue up; the waiting caller with the best priority
+    (then the earliest) gets the next token, and any caller still waiting
+    after its priority's max wait gets RateLimitedError, which GeminiClient
+    callers already turn into their fallback.
+
+    A 429 from Gemini pauses every caller until its Retry-After (or an
+    exponential backoff when there is none) and halves the refill rate; each
+    successful call wins back a little of it, so the rate settles just under
+    the quota Gemini is actually enforcing.
+    """
+
+    def __init__(self, rate, burst, max_wait=None, retries=1, min_rate_scale=0.1,
+                 recovery=0.05, backoff=1.0, max_backoff=30.0, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = dict(DEFAULT_MAX_WAIT, **(max_wait or {}))
+        self.retries = retries
+        self.min_rate_scale = min_rate_scale
+        self.recovery = recovery
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.rate_scale = 1.0
+        self.granted = {name: 0 for name in PRIORITIES}
+        self.rejected = {name: 0 for name in PRIORITIES}
+        self.throttled_calls = 0
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._backoff_streak = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls):
+        """The limiter described by GEMINI_RATE_LIMIT_*, or None when disabled.
+
+        The limit applies per worker process.
+        """
+        rpm = float(os.getenv("GEMINI_RATE_LIMIT_RPM", "600"))
+        if rpm <= 0:
+            return None
+        return cls(
+            rate=rpm / 60,
+            burst=int(os.getenv("GEMINI_RATE_LIMIT_BURST", "10")),
+            max_wait={INTERACTIVE: float(os.getenv("GEMINI_RATE_LIMIT_MAX_WAIT", "5"))},
+            retries=int(os.getenv("GEMINI_RATE_LIMIT_RETRIES", "1")),
+        )
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate * self.rate_scale)
+        self._updated = now
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """Wait for a token; raises RateLimitedError after ``timeout`` seconds
+        (by default the priority's max wait)"""
+        if timeout is None:
+            timeout = self.max_wait[priority]
+        entry = (PRIORITIES[priority], next(self._seq))
+        with self._cond:
+            deadline = self.clock() + timeout
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = self.clock()
+                    self._refill(now)
+                    first = self._waiters[0] == entry
+                    if first and now >= self._paused_until and self._tokens >= 1:
+                        self._tokens -= 1
+                        self.granted[priority] += 1
+                        return
+                    if now >= deadline or self._paused_until >= deadline:
+                        # Out of time, or Gemini told us to stay away past it
+                        self.rejected[priority] += 1
+                        raise RateLimitedError(f"No Gemini quota for a {priority} call within {timeout:.1f}s")
+                    wait = deadline - now
+                    if first:
+                        # Sleep until the next token (or the end of a pause);
+                        # everyone else waits to be woken when the head leaves
+                        ready = max(self._paused_until, now + (1 - self._tokens) / (self.rate * self.rate_scale))
+                        wait = min(wait, ready - now)
+                    self._cond.wait(max(wait, 0.001))
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def throttled(self, delay=None):
+        """Gemini answered 429: pause all callers and slow the refill"""
+        with self._cond:
+            self.throttled_calls += 1
+            self._backoff_streak += 1
+            if delay is None:
+                delay = min(self.max_backoff, self.backoff * 2 ** (self._backoff_streak - 1))
+            now = self.clock()
+            self._refill(now)
+            if now >= self._paused_until:
+                # Calls in flight when the quota ran out all come back 429;
+                # count them as one signal
+                self.rate_scale = max(self.min_rate_scale, self.rate_scale / 2)
+            self._paused_until = max(self._paused_until, now + delay)
+            self._tokens = 0.0
+            self._cond.notify_all()
+
+    def succeeded(self):
+        """A call got through: recover some of the refill rate"""
+        with self._cond:
+            self._backoff_streak = 0
+            if self.rate_scale < 1.0:
+                self._refill(self.clock())
+                self.rate_scale = min(1.0, self.rate_scale + self.recovery)
+
+    def waiting(self):
+        with self._cond:
+            counts = {name: 0 for name in PRIORITIES}
+            names = {rank: name for name, rank in PRIORITIES.items()}
+            for rank, _ in self._waiters:
+                counts[names[rank]] += 1
+            return counts
+
+    def collect(self):
+        """Metric families for metrics.REGISTRY"""
+        return [
+            ("gemini_rate_limit_granted_total", "counter", "Gemini calls let through by the rate limiter",
+             [("", {"priority": name}, count) for name, count in self.granted.items()]),
+            ("gemini_rate_limit_rejected_total", "counter", "Gemini calls that gave up waiting for quota",
+             [("", {"priority": name}, count) for name, count in self.rejected.items()]),
+            ("gemini_rate_limit_waiting", "gauge", "Gemini calls queued for quota",
+             [("", {"priority": name}, count) for name, count in self.waiting().items()]),
+            ("gemini_rate_limit_throttled_total", "counter", "429 responses from Gemini",
+             [("", {}, self.throttled_calls)]),
+            ("gemini_rate_limit_rate_scale", "gauge", "Share of the configured rate currently allowed",
+             [("", {}, self.rate_scale)]),
+        ]
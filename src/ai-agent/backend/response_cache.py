@@ -0,0 +1,242 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Seconds a response stays fresh, per GeminiClient method. Methods missing
+# here (or set to 0) bypass the cache; generate_challenge is deliberately
+# left out so users keep getting varied challenges.
+DEFAULT_TTLS = {
+    "parse_goal": 7 * 24 * 3600,
+    "generate_goal_emoji": 7 * 24 * 3600,
+    "generate_achievement_message": 30 * 24 * 3600,
+    "generate_streak_message": 3600,
+    "generate_leaderboard_context": 3600,
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+try:
+    # Per OS thread even under gevent, like database.get_conn: sqlite3 calls
+    # never yield, so a thread's greenlets can share one connection.
+    from gevent.monkey import get_original
+    _thread_local = get_original("threading", "local")
+except ImportError:
+    _thread_local = threading.local
+
+
+def normalize(value):
+    """Normalize prompt inputs so trivially different requests share a key"""
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", value.strip().lower())
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+
+def make_key(method, inputs):
+    payload = json.dumps([method, normalize(inputs)], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """Thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key):
+        """(value, expires_at) for a live entry, else None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache:
+    """On-disk tier shared by every gunicorn worker on the pod"""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._local = _thread_local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("""
+          CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+          )
+        """)
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key):
+        """(value, expires_at) for a live entry, else None"""
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key=? AND expires_at>?", (key, time.time())
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache(key, value, expires_at) VALUES(?, ?, ?)",
+            (key, value, time.time() + ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM llm_cache WHERE expires_at<=?", (time.time(),))
+        conn.commit()
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
+
+
+class ResponseCache:
+    """Cache in front of GeminiClient methods.
+
+    Values are stored as JSON text in a memory tier and, if configured, a
+    SQLite tier; a value found only on disk is promoted to memory for what
+    is left of its TTL, so promotion never extends an entry's life. Each
+    call records a hit or miss per method (see ``stats()``).
+    """
+
+    def __init__(self, tiers=None, ttls=None):
+        self.tiers = tiers if tiers is not None else [MemoryCache()]
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def ttl_for(self, method):
+        return self.ttls.get(method, 0)
+
+    def _count(self, method, outcome):
+        with self._lock:
+            counts = self._counts.setdefault(method, {"hits": 0, "misses": 0})
+            counts[outcome] += 1
+
+    def get(self, method, inputs):
+        key = make_key(method, inputs)
+        for i, tier in enumerate(self.tiers):
+            try:
+                entry = tier.get_entry(key)
+            except sqlite3.Error as e:
+                logger.error(f"Response cache read failed: {e}")
+                continue
+            if entry is not None:
+                raw, expires_at = entry
+                remaining = expires_at - time.time()
+                if remaining > 0:
+                    for upper in self.tiers[:i]:
+                        upper.set(key, raw, remaining)
+                self._count(method, "hits")
+                return True, json.loads(raw)
+        self._count(method, "misses")
+        return False, None
+
+    def set(self, method, inputs, value):
+        ttl = self.ttl_for(method)
+        if ttl <= 0:
+            return
+        key = make_key(method, inputs)
+        raw = json.dumps(value, ensure_ascii=False)
+        for tier in self.tiers:
+            try:
+                tier.set(key, raw, ttl)
+            except sqlite3.Error as e:
+                logger.error(f"Response cache write failed: {e}")
+
+    def get_or_load(self, method, inputs, loader, cacheable=lambda value: value is not None):
+        """Return a cached value or call ``loader`` and cache what it returns.
+
+        Results rejected by ``cacheable`` (errors, fallbacks) are returned but
+        never stored. Methods with a TTL of 0 always call ``loader``.
+        """
+        if self.ttl_for(method) <= 0:
+            return loader()
+        hit, value = self.get(method, inputs)
+        if hit:
+            return value
+        value = loader()
+        if cacheable(value):
+            self.set(method, inputs, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {method: dict(counts) for method, counts in self._counts.items()}
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def collect(self):
+        """Metric families for metrics.REGISTRY"""
+        samples = []
+        for method, counts in self.stats().items():
+            samples.append(("", {"method": method, "result": "hit"}, counts["hits"]))
+            samples.append(("", {"method": method, "result": "miss"}, counts["misses"]))
+        return [("llm_cache_requests_total", "counter", "LLM response cache lookups", samples)]
+
+
+def create_response_cache():
+    """Build the cache described by the LLM_CACHE_* environment variables"""
+    tiers = [MemoryCache(int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")))]
+    path = os.getenv("LLM_CACHE_PATH")
+    if path:
+        tiers.append(SQLiteCache(path))
+    ttls = {}
+    for method in DEFAULT_TTLS:
+        override = os.getenv(f"LLM_CACHE_TTL_{method.upper()}")
+        if override is not None:
+            ttls[method] = int(override)
+    return ResponseCache(tiers, ttls)
@@ -0,0 +1,244 @@
+import os
+import json
+from datetime import timedelta
+from sqlalchemy import create_engine, text
+from database import (GOALS_SET_INCREMENT, RECENT_CHALLENGES, STATS_SELECT, STATS_UPSERT,
+                      XP_UPDATES_OVERLAP, challenge_row, match_challenge)
+from progress import apply_completion
+from write_behind import WriteBehindQueue
+
+POOL_SIZE = int(os.getenv("AI_AGENT_DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("AI_AGENT_DB_POOL_MAX_OVERFLOW", "10"))
+POOL_RECYCLE = int(os.getenv("AI_AGENT_DB_POOL_RECYCLE", "1800"))
+
+# Arbitrary key so replicas starting together run the migration one at a time
+_SCHEMA_LOCK_ID = 7405327
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+  id TEXT PRIMARY KEY,
+  name TEXT,
+  jwt_hash TEXT,
+  created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS goals (
+  id BIGSERIAL PRIMARY KEY,
+  user_id TEXT,
+  goal_text TEXT,
+  status TEXT DEFAULT 'active',
+  parsed_goal TEXT,
+  parse_source TEXT,
+  parse_attempts INTEGER DEFAULT 0,
+  last_parse_attempt DOUBLE PRECISION,
+  created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS challenges (
+  id BIGSERIAL PRIMARY KEY,
+  user_id TEXT,
+  challenge_text TEXT,
+  difficulty TEXT,
+  category TEXT,
+  xp_reward INTEGER,
+  time_to_complete TEXT,
+  status TEXT DEFAULT 'active',
+  bucket TEXT,
+  payload TEXT,
+  created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS progress (
+  id BIGSERIAL PRIMARY KEY,
+  user_id TEXT,
+  challenge_id BIGINT,
+  completion_percentage INTEGER DEFAULT 0,
+  streak_count INTEGER DEFAULT 0,
+  last_activity TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS user_progress (
+  user_id TEXT PRIMARY KEY,
+  xp INTEGER DEFAULT 0,
+  level INTEGER DEFAULT 1,
+  completed_challenges INTEGER DEFAULT 0,
+  current_streak INTEGER DEFAULT 0,
+  longest_streak INTEGER DEFAULT 0,
+  days_active INTEGER DEFAULT 0,
+  last_active_day TEXT,
+  week_start TEXT,
+  weekly_challenges INTEGER DEFAULT 0,
+  goals_set INTEGER DEFAULT 0,
+  last_challenge TEXT,
+  category_counts TEXT,
+  updated_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+);
+ALTER TABLE user_progress ADD COLUMN IF NOT EXISTS category_counts TEXT;
+ALTER TABLE goals ADD COLUMN IF NOT EXISTS parse_attempts INTEGER DEFAULT 0;
+ALTER TABLE goals ADD COLUMN IF NOT EXISTS last_parse_attempt DOUBLE PRECISION;
+CREATE INDEX IF NOT EXISTS idx_goals_user ON goals(user_id, id);
+CREATE INDEX IF NOT EXISTS idx_challenges_user ON challenges(user_id, id);
+CREATE INDEX IF NOT EXISTS idx_challenges_queued ON challenges(bucket, id) WHERE status='queued';
+CREATE INDEX IF NOT EXISTS idx_progress_user_challenge ON progress(user_id, challenge_id);
+CREATE INDEX IF NOT EXISTS idx_user_progress_updated ON user_progress(updated_at);
+"""
+
+_INSERT_CHALLENGE = """
+  INSERT INTO challenges(user_id, challenge_text, difficulty, category, xp_reward, time_to_complete, status, bucket, payload)
+  VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+def _make_psycopg2_cooperative():
+    # psycopg2 blocks in C; under gevent workers, wait on sockets through the
+    # (patched) select module instead so other greenlets keep running
+    try:
+        from gevent import monkey
+    except ImportError:
+        return
+    if monkey.is_module_patched("select"):
+        import psycopg2.extensions
+        import psycopg2.extras
+        psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+
+
+class PostgresStorage:
+    """Agent state in Postgres, shared by every replica.
+
+    Connections come from a SQLAlchemy pool (the same driver stack the
+    accounts services use). Method names and return values match
+    database.SQLiteStorage.
+    """
+
+    def __init__(self, uri, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                 batch_rows=100, batch_delay=0.05):
+        _make_psycopg2_cooperative()
+        self.engine = create_engine(
+            uri,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=True,
+            pool_recycle=POOL_RECYCLE,
+            future=True,
+        )
+        self.write_behind = WriteBehindQueue(self.engine.raw_connection, batch_rows, batch_delay,
+                                             release=lambda conn: conn.close())
+
+    @staticmethod
+    def insert_challenge(cur, user_id, challenge, status, bucket=None):
+        """Write-behind op; ``cur`` is a raw psycopg2 cursor"""
+        cur.execute(_INSERT_CHALLENGE, challenge_row(user_id, challenge, status, bucket))
+
+    def init_db(self):
+        with self.engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _SCHEMA_LOCK_ID})
+            conn.exec_driver_sql(_SCHEMA)
+
+    def set_goal(self, user_id, goal_text, parsed_goal=None, parse_source=None):
+        with self.engine.begin() as conn:
+            goal_id = conn.execute(
+                text("INSERT INTO goals(user_id, goal_text, parsed_goal, parse_source)"
+                     " VALUES(:user_id, :goal_text, :parsed_goal, :parse_source) RETURNING id"),
+                {"user_id": user_id, "goal_text": goal_text, "parse_source": parse_source,
+                 "parsed_goal": json.dumps(parsed_goal) if parsed_goal is not None else None},
+            ).scalar()
+            conn.execute(text(GOALS_SET_INCREMENT), {"user_id": user_id})
+            return goal_id
+
+    def update_parsed_goal(self, goal_id, parsed_goal, parse_source):
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("UPDATE goals SET parsed_goal=:parsed_goal, parse_source=:parse_source WHERE id=:id"),
+                {"parsed_goal": json.dumps(parsed_goal), "parse_source": parse_source, "id": goal_id},
+            )
+
+    def claim_goal_reparse(self, goal_id, attempts, now):
+        with self.engine.begin() as conn:
+            return conn.execute(
+                text("UPDATE goals SET parse_attempts=:next, last_parse_attempt=:now"
+                     " WHERE id=:id AND COALESCE(parse_attempts, 0)=:attempts"),
+                {"next": attempts + 1, "now": now, "id": goal_id, "attempts": attempts},
+            ).rowcount == 1
+
+    def get_latest_goal(self, user_id):
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT id, goal_text, status, parsed_goal, parse_source, parse_attempts, last_parse_attempt,"
+                     " created_at FROM goals"
+                     " WHERE user_id=:user_id ORDER BY id DESC LIMIT 1"),
+                {"user_id": user_id},
+            ).mappings().first()
+        if row is None:
+            return None
+        goal = dict(row)
+        # Same 'YYYY-MM-DD HH:MM:SS' text SQLite returns
+        goal["created_at"] = str(goal["created_at"]) if goal["created_at"] is not None else None
+        return goal
+
+    def save_challenge(self, user_id, challenge):
+        self._insert(user_id, challenge, 'active')
+
+    def enqueue_challenge(self, bucket, challenge):
+        self._insert(None, challenge, 'queued', bucket)
+
+    def _insert(self, user_id, challenge, status, bucket=None):
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(_INSERT_CHALLENGE, challenge_row(user_id, challenge, status, bucket))
+
+    def count_queued_challenges(self, bucket):
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT COUNT(*) FROM challenges WHERE status='queued' AND bucket=:bucket"),
+                {"bucket": bucket},
+            ).scalar()
+
+    def pop_queued_challenge(self, bucket, user_id):
+        # SKIP LOCKED lets concurrent pops from other replicas take the next
+        # row instead of waiting on this one
+        with self.engine.begin() as conn:
+            return conn.execute(
+                text("UPDATE challenges SET user_id=:user_id, status='active', created_at=CURRENT_TIMESTAMP"
+                     " WHERE id = (SELECT id FROM challenges WHERE status='queued' AND bucket=:bucket"
+                     " ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED) RETURNING payload"),
+                {"user_id": user_id, "bucket": bucket},
+            ).scalar()
+
+    def find_user_challenge(self, user_id, challenge_text=None, recent=10):
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(RECENT_CHALLENGES), {"user_id": user_id, "limit": recent}).mappings().all()
+        return match_challenge(rows, challenge_text)
+
+    def record_completion(self, user_id, challenge, day):
+        with self.engine.begin() as conn:
+            # Lock the user's aggregate row; completions from other replicas
+            # for the same user wait here, other users are unaffected
+            conn.execute(text("INSERT INTO user_progress(user_id) VALUES(:user_id) ON CONFLICT DO NOTHING"),
+                         {"user_id": user_id})
+            row = conn.execute(text(STATS_SELECT + " FOR UPDATE"), {"user_id": user_id}).mappings().first()
+            done = conn.execute(text("SELECT 1 FROM progress WHERE user_id=:user_id AND challenge_id=:id"),
+                                {"user_id": user_id, "id": challenge["id"]}).first()
+            if done:
+                return None
+            stats = apply_completion(dict(row), challenge["xp_reward"], day,
+                                     challenge["challenge_text"], challenge["category"])
+            conn.execute(
+                text("INSERT INTO progress(user_id, challenge_id, completion_percentage, streak_count)"
+                     " VALUES(:user_id, :id, 100, :streak)"),
+                {"user_id": user_id, "id": challenge["id"], "streak": stats["current_streak"]},
+            )
+            conn.execute(text(STATS_UPSERT), stats)
+            return stats
+
+    def get_user_stats(self, user_id):
+        with self.engine.connect() as conn:
+            row = conn.execute(text(STATS_SELECT), {"user_id": user_id}).mappings().first()
+        return dict(row) if row else None
+
+    def xp_updates(self, since=None):
+        with self.engine.connect() as conn:
+            # Same clock and precision as the updated_at default
+            now = conn.execute(text("SELECT LOCALTIMESTAMP(0)")).scalar()
+            if since is None:
+                rows = conn.execute(text("SELECT user_id, xp FROM user_progress"))
+            else:
+                rows = conn.execute(
+                    text("SELECT user_id, xp FROM user_progress WHERE updated_at >= :since"),
+                    {"since": since - timedelta(seconds=XP_UPDATES_OVERLAP)},
+                )
+            return now, [tuple(row) for row in rows]
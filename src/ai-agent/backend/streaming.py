@@ -0,0 +1,61 @@
+import json
+
+
+class JsonFieldStream:
+    """Incrementally parse a streamed JSON object into top-level fields.
+
+    Text chunks are fed as they arrive from Gemini; ``feed`` returns the
+    ``(name, value)`` pairs whose values became complete in that chunk, in
+    document order. Anything before the opening brace (e.g. a ```json
+    fence) is ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0          # next character to scan
+        self._field_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.done = False
+
+    def feed(self, text):
+        self._buffer += text
+        fields = []
+        while self._pos < len(self._buffer) and not self.done:
+            char = self._buffer[self._pos]
+            if self._field_start is None:
+                # Still looking for the opening brace of the object
+                if char == "{":
+                    self._depth = 1
+                    self._field_start = self._pos + 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    fields.extend(self._take_field(self._pos))
+                    self.done = True
+            elif char == "," and self._depth == 1:
+                fields.extend(self._take_field(self._pos))
+                self._field_start = self._pos + 1
+            self._pos += 1
+        return fields
+
+    def _take_field(self, end):
+        segment = self._buffer[self._field_start:end].strip()
+        if not segment:
+            return []
+        try:
+            return list(json.loads("{" + segment + "}").items())
+        except json.JSONDecodeError:
+            return []
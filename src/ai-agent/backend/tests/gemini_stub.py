@@ -0,0 +1,451 @@
+"""
+Local Gemini-compatible stub server used by tests and benchmarks
+
+Also runs standalone, so the whole agent can be exercised without the real
+API (point GEMINI_BASE_URL at the printed URL):
+    python -m tests.gemini_stub --port 8089 [--delay 0.5] [--error-rate 0.1]
+    python -m tests.gemini_stub --record cassette.json   # proxy to Gemini and save
+    python -m tests.gemini_stub --replay cassette.json   # answer from the recording
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def gemini_response(text, finish_reason="STOP"):
+    """Wrap text in the generateContent response envelope"""
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": finish_reason,
+        }]
+    }
+
+
+DEFAULT_TEXT = json.dumps({
+    "title": "Stub Challenge",
+    "challenge": "Skip one coffee purchase today",
+    "difficulty": "easy",
+    "category": "save_money",
+    "xp_reward": 50,
+    "time_to_complete": "1 day",
+    "goal_recommendation": "Builds saving habits",
+    "tips": ["Tip 1", "Tip 2", "Tip 3"],
+})
+
+
+GEMINI_URL = "https://generativelanguage.googleapis.com"
+
+
+def response_text(payload):
+    """Text of the first candidate of a generateContent response, or None"""
+    try:
+        return payload["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def quota_exceeded(delay):
+    """Gemini's 429 body, with the retry delay in its RetryInfo detail"""
+    return {"error": {
+        "code": 429,
+        "message": "Resource has been exhausted (e.g. check quota).",
+        "status": "RESOURCE_EXHAUSTED",
+        "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{delay:.3f}s"}],
+    }}
+
+
+_STREAK = {
+    "motivational_message": "You're building amazing financial habits! Keep it up!",
+    "streak_milestone": "Three days in a row!",
+    "next_goal": "Focus on completing one challenge this week",
+    "emoji": "🔥",
+    "encouragement_level": "high",
+}
+_LEADERBOARD = {
+    "position_message": "You're doing great!",
+    "improvement_tip": "Complete more challenges to climb higher",
+    "weekly_goal": "Try to complete 3 challenges this week",
+    "competitor_insight": "You're on track to advance your financial skills",
+    "motivation_boost": "Every challenge completed makes you financially stronger!",
+}
+_TASKS = [
+    {"id": i, "icon": "💡", "title": f"Stub Task {i}", "description": "Review one subscription"}
+    for i in (1, 2, 3)
+]
+
+
+def canned_text(prompt):
+    """A plausible answer for any prompt GeminiClient sends, by prompt kind"""
+    if "for each of these" in prompt:
+        example = _STREAK if "streak" in prompt.split("for each of these")[0] else _LEADERBOARD
+        indexes = [int(i) for i in re.findall(r"^\s*(\d+)\. ", prompt, re.M)]
+        return json.dumps([dict(example, index=i) for i in indexes])
+    if "unlock message" in prompt:
+        return json.dumps({"message": "You earned it - keep that momentum going!"})
+    if "single appropriate emoji" in prompt:
+        return "🎯"
+    if "Parse this financial goal" in prompt:
+        goal = re.search(r'Goal: "(.*)"', prompt)
+        goal = goal.group(1) if goal else ""
+        amount = re.search(r"\$(\d+)", goal)
+        return json.dumps({"amount": int(amount.group(1)) if amount else 0, "emoji": "💰",
+                           "description": "goal", "category": "saving", "raw_text": goal})
+    if "micro-tasks" in prompt:
+        return json.dumps(_TASKS)
+    if "leaderboard insights" in prompt:
+        return json.dumps(_LEADERBOARD)
+    if "streak" in prompt:
+        return json.dumps(_STREAK)
+    return DEFAULT_TEXT
+
+
+def _prompt(body):
+    try:
+        return body["contents"][0]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+def canned_responder(path, body):
+    """Responder answering every GeminiClient prompt with a valid canned answer"""
+    return 200, gemini_response(canned_text(_prompt(body)))
+
+
+def canned_stream_responder(path, body):
+    return split_text(canned_text(_prompt(body)), 8)
+
+
+class FaultInjector:
+    """Responder that fails a share of calls the ways Gemini does.
+
+    ``error_rate`` of calls get a 503 UNAVAILABLE, ``throttle_rate`` a 429
+    RESOURCE_EXHAUSTED and ``max_tokens_rate`` an answer cut in half with
+    finishReason MAX_TOKENS. Every call first waits ``latency`` seconds plus
+    up to ``jitter`` more. The rest are answered by ``responder``; ``seed``
+    makes the sequence of faults repeatable.
+    """
+
+    def __init__(self, responder=None, error_rate=0, throttle_rate=0, max_tokens_rate=0,
+                 latency=0, jitter=0, seed=None):
+        self.responder = responder or canned_responder
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_tokens_rate = max_tokens_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.injected = {"error": 0, "throttle": 0, "max_tokens": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _fault(self):
+        with self._lock:
+            roll, extra = self._random.random(), self._random.uniform(0, self.jitter)
+            fault = None
+            for name, rate in (("error", self.error_rate), ("throttle", self.throttle_rate),
+                               ("max_tokens", self.max_tokens_rate)):
+                if roll < rate:
+                    fault = name
+                    self.injected[name] += 1
+                    break
+                roll -= rate
+        return fault, self.latency + extra
+
+    def __call__(self, path, body):
+        fault, delay = self._fault()
+        if delay:
+            time.sleep(delay)
+        if fault == "error":
+            return 503, {"error": {"code": 503, "message": "The model is overloaded. Please try again later.",
+                                   "status": "UNAVAILABLE"}}
+        if fault == "throttle":
+            return 429, quota_exceeded(1.0)
+        status, payload = self.responder(path, body)
+        text = response_text(payload)
+        if fault == "max_tokens" and status == 200 and text:
+            return status, gemini_response(text[:len(text) // 2], "MAX_TOKENS")
+        return status, payload
+
+
+class Cassette:
+    """Record real Gemini responses to a JSON file, or replay them.
+
+    Recording forwards each call to ``upstream`` with ``api_key`` and saves
+    the response. Replaying answers a call with the recording of the same
+    request body; failing that, with a recording of the same prompt with
+    any numbers in it changed (so other users' balances and goal amounts
+    still match), and otherwise with ``fallback`` (by default a 404).
+    API keys in request URLs are never written to the file.
+    """
+
+    def __init__(self, path, record=False, upstream=GEMINI_URL, api_key=None, fallback=None):
+        self.path = path
+        self.record = record
+        self.upstream = upstream
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.interactions = []
+        if os.path.exists(path):
+            with open(path) as f:
+                self.interactions = json.load(f)["interactions"]
+        self._exact = {i["key"]: i for i in self.interactions}
+        self._shapes = {i["shape"]: i for i in self.interactions}
+
+    @staticmethod
+    def keys(path, body):
+        """(exact key, key with numbers in the prompt masked) for a request"""
+        path = path.split("?")[0]
+        exact = hashlib.sha256(f"{path} {json.dumps(body, sort_keys=True)}".encode()).hexdigest()
+        shape = re.sub(r"\d+(\.\d+)?", "#", _prompt(body))
+        return exact, hashlib.sha256(f"{path} {shape}".encode()).hexdigest()
+
+    def __call__(self, path, body):
+        if self.record:
+            return self._record(path, body)
+        exact, shape = self.keys(path, body)
+        interaction = self._exact.get(exact) or self._shapes.get(shape)
+        if interaction is not None:
+            self.hits += 1
+            return interaction["status"], interaction["response"]
+        self.misses += 1
+        if self.fallback is not None:
+            return self.fallback(path, body)
+        return 404, {"error": {"code": 404, "message": "No recorded response for this request",
+                               "status": "NOT_FOUND"}}
+
+    def stream(self, path, body):
+        """stream_responder replaying the generateContent answer in chunks"""
+        status, payload = self(path.split(":streamGenerateContent")[0] + ":generateContent", body)
+        return split_text(response_text(payload) or "", 8)
+
+    def _record(self, path, body):
+        import requests
+
+        response = requests.post(f"{self.upstream}{path.split('?')[0]}", json=body, timeout=120,
+                                 headers={"x-goog-api-key": self.api_key, "Content-Type": "application/json"})
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {"error": {"code": response.status_code, "message": response.text}}
+        exact, shape = self.keys(path, body)
+        interaction = {"path": path.split("?")[0], "key": exact, "shape": shape,
+                       "prompt": _prompt(body)[:200], "status": response.status_code, "response": payload}
+        with self._lock:
+            self.interactions.append(interaction)
+            self._exact[exact] = self._shapes[shape] = interaction
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"interactions": self.interactions}, f, indent=1, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        return response.status_code, payload
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.stub.lock:
+            self.server.stub.connections += 1
+
+    def log_message(self, format, *args):  # keep test output quiet
+        pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with stub.lock:
+            stub.requests.append({"path": self.path, "body": body, "headers": dict(self.headers)})
+            stub.in_flight += 1
+            stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+        try:
+            if stub.delay:
+                time.sleep(stub.delay)
+            if ":streamGenerateContent" in self.path:
+                return self._stream(stub.stream_responder(self.path, body))
+            status, payload = stub.responder(self.path, body)
+        finally:
+            with stub.lock:
+                stub.in_flight -= 1
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, chunks):
+        """Send text chunks as chunked SSE events, like ?alt=sse"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, text in enumerate(chunks):
+            finish = "STOP" if i == len(chunks) - 1 else None
+            event = gemini_response(text, finish) if finish else {
+                "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]
+            }
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            if self.server.stub.chunk_delay:
+                time.sleep(self.server.stub.chunk_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def split_text(text, parts):
+    """Split text into roughly equal chunks, as a streaming model would"""
+    size = max(1, len(text) // parts)
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class QuotaResponder:
+    """Responder enforcing a quota of ``limit`` calls per sliding ``window``
+    seconds, like Gemini's per-minute limits. Calls over quota get a 429
+    RESOURCE_EXHAUSTED error with a RetryInfo delay; the rest are answered
+    by ``responder``."""
+
+    def __init__(self, limit, window=1.0, responder=None):
+        self.limit = limit
+        self.window = window
+        self.responder = responder or (lambda path, body: (200, gemini_response(DEFAULT_TEXT)))
+        self.accepted = 0
+        self.throttled = 0
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def __call__(self, path, body):
+        now = time.monotonic()
+        with self._lock:
+            while self._times and self._times[0] <= now - self.window:
+                self._times.popleft()
+            if len(self._times) >= self.limit:
+                self.throttled += 1
+                return 429, quota_exceeded(self._times[0] + self.window - now)
+            self._times.append(now)
+            self.accepted += 1
+        return self.responder(path, body)
+
+
+class GeminiStub:
+    """Threaded HTTP(S) server answering generateContent calls.
+
+    ``responder(path, body)`` returns ``(status, json_payload)``; by default
+    every call succeeds with a valid challenge. ``stream_responder(path, body)``
+    returns the text chunks for streamGenerateContent calls, sent
+    ``chunk_delay`` seconds apart. ``delay`` simulates model
+    latency. ``connections`` counts accepted TCP connections so tests can
+    assert keep-alive reuse; ``max_in_flight`` records peak concurrency.
+    """
+
+    def __init__(self, responder=None, tls=False, delay=0, stream_responder=None, chunk_delay=0, port=0):
+        self.responder = responder or (lambda path, body: (200, gemini_response(DEFAULT_TEXT)))
+        self.stream_responder = stream_responder or (lambda path, body: split_text(DEFAULT_TEXT, 8))
+        self.chunk_delay = chunk_delay
+        self.tls = tls
+        self.delay = delay
+        self.port = port
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.requests = []
+        self.connections = 0
+        self.certfile = None
+        self._certdir = None
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        scheme = "https" if self.tls else "http"
+        return f"{scheme}://127.0.0.1:{self._server.server_address[1]}/v1beta"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        if self.tls:
+            self._certdir = tempfile.mkdtemp()
+            self.certfile = _make_self_signed_cert(self._certdir)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.certfile, os.path.join(self._certdir, "key.pem"))
+            self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._certdir:
+            shutil.rmtree(self._certdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _make_self_signed_cert(directory):
+    certfile = os.path.join(directory, "cert.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+         "-keyout", os.path.join(directory, "key.pem"), "-out", certfile,
+         "-days", "1", "-subj", "/CN=127.0.0.1",
+         "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+    return certfile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gemini-compatible stub server")
+    parser.add_argument("--port", type=int, default=8089)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="FILE", help="proxy to Gemini (GEMINI_API_KEY) and save responses")
+    mode.add_argument("--replay", metavar="FILE", help="answer from recorded responses, canned ones otherwise")
+    parser.add_argument("--delay", type=float, default=0, help="seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0, help="up to this many more seconds at random")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--max-tokens-rate", type=float, default=0)
+    parser.add_argument("--quota", type=int, default=0, help="calls allowed per --quota-window seconds")
+    parser.add_argument("--quota-window", type=float, default=60)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    responder, stream_responder = canned_responder, canned_stream_responder
+    if args.record or args.replay:
+        cassette = Cassette(args.record or args.replay, record=bool(args.record), fallback=canned_responder)
+        responder, stream_responder = cassette, cassette.stream
+    responder = FaultInjector(responder, args.error_rate, args.throttle_rate, args.max_tokens_rate,
+                              args.delay, args.jitter, args.seed)
+    if args.quota:
+        responder = QuotaResponder(args.quota, args.quota_window, responder)
+    with GeminiStub(responder=responder, stream_responder=stream_responder, port=args.port) as stub:
+        print(f"Gemini stub listening: GEMINI_BASE_URL={stub.base_url}", flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
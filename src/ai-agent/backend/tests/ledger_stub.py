@@ -0,0 +1,64 @@
+"""
+Local balancereader/transactionhistory stub used by tests
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):  # keep test output quiet
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        kind = "balance" if self.path.startswith("/balances/") else "transactions"
+        with stub.lock:
+            stub.calls[kind] += 1
+        time.sleep(stub.delays.get(kind, 0))
+        data = json.dumps(stub.balance if kind == "balance" else stub.transactions).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class LedgerStub:
+    """Serves /balances/<id> and /transactions/<id> with configurable delays"""
+
+    def __init__(self, balance=150000, transactions=None, delays=None):
+        self.balance = balance
+        self.transactions = transactions if transactions is not None else [
+            {"amount": -1500, "description": "Coffee"},
+            {"amount": -2500, "description": "Lunch"},
+        ]
+        self.delays = delays or {}
+        self.calls = {"balance": 0, "transactions": 0}
+        self.lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,121 @@
+"""
+Tests for the achievement rule engine
+"""
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from achievements import CATALOG, AchievementEngine, MessagePersonalizer, compile_rule
+from progress import apply_completion, current_stats, empty_stats
+
+DAY = date(2024, 6, 3)
+
+
+def stats_after(completions):
+    """Read view of a user who completed ``(category, xp)`` challenges on DAY"""
+    stats = empty_stats("alice")
+    for category, xp in completions:
+        stats = apply_completion(stats, xp, DAY, "Challenge", category)
+    return current_stats(stats, DAY)
+
+
+class TestAchievementRules(unittest.TestCase):
+    """
+    Test cases for catalog evaluation
+    """
+
+    def setUp(self):
+        self.engine = AchievementEngine()
+
+    def _unlocked(self, stats):
+        return {a["id"] for a in self.engine.evaluate(stats)["achievements"] if a["unlocked"]}
+
+    def test_new_user(self):
+        """test a new user only has the welcome badge and every badge is listed"""
+        result = self.engine.evaluate(current_stats(empty_stats("alice"), DAY))
+        self.assertEqual([a["id"] for a in CATALOG], [a["id"] for a in result["achievements"]])
+        self.assertEqual({"first_login"}, {a["id"] for a in result["achievements"] if a["unlocked"]})
+        self.assertNotIn("unlocked_message", result["achievements"][1])
+
+    def test_threshold_and_category_rules(self):
+        """test stat thresholds and per-category counts unlock their badges"""
+        stats = stats_after([("save_money", 40)] * 3)
+        unlocked = self._unlocked(stats)
+        self.assertTrue({"first_challenge", "xp_collector", "level_up", "super_saver"} <= unlocked)
+        self.assertNotIn("frugal_fighter", unlocked)
+        self.assertNotIn("challenge_master", unlocked)
+
+    def test_streak_badge_stays_earned(self):
+        """test streak badges use the longest streak, not the current one"""
+        stats = dict(current_stats(empty_stats("alice"), DAY), longest_streak=3, current_streak=0)
+        self.assertIn("streak_starter", self._unlocked(stats))
+
+    def test_next_milestone_is_closest(self):
+        """test the next milestone is the locked badge with the most progress"""
+        stats = stats_after([("save_money", 10)] * 2)
+        milestone = self.engine.evaluate(stats)["next_milestone"]
+        self.assertEqual(("Super Saver", 0.67), (milestone["name"], milestone["progress"]))
+        self.assertEqual("Complete 1 more saving challenges", milestone["requirement"])
+
+    def test_unknown_rule_type(self):
+        """test a catalog with an unknown rule type is rejected"""
+        with self.assertRaises(ValueError):
+            compile_rule({"type": "vibes"})
+
+
+class TestMessagePersonalizer(unittest.TestCase):
+    """
+    Test cases for background unlock messages
+    """
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.release = threading.Event()
+        self.calls = []
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown(wait=True)
+
+    def _generate(self, achievement):
+        self.calls.append(achievement["id"])
+        self.release.wait(5)
+        return f"Personal message for {achievement['name']}"
+
+    def test_evaluate_never_waits_for_gemini(self):
+        """test the catalog message is served while a message is generated"""
+        engine = AchievementEngine(personalizer=MessagePersonalizer(self._generate, self.executor))
+        result = engine.evaluate(current_stats(empty_stats("alice"), DAY))
+        self.assertEqual(CATALOG[0]["unlocked_message"], result["achievements"][0]["unlocked_message"])
+
+        self.release.set()
+        self.executor.shutdown(wait=True)
+        result = engine.evaluate(current_stats(empty_stats("bob"), DAY))
+        self.assertEqual("Personal message for Welcome Aboard!", result["achievements"][0]["unlocked_message"])
+        self.assertEqual(["first_login"], self.calls)
+
+    def test_generated_once_per_achievement(self):
+        """test concurrent unlocks of one achievement share one generation"""
+        personalizer = MessagePersonalizer(self._generate, self.executor)
+        for _ in range(5):
+            self.assertIsNone(personalizer.message(CATALOG[0]))
+        self.release.set()
+        self.executor.shutdown(wait=True)
+        self.assertEqual(["first_login"], self.calls)
+
+    def test_failure_backs_off(self):
+        """test a failed generation falls back and is not retried immediately"""
+        def fail(achievement):
+            self.calls.append(achievement["id"])
+            raise RuntimeError("quota exceeded")
+
+        personalizer = MessagePersonalizer(fail, self.executor, retry_seconds=60)
+        self.assertIsNone(personalizer.message(CATALOG[0]))
+        self.executor.shutdown(wait=True)
+        self.assertIsNone(personalizer.message(CATALOG[0]))
+        self.assertEqual(["first_login"], self.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+Tests for columnar spending analytics and the insights route
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import database
+import main
+from analytics import SpendingAnalytics
+from tests.ledger_stub import LedgerStub
+
+ACCOUNT = "1011226111"
+# Friday 2025-01-10, noon UTC
+NOW = datetime(2025, 1, 10, 12, tzinfo=timezone.utc).timestamp()
+
+
+def ledger(to, amount, date, sender=ACCOUNT, description=None):
+    """A ledger transaction in cents, dated 09:00 UTC"""
+    transaction = {"fromAccountNum": sender, "toAccountNum": to, "amount": amount,
+                   "timestamp": f"{date}T09:00:00.000+00:00"}
+    if description:
+        transaction["description"] = description
+    return transaction
+
+
+HISTORY = [
+    ledger("2000000001", 1000, "2025-01-10", description="Coffee"),
+    ledger("2000000002", 2000, "2025-01-05", description="Lunch"),
+    ledger(ACCOUNT, 10000, "2025-01-02", sender="3000000002", description="Payroll"),
+    ledger("2000000003", 4000, "2024-12-20"),
+]
+
+
+class TestSpendingAnalytics(unittest.TestCase):
+    """
+    Test cases for statistics over the columnar history
+    """
+
+    def setUp(self):
+        self.analytics = SpendingAnalytics.from_transactions(HISTORY, ACCOUNT)
+
+    def test_direction_and_recent_spending(self):
+        """test ledger amounts are signed by account and outflows among the most recent rows are summed"""
+        self.assertEqual([-10.0, -20.0, 100.0, -40.0], self.analytics.amounts.tolist())
+        self.assertEqual(30.0, self.analytics.recent_spending(2))
+        self.assertEqual(30.0, self.analytics.recent_spending(3))
+        self.assertEqual(70.0, self.analytics.recent_spending())
+        self.assertEqual(["account ...0003", "coffee", "lunch", "payroll"], self.analytics.payee_names)
+        demo = SpendingAnalytics.from_transactions([{"amount": -1500}, {"amount": "12"}, None, {"amount": 500}])
+        self.assertEqual(15.0, demo.recent_spending())
+        self.assertEqual(0.0, SpendingAnalytics.from_transactions([{"amount": 500}]).recent_spending())
+
+    def test_challenge_profile_reports_recent_outflows(self):
+        """test the challenge prompt gets recent spending as a positive amount"""
+        context = {"balance": 50.0, "transactions": HISTORY, "goal": None, "analytics": self.analytics}
+        profile, _ = main.build_challenge_profile(context)
+        self.assertEqual(70.0, profile["recent_spending"])
+
+    def test_windows_and_rolling_spend(self):
+        """test trailing spending and the rolling 7-day outflow per day"""
+        self.assertEqual(30.0, self.analytics.spending(7, NOW))
+        self.assertEqual(70.0, self.analytics.spending(30, NOW))
+        self.assertEqual([20.0, 20.0, 30.0], self.analytics.rolling_spend(7, 3, NOW))
+        self.assertEqual(0.3, self.analytics.savings_rate(90, NOW))
+        self.assertIsNone(self.analytics.savings_rate(3, NOW))
+
+    def test_week_and_month_totals(self):
+        """test totals per Monday-first week (empty weeks included) and per month"""
+        self.assertEqual([
+            {"period": "2024-12-16", "income": 0.0, "spending": 40.0},
+            {"period": "2024-12-23", "income": 0.0, "spending": 0.0},
+            {"period": "2024-12-30", "income": 100.0, "spending": 20.0},
+            {"period": "2025-01-06", "income": 0.0, "spending": 10.0},
+        ], self.analytics.totals("week", 8))
+        self.assertEqual([{"period": "2025-01", "income": 100.0, "spending": 30.0}],
+                         self.analytics.totals("month", 1))
+
+    def test_anomalies(self):
+        """test outsized payments are flagged against their payee's history, or all outflows for a new payee"""
+        history = [ledger("2000000001", 450 + i % 3 * 10, f"2025-01-{i + 1:02d}", description="Coffee")
+                   for i in range(10)]
+        history.append(ledger("2000000001", 6000, "2025-01-20", description="Coffee"))
+        history.append(ledger("2000000004", 9000, "2025-01-21", description="Groceries"))
+        anomalies = SpendingAnalytics.from_transactions(history, ACCOUNT).anomalies()
+        self.assertEqual(["groceries", "coffee"], [anomaly["payee"] for anomaly in anomalies])
+        self.assertEqual({"payee": "coffee", "amount": 60.0, "date": "2025-01-20"},
+                         {key: anomalies[1][key] for key in ("payee", "amount", "date")})
+        self.assertGreater(anomalies[1]["score"], 3.5)
+
+    def test_empty_history(self):
+        """test an empty or undated history gives empty statistics"""
+        insights = SpendingAnalytics.from_transactions([]).insights(NOW)
+        self.assertEqual(0, insights["transaction_count"])
+        self.assertEqual({"7d": 0.0, "30d": 0.0, "90d": 0.0}, insights["spending"])
+        self.assertEqual(([], [], None, []), (insights["weekly"], insights["monthly"],
+                                              insights["savings_rate_90d"], insights["anomalies"]))
+        undated = SpendingAnalytics.from_transactions([{"amount": -1500, "description": "Coffee"}])
+        self.assertEqual([], undated.totals("month"))
+        self.assertEqual(0.0, undated.spending(30, NOW))
+
+
+class TestInsightsRoute(unittest.TestCase):
+    """
+    Test cases for GET /insights
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.ledger = LedgerStub(transactions=HISTORY).start()
+        self.patches = [
+            patch("database.DB_PATH", os.path.join(self.tmpdir, "test.db")),
+            patch("financial_context.BALANCES_URL", self.ledger.url),
+            patch("financial_context.HISTORY_URL", self.ledger.url),
+            patch.object(main.user_context_cache, "ttl", 0),
+        ]
+        for p in self.patches:
+            p.start()
+        self.client = main.create_app().test_client()
+
+    def tearDown(self):
+        database.flush_writes(5)
+        database.close_conn()
+        for p in reversed(self.patches):
+            p.stop()
+        self.ledger.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_insights(self):
+        """test the route summarizes the user's ledger history"""
+        response = self.client.get(f"/insights/{ACCOUNT}", headers={"Authorization": "Bearer token"})
+        self.assertEqual(200, response.status_code)
+        data = response.get_json()
+        self.assertEqual(4, data["transaction_count"])
+        self.assertEqual({"period": "2024-12", "income": 0.0, "spending": 40.0}, data["monthly"][0])
+        self.assertEqual(30, len(data["rolling_7d_spending"]))
+        self.assertEqual([], data["partial"])
+
+    def test_requires_auth(self):
+        """test the route needs an Authorization header"""
+        self.assertEqual(401, self.client.get(f"/insights/{ACCOUNT}").status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
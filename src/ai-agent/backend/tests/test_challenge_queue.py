@@ -0,0 +1,75 @@
+"""
+Tests for the precomputed challenge queue
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import database
+import main
+from challenge_queue import ChallengeQueue, challenge_bucket
+
+PROFILE = {"balance": 2500.0, "transactions": [], "transaction_count": 0, "recent_spending": -40.0}
+CHALLENGE = {"title": "Coffee Money Challenge", "challenge": "Skip coffee for 5 days",
+             "difficulty": "easy", "category": "save_money", "xp_reward": 50,
+             "time_to_complete": "5 days", "goal_recommendation": "Builds habits",
+             "tips": ["Tip 1", "Tip 2", "Tip 3"]}
+
+
+class TestChallengeQueue(unittest.TestCase):
+    """
+    Test cases for ChallengeQueue and GET /challenges
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_patch = patch("database.DB_PATH", os.path.join(self.tmpdir, "test.db"))
+        self.db_patch.start()
+        database.init_db()
+
+    def tearDown(self):
+        database.close_conn()
+        self.db_patch.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_refill_fills_bucket_to_target(self):
+        """test an empty pop triggers a refill up to the target size"""
+        generate = MagicMock(return_value=CHALLENGE)
+        queue = ChallengeQueue(generate, target=3)
+        self.assertIsNone(queue.pop("alice", PROFILE))
+        queue._executor.shutdown(wait=True)
+        bucket = challenge_bucket(PROFILE)
+        self.assertEqual(3, database.count_queued_challenges(bucket))
+        self.assertEqual(CHALLENGE, database.pop_queued_challenge(bucket, "alice"))
+        self.assertEqual(2, database.count_queued_challenges(bucket))
+
+    def test_refill_never_queues_fallbacks(self):
+        """test a failed generation leaves the queue empty"""
+        queue = ChallengeQueue(MagicMock(return_value=None), target=3)
+        queue.request_refill("low:light", PROFILE).result()
+        self.assertEqual(0, database.count_queued_challenges("low:light"))
+
+    def test_popped_challenge_is_assigned_once(self):
+        """test a queued challenge is handed to exactly one user"""
+        database.enqueue_challenge("low:light", CHALLENGE)
+        self.assertIsNotNone(database.pop_queued_challenge("low:light", "alice"))
+        self.assertIsNone(database.pop_queued_challenge("low:light", "bob"))
+
+    def test_route_serves_queued_challenge_without_gemini(self):
+        """test GET /challenges pops a ready challenge"""
+        gemini = MagicMock()
+        gemini.generate_challenge.return_value = None
+        context = {"balance": PROFILE["balance"], "transactions": [{"amount": -4000}],
+                   "partial": [], "goal": None}
+        with patch("main.get_gemini_client", return_value=gemini), \
+                patch("main.get_user_context", return_value=context), \
+                patch.object(main.challenge_queue, "request_refill") as refill:
+            client = main.create_app().test_client()
+            database.enqueue_challenge("medium:light:other", CHALLENGE)
+            response = client.get("/challenges/alice", headers={"Authorization": "Bearer token"})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(CHALLENGE["title"], response.get_json()["title"])
+        gemini.generate_challenge.assert_not_called()
+        refill.assert_called_once()
@@ -0,0 +1,89 @@
+"""
+Tests for the Gemini circuit breaker and metrics endpoint
+"""
+import unittest
+
+import metrics
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError
+from gemini_client import GeminiClient
+from http_session import create_session
+from tests.gemini_stub import GeminiStub
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    Test cases for CircuitBreaker and its use in GeminiClient
+    """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker("generate_challenge", min_calls=4, failure_threshold=0.5,
+                                      slow_call_seconds=5, open_seconds=30, clock=self.clock)
+
+    def _calls(self, outcomes, latency=0.1):
+        for success in outcomes:
+            self.breaker.before_call()
+            self.breaker.record(success, latency)
+
+    def test_opens_on_error_rate(self):
+        """test the breaker trips once half the window failed"""
+        self._calls([True, False, True])
+        self.assertEqual(CLOSED, self.breaker.state)
+        self._calls([False])
+        self.assertEqual(OPEN, self.breaker.state)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_opens_on_slow_calls(self):
+        """test successful but slow calls also trip the breaker"""
+        self._calls([True] * 4, latency=6)
+        self.assertEqual(OPEN, self.breaker.state)
+
+    def test_half_open_probe_closes_or_reopens(self):
+        """test a single probe is allowed after the open period"""
+        self._calls([False] * 4)
+        self.clock.now = 31
+        self.breaker.before_call()
+        self.assertEqual(HALF_OPEN, self.breaker.state)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record(False, 0.1)
+        self.assertEqual(OPEN, self.breaker.state)
+        self.clock.now = 62
+        self._calls([True])
+        self.assertEqual(CLOSED, self.breaker.state)
+
+    def test_client_falls_back_without_calling_gemini_when_open(self):
+        """test an outage short-circuits straight to the fallback"""
+        registry = CircuitBreakerRegistry(min_calls=3, open_seconds=60)
+        with GeminiStub(responder=lambda path, body: (503, {"error": "unavailable"})) as stub:
+            client = GeminiClient(api_key="test", base_url=stub.base_url,
+                                  session=create_session(), breakers=registry)
+            for _ in range(3):
+                client.generate_challenge({"balance": 100})
+            challenge = client.generate_challenge({"balance": 100})
+            self.assertEqual(3, len(stub.requests))
+        self.assertIn("challenge", challenge)
+        self.assertEqual(OPEN, registry.get("generate_challenge").state)
+        self.assertEqual(CLOSED, registry.get("parse_goal").state)
+
+    def test_breaker_state_rendered_as_metrics(self):
+        """test breaker state is exported in Prometheus format"""
+        registry = CircuitBreakerRegistry(min_calls=1)
+        breaker = registry.get("parse_goal")
+        breaker.before_call()
+        breaker.record(False, 0.1)
+        metric_registry = metrics.Registry()
+        metric_registry.register_collector(registry.collect)
+        text = metric_registry.render()
+        self.assertIn("# TYPE gemini_circuit_state gauge", text)
+        self.assertIn('gemini_circuit_state{method="parse_goal"} 1', text)
+        self.assertIn('gemini_circuit_opened_total{method="parse_goal"} 1', text)
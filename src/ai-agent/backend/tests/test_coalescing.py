@@ -0,0 +1,103 @@
+"""
+Tests for coalescing identical in-flight Gemini requests
+"""
+import threading
+import time
+import unittest
+
+from deadline import Deadline, activate
+from gemini_client import COALESCED_CALLS, GeminiClient
+from http_session import create_session
+from singleflight import SingleFlight
+from tests.gemini_stub import GeminiStub, gemini_response
+
+GOAL_JSON = '{"target_amount": 500, "timeframe_days": 90, "category": "vacation", "goal_type": "savings"}'
+
+
+def _concurrently(count, fn):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(i):
+        barrier.wait()
+        results[i] = fn()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestCoalescing(unittest.TestCase):
+    """
+    Test cases for single-flight deduplication in GeminiClient
+    """
+
+    def _client(self, stub, coalescer):
+        return GeminiClient(api_key="test", base_url=stub.base_url,
+                            session=create_session(), coalescer=coalescer)
+
+    def test_identical_prompts_share_one_call(self):
+        """test concurrent identical goal prompts make a single upstream call"""
+        saved_before = COALESCED_CALLS.value(method="parse_goal")
+        with GeminiStub(responder=lambda path, body: (200, gemini_response(GOAL_JSON)), delay=0.3) as stub:
+            client = self._client(stub, SingleFlight())
+            results = _concurrently(8, lambda: client.parse_goal("Save $500 for vacation"))
+            self.assertEqual(1, len(stub.requests))
+        for parsed in results:
+            self.assertEqual(500, parsed["target_amount"])
+        # Every waiter gets its own copy of the result
+        self.assertEqual(8, len({id(parsed) for parsed in results}))
+        self.assertEqual(7, COALESCED_CALLS.value(method="parse_goal") - saved_before)
+
+    def test_different_prompts_are_not_coalesced(self):
+        """test different goals still get their own upstream call"""
+        with GeminiStub(responder=lambda path, body: (200, gemini_response(GOAL_JSON)), delay=0.2) as stub:
+            client = self._client(stub, SingleFlight())
+            counter = iter(range(4))
+            lock = threading.Lock()
+
+            def parse():
+                with lock:
+                    i = next(counter)
+                return client.parse_goal(f"Save ${i}00 for vacation")
+
+            _concurrently(4, parse)
+            self.assertEqual(4, len(stub.requests))
+
+    def test_challenges_are_never_coalesced(self):
+        """test identical challenge prompts keep their own calls for variety"""
+        with GeminiStub(delay=0.2) as stub:
+            client = self._client(stub, SingleFlight())
+            _concurrently(3, lambda: client.generate_challenge({"balance": 100}))
+            self.assertEqual(3, len(stub.requests))
+
+    def test_errors_reach_every_waiter_as_fallback(self):
+        """test a failed shared call sends every waiter to the fallback"""
+        with GeminiStub(responder=lambda path, body: (500, {"error": "boom"}), delay=0.2) as stub:
+            client = self._client(stub, SingleFlight())
+            results = _concurrently(4, lambda: client.generate_goal_emoji("Save for a car"))
+            self.assertEqual(1, len(stub.requests))
+        self.assertEqual(['💰'] * 4, results)
+
+    def test_waiter_gives_up_at_its_own_deadline(self):
+        """test a caller with a short deadline falls back instead of waiting out a slower leader"""
+        with GeminiStub(responder=lambda path, body: (200, gemini_response("🚗")), delay=2.0) as stub:
+            client = self._client(stub, SingleFlight())
+            leader = threading.Thread(target=client.generate_goal_emoji, args=("Save for a car",))
+            leader.start()
+            time.sleep(0.2)
+            start = time.monotonic()
+            with activate(Deadline(1.3)):
+                emoji = client.generate_goal_emoji("Save for a car")
+            elapsed = time.monotonic() - start
+            leader.join()
+            self.assertEqual(1, len(stub.requests))
+        self.assertEqual('💰', emoji)
+        self.assertLess(elapsed, 1.7)
+
+
+if __name__ == '__main__':
+    unittest.main()
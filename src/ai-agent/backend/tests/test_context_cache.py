@@ -0,0 +1,68 @@
+"""
+Tests for the per-user financial context cache
+"""
+import threading
+import time
+import unittest
+
+from context_cache import UserContextCache
+from singleflight import SingleFlight
+
+
+class TestContextCache(unittest.TestCase):
+    """
+    Test cases for UserContextCache and SingleFlight
+    """
+
+    def setUp(self):
+        self.cache = UserContextCache(ttl=60)
+        self.loads = 0
+
+    def _loader(self, partial=None, delay=0):
+        def load():
+            self.loads += 1
+            time.sleep(delay)
+            return {"balance": 10, "transactions": [], "partial": partial or []}
+        return load
+
+    def test_context_reused_within_ttl(self):
+        """test routes called in quick succession share one fetch"""
+        for _ in range(3):
+            self.cache.get("alice", "Bearer a", self._loader())
+        self.assertEqual(1, self.loads)
+
+    def test_concurrent_misses_share_one_load(self):
+        """test single-flight loading for the same user"""
+        threads = [threading.Thread(target=self.cache.get, args=("alice", "Bearer a", self._loader(delay=0.2)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, self.loads)
+
+    def test_invalidate_forces_reload(self):
+        """test writing a goal drops the cached context"""
+        self.cache.get("alice", "Bearer a", self._loader())
+        self.cache.invalidate("alice")
+        self.cache.get("alice", "Bearer a", self._loader())
+        self.assertEqual(2, self.loads)
+
+    def test_context_not_shared_across_tokens(self):
+        """test a cached context is only served to the same Authorization header"""
+        self.cache.get("alice", "Bearer a", self._loader())
+        self.cache.get("alice", "Bearer b", self._loader())
+        self.assertEqual(2, self.loads)
+
+    def test_partial_context_not_cached(self):
+        """test contexts missing a backend are refetched"""
+        self.cache.get("alice", "Bearer a", self._loader(partial=["transactions"]))
+        self.cache.get("alice", "Bearer a", self._loader())
+        self.assertEqual(2, self.loads)
+
+    def test_singleflight_propagates_errors(self):
+        """test waiters see the leader's exception"""
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do("key", lambda: (_ for _ in ()).throw(ValueError("boom")))
+        self.assertEqual(0, flight.in_flight())
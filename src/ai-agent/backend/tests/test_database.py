@@ -0,0 +1,61 @@
+"""
+Tests for the SQLite connection manager
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import database
+
+
+class TestConnections(unittest.TestCase):
+    """
+    Test cases for per-thread connection reuse in database.py
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_patch = patch("database.DB_PATH", os.path.join(self.tmpdir, "test.db"))
+        self.db_patch.start()
+        database.init_db()
+
+    def tearDown(self):
+        database.close_conn()
+        self.db_patch.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_connection_reused_within_thread(self):
+        """test repeated calls on one thread share a connection"""
+        self.assertIs(database.get_conn(), database.get_conn())
+        database.set_goal("alice", "Save $100")
+        self.assertEqual("Save $100", database.get_latest_goal("alice")["goal_text"])
+
+    def test_each_thread_gets_its_own_connection(self):
+        """test connections are not shared between threads"""
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(database.get_conn()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(seen[0], database.get_conn())
+
+    def test_pragmas_applied(self):
+        """test WAL journaling and tuned pragmas are set on open"""
+        conn = database.get_conn()
+        self.assertEqual("wal", conn.execute("PRAGMA journal_mode").fetchone()[0])
+        self.assertEqual(1, conn.execute("PRAGMA synchronous").fetchone()[0])  # NORMAL
+        self.assertEqual(-database.SQLITE_CACHE_SIZE_KB, conn.execute("PRAGMA cache_size").fetchone()[0])
+
+    def test_reopens_when_db_path_changes(self):
+        """test switching DB_PATH opens a connection to the new file"""
+        first = database.get_conn()
+        with patch("database.DB_PATH", os.path.join(self.tmpdir, "other.db")):
+            self.assertIsNot(first, database.get_conn())
+            database.init_db()
+            self.assertIsNone(database.get_latest_goal("alice"))
+
+
+if __name__ == '__main__':
+    unittest.main()
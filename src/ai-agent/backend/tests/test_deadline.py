@@ -0,0 +1,140 @@
+"""
+Tests for request deadlines and their propagation to ledger and Gemini calls
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import database
+import main
+from deadline import Deadline, activate, current, route_budget, timeout, within
+from financial_context import fetch_financial_context
+from gemini_client import DEADLINE_SKIPS, GeminiClient
+from http_session import create_session
+from tests.gemini_stub import GeminiStub, canned_responder
+from tests.ledger_stub import LedgerStub
+
+
+class TestDeadline(unittest.TestCase):
+    """
+    Test cases for the request-scoped deadline
+    """
+
+    def test_timeout_is_cut_to_what_is_left(self):
+        """test timeouts shrink to the remaining budget, less a reserve"""
+        self.assertEqual(30, timeout(30))
+        with activate(Deadline(2)):
+            self.assertAlmostEqual(2, timeout(30), delta=0.05)
+            self.assertAlmostEqual(1.5, timeout(30, reserve=0.5), delta=0.05)
+            self.assertEqual(1, timeout(1))
+        self.assertIsNone(current())
+        with activate(Deadline(0)):
+            self.assertEqual(0, timeout(30, reserve=1))
+
+    def test_within_keeps_deadline_for_each_step(self):
+        """test a generator resumed outside the view still sees its deadline"""
+        deadline = Deadline(5)
+
+        def steps():
+            for _ in range(3):
+                yield current()
+
+        self.assertEqual([deadline] * 3, list(within(deadline, steps())))
+        self.assertIsNone(current())
+
+    def test_route_budget_override(self):
+        """test ROUTE_BUDGET_<VIEW> overrides a route's default budget"""
+        self.assertEqual(3.0, route_budget("generate_emoji"))
+        with patch.dict(os.environ, {"ROUTE_BUDGET_GENERATE_EMOJI": "0.5"}):
+            self.assertEqual(0.5, route_budget("generate_emoji"))
+
+
+class TestDeadlinePropagation(unittest.TestCase):
+    """
+    Test cases for ledger and Gemini calls inside a deadline
+    """
+
+    def test_ledger_fetch_uses_remaining_budget(self):
+        """test ledger lookups give up when the request deadline does"""
+        with LedgerStub(delays={"transactions": 1.0}) as stub, \
+                patch("financial_context.BALANCES_URL", stub.url), \
+                patch("financial_context.HISTORY_URL", stub.url), \
+                activate(Deadline(0.3)):
+            start = time.monotonic()
+            context = fetch_financial_context("alice", "Bearer token")
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEqual(["transactions"], context["partial"])
+
+    def test_gemini_skipped_without_budget(self):
+        """test no Gemini call is made when less than the minimum is left"""
+        before = DEADLINE_SKIPS.value(method="generate_challenge")
+        with GeminiStub(responder=canned_responder) as stub:
+            client = GeminiClient(api_key="test", base_url=stub.base_url, session=create_session())
+            with activate(Deadline(0.5)):
+                challenge = client.generate_challenge({"balance": 100})
+            self.assertEqual([], stub.requests)
+        self.assertIn("title", challenge)
+        self.assertEqual(1, DEADLINE_SKIPS.value(method="generate_challenge") - before)
+
+    def test_gemini_timeout_is_cut(self):
+        """test a slow Gemini call is abandoned at the request deadline"""
+        with GeminiStub(responder=canned_responder, delay=3) as stub:
+            client = GeminiClient(api_key="test", base_url=stub.base_url, session=create_session())
+            start = time.monotonic()
+            with activate(Deadline(1.5)):
+                self.assertIsNone(client.parse_goal("Save $500 for vacation", allow_fallback=False))
+            self.assertLess(time.monotonic() - start, 2.5)
+
+
+class TestRouteDeadline(unittest.TestCase):
+    """
+    Test cases for per-route budgets
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.gemini = GeminiStub(responder=canned_responder).start()
+        self.ledger = LedgerStub(delays={"transactions": 1.0}).start()
+        client = GeminiClient(api_key="test", base_url=self.gemini.base_url, session=create_session())
+        self.patches = [
+            patch("database.DB_PATH", os.path.join(self.tmpdir, "test.db")),
+            patch("financial_context.BALANCES_URL", self.ledger.url),
+            patch("financial_context.HISTORY_URL", self.ledger.url),
+            patch("main.get_gemini_client", return_value=client),
+            patch.object(main.challenge_queue, "target", 0),
+            patch.object(main.user_context_cache, "ttl", 0),
+        ]
+        for p in self.patches:
+            p.start()
+        self.client = main.create_app().test_client()
+
+    def tearDown(self):
+        database.flush_writes(5)
+        database.close_conn()
+        for p in reversed(self.patches):
+            p.stop()
+        self.gemini.stop()
+        self.ledger.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_slow_ledger_leaves_no_time_for_gemini(self):
+        """test a route whose ledger lookups eat its budget answers with a fallback"""
+        with patch.dict(os.environ, {"ROUTE_BUDGET_GET_CHALLENGE": "1.5"}):
+            start = time.monotonic()
+            response = self.client.get("/challenges/alice", headers={"Authorization": "Bearer token"})
+        self.assertLess(time.monotonic() - start, 1.6)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual("Stub Challenge", response.get_json()["title"])
+        self.assertEqual([], self.gemini.requests)
+
+    def test_route_with_budget_calls_gemini(self):
+        """test the same route with its default budget gets Gemini's answer"""
+        response = self.client.get("/challenges/alice", headers={"Authorization": "Bearer token"})
+        self.assertEqual("Stub Challenge", response.get_json()["title"])
+
+
+if __name__ == '__main__':
+    unittest.main()
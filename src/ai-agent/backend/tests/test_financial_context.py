@@ -0,0 +1,56 @@
+"""
+Tests for the concurrent financial context fetcher
+"""
+import time
+import unittest
+from unittest.mock import patch
+
+import financial_context
+from financial_context import fetch_financial_context
+from tests.ledger_stub import LedgerStub
+
+
+class TestFinancialContext(unittest.TestCase):
+    """
+    Test cases for fetch_financial_context
+    """
+
+    def _fetch(self, stub, deadline):
+        with patch("financial_context.BALANCES_URL", stub.url), \
+                patch("financial_context.HISTORY_URL", stub.url):
+            start = time.monotonic()
+            context = fetch_financial_context("alice", "Bearer token", deadline=deadline)
+            return context, time.monotonic() - start
+
+    def test_lookups_run_concurrently(self):
+        """test total latency is the max, not the sum, of both lookups"""
+        with LedgerStub(delays={"balance": 0.3, "transactions": 0.3}) as stub:
+            context, elapsed = self._fetch(stub, deadline=2)
+        self.assertLess(elapsed, 0.55)
+        self.assertEqual(1500.0, context["balance"])
+        self.assertEqual(2, len(context["transactions"]))
+        self.assertEqual([], context["partial"])
+
+    def test_slow_backend_returns_partial_result(self):
+        """test a lookup that misses the deadline is reported as partial"""
+        with LedgerStub(delays={"transactions": 1.0}) as stub:
+            context, elapsed = self._fetch(stub, deadline=0.3)
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual(1500.0, context["balance"])
+        self.assertEqual([], context["transactions"])
+        self.assertEqual(["transactions"], context["partial"])
+
+    def test_expired_deadline_sends_no_lookups(self):
+        """test a request with no time left falls back without calling the ledger"""
+        with LedgerStub() as stub, patch.object(financial_context._executor, "submit") as submit:
+            context, _ = self._fetch(stub, deadline=0)
+        submit.assert_not_called()
+        self.assertEqual({"balance": 0, "transactions": [], "partial": ["balance", "transactions"]}, context)
+
+    def test_unreachable_ledger_uses_local_data(self):
+        """test local runs without ledger services still get a context"""
+        with patch("financial_context.BALANCES_URL", "http://127.0.0.1:9"), \
+                patch("financial_context.HISTORY_URL", "http://127.0.0.1:9"):
+            context = fetch_financial_context("alice", "Bearer token", deadline=1)
+        self.assertGreater(context["balance"], 0)
+        self.assertEqual(3, len(context["transactions"]))
@@ -0,0 +1,185 @@
+"""
+Tests for packing many users into one Gemini call
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import database
+import main
+from batcher import MicroBatcher
+from deadline import DeadlineExceeded
+from gemini_client import STREAK_MESSAGE_EXAMPLE, GeminiClient
+from http_session import create_session
+from response_cache import MemoryCache, ResponseCache
+from tests.gemini_stub import GeminiStub, gemini_response
+
+
+def batch_responder(drop=(), blank=()):
+    """Answer batch prompts with one object per listed user and single
+    prompts with one object; ``drop``/``blank`` indexes are left out or
+    returned with an empty field"""
+    def respond(path, body):
+        prompt = body["contents"][0]["parts"][0]["text"]
+        users = re.findall(r"^\s*(\d+)\. Current streak: (\d+) days", prompt, re.M)
+        if not users:
+            streak = re.search(r"Current streak: (\d+) days", prompt).group(1)
+            return 200, gemini_response(json.dumps(dict(STREAK_MESSAGE_EXAMPLE, motivational_message=f"single {streak}")))
+        answers = []
+        for index, streak in users:
+            index = int(index)
+            if index in drop:
+                continue
+            message = "" if index in blank else f"batched {streak}"
+            answers.append(dict(STREAK_MESSAGE_EXAMPLE, index=index, motivational_message=message))
+        # Models do not always keep the order
+        return 200, gemini_response(json.dumps(answers[::-1]))
+    return respond
+
+
+def streaks(count):
+    return [{"current_streak": i, "longest_streak": i, "last_challenge": "None", "recent_progress": "New user"}
+            for i in range(count)]
+
+
+class TestGeminiBatch(unittest.TestCase):
+    """
+    Test cases for the batch streak message API
+    """
+
+    def _client(self, stub, cache=None):
+        return GeminiClient(api_key="test", base_url=stub.base_url, session=create_session(), cache=cache)
+
+    def test_users_are_packed_per_call(self):
+        """test 45 users take three calls and answers follow the input order"""
+        with GeminiStub(responder=batch_responder()) as stub:
+            results = self._client(stub).generate_streak_messages(streaks(45), batch_size=20)
+            self.assertEqual(3, len(stub.requests))
+        self.assertEqual([f"batched {i}" for i in range(45)], [r["motivational_message"] for r in results])
+        self.assertEqual(set(STREAK_MESSAGE_EXAMPLE), set(results[0]))
+
+    def test_lone_item_uses_the_single_prompt(self):
+        """test a batch of one is sent as the ordinary per-user prompt"""
+        with GeminiStub(responder=batch_responder()) as stub:
+            results = self._client(stub).generate_streak_messages(streaks(1))
+            self.assertEqual(1, len(stub.requests))
+        self.assertEqual("single 0", results[0]["motivational_message"])
+
+    def test_only_failed_items_are_retried(self):
+        """test missing and invalid items are retried one at a time"""
+        with GeminiStub(responder=batch_responder(drop={1}, blank={3})) as stub:
+            results = self._client(stub).generate_streak_messages(streaks(5))
+            self.assertEqual(3, len(stub.requests))
+        self.assertEqual(["batched 0", "single 1", "batched 2", "single 3", "batched 4"],
+                         [r["motivational_message"] for r in results])
+
+    def test_unparseable_batch_falls_back_to_single_calls(self):
+        """test a batch answer that is not an array retries every item"""
+        def respond(path, body):
+            if "users:" in body["contents"][0]["parts"][0]["text"]:
+                return 200, gemini_response('{"motivational_message": "not an array"}')
+            return batch_responder()(path, body)
+
+        with GeminiStub(responder=respond) as stub:
+            results = self._client(stub).generate_streak_messages(streaks(3))
+            self.assertEqual(4, len(stub.requests))
+        self.assertEqual(["single 0", "single 1", "single 2"], [r["motivational_message"] for r in results])
+
+    def test_batched_answers_warm_the_cache(self):
+        """test precomputed messages serve later single and batch calls"""
+        cache = ResponseCache([MemoryCache()])
+        with GeminiStub(responder=batch_responder()) as stub:
+            client = self._client(stub, cache)
+            client.generate_streak_messages(streaks(4))
+            self.assertEqual("batched 2", client.generate_streak_message(streaks(4)[2])["motivational_message"])
+            client.generate_streak_messages(streaks(4))
+            self.assertEqual(1, len(stub.requests))
+
+
+class TestMicroBatcher(unittest.TestCase):
+    """
+    Test cases for collecting concurrent calls into one batch
+    """
+
+    def test_concurrent_items_share_one_run(self):
+        """test callers arriving within the window are answered by one run, each with its own result"""
+        runs = []
+        batcher = MicroBatcher(lambda items: runs.append(items) or [item * 10 for item in items], window=0.2)
+        results = {}
+        threads = [threading.Thread(target=lambda i=i: results.update({i: batcher.submit(i)})) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, len(runs))
+        self.assertEqual({0: 0, 1: 10, 2: 20, 3: 30}, results)
+
+    def test_full_batch_runs_at_once_and_waiters_keep_their_deadline(self):
+        """test a full batch does not wait out the window, and a waiter gives up at its timeout"""
+        def run(items):
+            time.sleep(0.5)
+            return items
+
+        batcher = MicroBatcher(run, max_items=2, window=30)
+        leader = threading.Thread(target=batcher.submit, args=("a",))
+        leader.start()
+        time.sleep(0.05)
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            batcher.submit("b", timeout=0.2)
+        self.assertLess(time.monotonic() - start, 0.4)
+        leader.join(2)
+        self.assertFalse(leader.is_alive())
+
+
+class TestBatchedRoutes(unittest.TestCase):
+    """
+    Test cases for streak messages requested through the routes
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.stub = GeminiStub(responder=batch_responder()).start()
+        client = GeminiClient(api_key="test", base_url=self.stub.base_url, session=create_session())
+        self.patches = [
+            patch("database.DB_PATH", os.path.join(self.tmpdir, "test.db")),
+            patch("main.get_gemini_client", return_value=client),
+            patch.object(main.streak_batcher, "window", 0.3),
+        ]
+        for p in self.patches:
+            p.start()
+        self.app = main.create_app()
+
+    def tearDown(self):
+        database.flush_writes(5)
+        database.close_conn()
+        for p in reversed(self.patches):
+            p.stop()
+        self.stub.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_concurrent_streak_requests_share_a_call(self):
+        """test users asking for streak messages together are packed into one prompt"""
+        messages = {}
+
+        def fetch(user_id):
+            response = self.app.test_client().get(f"/streak-message/{user_id}")
+            messages[user_id] = response.get_json()["motivational_message"]
+
+        threads = [threading.Thread(target=fetch, args=(f"user{i}",)) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, len(self.stub.requests))
+        self.assertEqual({f"user{i}": "batched 0" for i in range(5)}, messages)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Tests for the Gemini stub's canned answers, fault injection and record/replay
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from gemini_client import FALLBACKS, GeminiClient
+from http_session import create_session
+from tests.gemini_stub import (Cassette, FaultInjector, GeminiStub, canned_responder, canned_stream_responder,
+                               gemini_response)
+
+GOAL_JSON = '{"amount": 500, "emoji": "🏖️", "description": "vacation", "category": "vacation", "raw_text": "x"}'
+
+
+def _client(stub):
+    return GeminiClient(api_key="secret-key", base_url=stub.base_url, session=create_session())
+
+
+class TestCannedResponder(unittest.TestCase):
+    """
+    Test cases for answering every GeminiClient method offline
+    """
+
+    def test_every_method_gets_a_real_answer(self):
+        """test no method falls back when talking to the canned stub"""
+        methods = ("generate_challenge", "stream_challenge", "parse_goal", "generate_goal_emoji",
+                   "generate_additional_tasks")
+        before = {method: FALLBACKS.value(method=method) for method in methods}
+        with GeminiStub(responder=canned_responder, stream_responder=canned_stream_responder) as stub:
+            client = _client(stub)
+            self.assertEqual("Stub Challenge", client.generate_challenge({"balance": 100})["title"])
+            fields = dict((name, value) for _, name, value in client.stream_challenge({"balance": 100}))
+            self.assertEqual("Stub Challenge", fields["title"])
+            self.assertEqual(300, client.parse_goal("Save $300 for a bike")["amount"])
+            self.assertEqual("🎯", client.generate_goal_emoji("Save for a bike"))
+            self.assertIn("motivational_message", client.generate_streak_message({"current_streak": 2}))
+            self.assertIn("position_message", client.generate_leaderboard_context({"xp": 10}, 3))
+            self.assertEqual(3, len(client.generate_additional_tasks({"balance": 100})))
+            self.assertIsNotNone(client.generate_achievement_message(
+                {"id": "x", "name": "X", "emoji": "⭐", "description": "Did it"}))
+            self.assertEqual(5, len(client.generate_streak_messages([{"current_streak": i} for i in range(5)])))
+        self.assertEqual(before, {method: FALLBACKS.value(method=method) for method in methods})
+
+
+class TestFaultInjector(unittest.TestCase):
+    """
+    Test cases for injected errors, 429s and truncated answers
+    """
+
+    def test_rates_and_kinds(self):
+        """test faults are injected at the configured rates and repeat with a seed"""
+        def run():
+            injector = FaultInjector(error_rate=0.2, throttle_rate=0.1, max_tokens_rate=0.1, seed=3)
+            statuses = [injector("/v1beta/models/m:generateContent", {})[0] for _ in range(1000)]
+            return injector, statuses
+
+        injector, statuses = run()
+        self.assertEqual(injector.injected["error"], statuses.count(503))
+        self.assertEqual(injector.injected["throttle"], statuses.count(429))
+        self.assertAlmostEqual(0.2, injector.injected["error"] / 1000, delta=0.04)
+        self.assertAlmostEqual(0.1, injector.injected["max_tokens"] / 1000, delta=0.03)
+        self.assertEqual(statuses, run()[1])
+
+    def test_max_tokens_answer_is_truncated(self):
+        """test a MAX_TOKENS fault cuts the answer and the client falls back"""
+        injector = FaultInjector(max_tokens_rate=1)
+        status, payload = injector("/v1beta/models/m:generateContent", {})
+        self.assertEqual("MAX_TOKENS", payload["candidates"][0]["finishReason"])
+        with GeminiStub(responder=injector) as stub:
+            before = FALLBACKS.value(method="generate_challenge")
+            _client(stub).generate_challenge({"balance": 100})
+        self.assertEqual(1, FALLBACKS.value(method="generate_challenge") - before)
+
+
+class TestCassette(unittest.TestCase):
+    """
+    Test cases for recording and replaying Gemini responses
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "cassette.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_record_then_replay(self):
+        """test recorded answers replay offline, matching bodies and prompt shapes"""
+        with GeminiStub(responder=lambda path, body: (200, gemini_response(GOAL_JSON))) as upstream:
+            cassette = Cassette(self.path, record=True, upstream=upstream.base_url[:-len("/v1beta")],
+                                api_key="real-key")
+            with GeminiStub(responder=cassette) as recorder:
+                self.assertEqual(500, _client(recorder).parse_goal("Save $500 for vacation")["amount"])
+            self.assertEqual("real-key", upstream.requests[0]["headers"]["x-goog-api-key"])
+        with open(self.path) as f:
+            recorded = f.read()
+        self.assertNotIn("secret-key", recorded)
+        self.assertEqual(1, len(json.loads(recorded)["interactions"]))
+
+        replay = Cassette(self.path, fallback=canned_responder)
+        with GeminiStub(responder=replay) as stub:
+            client = _client(stub)
+            self.assertEqual(500, client.parse_goal("Save $500 for vacation")["amount"])
+            self.assertEqual(500, client.parse_goal("Save $750 for vacation")["amount"])
+            self.assertEqual("Stub Challenge", client.generate_challenge({"balance": 100})["title"])
+        self.assertEqual((2, 1), (replay.hits, replay.misses))
+
+    def test_missing_recording_is_an_error(self):
+        """test replay without a match or fallback answers 404"""
+        status, payload = Cassette(self.path)("/v1beta/models/m:generateContent", {"contents": []})
+        self.assertEqual((404, "NOT_FOUND"), (status, payload["error"]["status"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
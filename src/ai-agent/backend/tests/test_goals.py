@@ -0,0 +1,105 @@
+"""
+Tests for goal persistence
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import database
+import main
+
+PARSED = {"amount": 500, "emoji": "🏖️", "description": "vacation",
+          "category": "vacation", "raw_text": "Save $500 for vacation"}
+
+
+class TestGoals(unittest.TestCase):
+    """
+    Test cases for POST/GET /goals
+    """
+
+    def setUp(self):
+        """Create the app against a temporary database and a mocked Gemini client"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_patch = patch("database.DB_PATH", os.path.join(self.tmpdir, "test.db"))
+        self.db_patch.start()
+        self.gemini = MagicMock()
+        self.gemini_patch = patch("main.get_gemini_client", return_value=self.gemini)
+        self.gemini_patch.start()
+        self.client = main.create_app().test_client()
+
+    def tearDown(self):
+        self.gemini_patch.stop()
+        database.close_conn()
+        self.db_patch.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_get_goal_reads_stored_parse(self):
+        """test GET /goals does not call Gemini again"""
+        self.gemini.parse_goal.return_value = PARSED
+        self.client.post("/goals/alice", json={"goal": "Save $500 for vacation"})
+        self.gemini.parse_goal.reset_mock()
+        response = self.client.get("/goals/alice")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(PARSED, response.get_json()["parsed_goal"])
+        self.gemini.parse_goal.assert_not_called()
+
+    def test_fallback_parse_is_replaced_in_background(self):
+        """test a regex-parsed goal is re-parsed once Gemini answers"""
+        self.gemini.parse_goal.side_effect = [None, PARSED]
+        with patch("main._reparse_executor.submit") as submit:
+            response = self.client.post("/goals/bob", json={"goal": "Save $500 for vacation"})
+            self.assertEqual(500, response.get_json()["parsed_goal"]["amount"])
+            self.assertEqual("fallback", database.get_latest_goal("bob")["parse_source"])
+            submit.call_args[0][0]()
+        goal = database.get_latest_goal("bob")
+        self.assertEqual("ai", goal["parse_source"])
+        self.assertEqual(PARSED, goal["parsed_goal"])
+
+    def test_reparse_backs_off_and_gives_up(self):
+        """test repeated reads queue one re-parse per backoff window, and none after the last attempt"""
+        self.gemini.parse_goal.return_value = None
+        with patch("main._reparse_executor.submit") as submit:
+            self.client.post("/goals/erin", json={"goal": "Save $500 for vacation"})
+            for _ in range(5):
+                self.client.get("/goals/erin")
+            self.assertEqual(1, submit.call_count)
+            submit.call_args[0][0]()
+            for _ in range(5):
+                self.client.get("/goals/erin")
+            self.assertEqual(1, submit.call_count)
+
+            start = time.time()
+            for attempt in range(1, main.GOAL_REPARSE_ATTEMPTS):
+                # Just past this attempt's window, which doubles each time
+                later = start + main.GOAL_REPARSE_BACKOFF * 2 ** attempt
+                with patch("main.time.time", return_value=later):
+                    self.client.get("/goals/erin")
+                    self.client.get("/goals/erin")
+                self.assertEqual(attempt + 1, submit.call_count)
+                submit.call_args[0][0]()
+            with patch("main.time.time", return_value=start + 10 ** 9):
+                self.client.get("/goals/erin")
+            self.assertEqual(main.GOAL_REPARSE_ATTEMPTS, submit.call_count)
+        self.assertEqual(main.GOAL_REPARSE_ATTEMPTS, database.get_latest_goal("erin")["parse_attempts"])
+
+    def test_legacy_goal_is_parsed_once(self):
+        """test goals stored without a parse are backfilled on first read"""
+        database.set_goal("carol", "Save $500 for vacation")
+        self.gemini.parse_goal.return_value = PARSED
+        self.client.get("/goals/carol")
+        self.client.get("/goals/carol")
+        self.assertEqual(1, self.gemini.parse_goal.call_count)
+        self.assertEqual("ai", database.get_latest_goal("carol")["parse_source"])
+
+    def test_init_db_adds_columns_to_existing_goals_table(self):
+        """test older databases gain the parsed goal columns"""
+        conn = database.get_conn()
+        conn.executescript("DROP TABLE goals; CREATE TABLE goals (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                           " user_id TEXT, goal_text TEXT, status TEXT DEFAULT 'active',"
+                           " created_at DATETIME DEFAULT CURRENT_TIMESTAMP);")
+        database.init_db()
+        database.set_goal("dave", "Save $10", {"amount": 10}, "ai")
+        self.assertEqual({"amount": 10}, database.get_latest_goal("dave")["parsed_goal"])
@@ -0,0 +1,198 @@
+"""
+Tests for hedged Gemini requests
+"""
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from gemini_client import GeminiClient
+from hedging import Hedger, LatencyTracker
+from http_session import create_session
+from rate_limiter import BACKGROUND, RateLimitedError, RateLimiter, priority
+from tests.gemini_stub import GeminiStub, canned_responder
+
+
+def _warm(hedger, method, seconds=0.01, count=20):
+    for _ in range(count):
+        hedger.record(method, seconds)
+
+
+def _sender(delays, statuses=None):
+    """send(hedge) that answers after delays[hedge] with statuses[hedge]"""
+    responses = {}
+
+    def send(hedge):
+        time.sleep(delays[hedge])
+        response = responses[hedge] = MagicMock(status_code=(statuses or {}).get(hedge, 200))
+        return response
+
+    return send, responses
+
+
+class TestLatencyTracker(unittest.TestCase):
+    """
+    Test cases for per-method latency percentiles
+    """
+
+    def test_percentile_needs_samples(self):
+        """test no percentile is given until min_samples calls are known"""
+        tracker = LatencyTracker(window=100, min_samples=10)
+        for i in range(9):
+            tracker.record("m", i / 100)
+        self.assertIsNone(tracker.percentile("m", 0.95))
+        for i in range(9, 100):
+            tracker.record("m", i / 100)
+        self.assertEqual(0.95, tracker.percentile("m", 0.95))
+        self.assertEqual(0.5, tracker.percentile("m", 0.5))
+
+
+class TestHedger(unittest.TestCase):
+    """
+    Test cases for racing a second request against a slow one
+    """
+
+    def test_hedge_wins_over_slow_primary(self):
+        """test a slow primary is hedged, the hedge answers and the loser is closed"""
+        hedger = Hedger(["m"], budget=1, min_delay=0.02)
+        _warm(hedger, "m")
+        send, responses = _sender({False: 0.5, True: 0.01})
+        start = time.monotonic()
+        response = hedger.call("m", send)
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertIs(responses[True], response)
+        self.assertEqual((1, 1), (hedger.fired["m"], hedger.won["m"]))
+        time.sleep(0.6)
+        responses[False].close.assert_called_once_with()
+
+    def test_fast_primary_is_not_hedged(self):
+        """test no hedge is sent when the primary answers within the delay"""
+        hedger = Hedger(["m"], budget=1, min_delay=0.2)
+        _warm(hedger, "m")
+        send, responses = _sender({False: 0.01, True: 0.01})
+        self.assertIs(hedger.call("m", send), responses[False])
+        self.assertEqual({}, hedger.fired)
+        self.assertNotIn(True, responses)
+
+    def test_failed_hedge_waits_for_primary(self):
+        """test an error answer does not win the race"""
+        hedger = Hedger(["m"], budget=1, min_delay=0.02)
+        _warm(hedger, "m")
+        send, responses = _sender({False: 0.1, True: 0.01}, {True: 503})
+        self.assertEqual(200, hedger.call("m", send).status_code)
+        self.assertEqual({}, hedger.won)
+
+    def test_budget(self):
+        """test hedges stay within the budget's share of calls"""
+        hedger = Hedger(["m"], budget=0.25, max_credit=1, min_delay=0.005)
+        _warm(hedger, "m", seconds=0.001)
+        send, _ = _sender({False: 0.04, True: 0.001})
+        for _ in range(40):
+            hedger.call("m", send)
+        self.assertEqual(10, hedger.fired["m"])
+        self.assertEqual(30, hedger.denied["m"])
+
+    def test_refused_hedge_keeps_its_budget(self):
+        """test a hedge the limiter refuses gives its credit back for the next slow call"""
+        hedger = Hedger(["m"], budget=0.25, max_credit=1, min_delay=0.005)
+        _warm(hedger, "m", seconds=0.001)
+        refuse = [True]
+
+        def send(hedge):
+            if hedge and refuse[0]:
+                raise RateLimitedError("no token")
+            time.sleep(0.001 if hedge else 0.04)
+            return MagicMock(status_code=200)
+
+        for _ in range(4):
+            hedger.call("m", send)
+        refuse[0] = False
+        hedger.call("m", send)
+        self.assertEqual((1, 1, 3), (hedger.unsent["m"], hedger.fired["m"], hedger.denied["m"]))
+
+    def test_primaries_do_not_wait_for_a_full_pool(self):
+        """test primaries go out at once while every hedge worker is busy, and queued hedges are dropped unpaid"""
+        hedger = Hedger(["m"], budget=1, min_delay=0.02, workers=1)
+        _warm(hedger, "m")
+        release = threading.Event()
+        hedger._executor.submit(release.wait)
+        started = []
+
+        def send(hedge):
+            started.append((hedge, time.monotonic()))
+            time.sleep(0.1)
+            return MagicMock(status_code=200)
+
+        try:
+            for _ in range(3):
+                start = time.monotonic()
+                self.assertEqual(200, hedger.call("m", send).status_code)
+                self.assertLess(started[-1][1] - start, 0.05)
+                self.assertLess(time.monotonic() - start, 0.2)
+            self.assertEqual(({}, 3), (hedger.fired, hedger.unsent["m"]))
+        finally:
+            release.set()
+        hedger._executor.shutdown(wait=True)
+        self.assertEqual([False] * 3, [hedge for hedge, _ in started])
+
+    def test_unlisted_method_is_not_hedged(self):
+        """test methods outside the hedged set run inline"""
+        hedger = Hedger(["m"], budget=1, min_delay=0.001)
+        _warm(hedger, "other")
+        send, responses = _sender({False: 0.05, True: 0})
+        hedger.call("other", send)
+        self.assertEqual({}, hedger.fired)
+
+
+class TestGeminiHedging(unittest.TestCase):
+    """
+    Test cases for GeminiClient with a hedger
+    """
+
+    def _slow_first(self, delay):
+        """Responder where every other call hangs for ``delay`` seconds"""
+        calls = []
+        lock = threading.Lock()
+
+        def respond(path, body):
+            with lock:
+                calls.append(path)
+                slow = len(calls) % 2 == 1
+            if slow:
+                time.sleep(delay)
+            return canned_responder(path, body)
+
+        return respond
+
+    def test_hedged_challenge(self):
+        """test a stalled challenge call is answered by its hedge"""
+        hedger = Hedger(["generate_challenge"], budget=1, min_delay=0.05)
+        _warm(hedger, "generate_challenge", seconds=0.05)
+        with GeminiStub(responder=self._slow_first(1.0)) as stub:
+            client = GeminiClient(api_key="test", base_url=stub.base_url, session=create_session(),
+                                  hedger=hedger)
+            start = time.monotonic()
+            challenge = client.generate_challenge({"balance": 100}, allow_fallback=False)
+            self.assertLess(time.monotonic() - start, 0.8)
+            self.assertEqual("Stub Challenge", challenge["title"])
+            self.assertEqual(2, len(stub.requests))
+        self.assertEqual(1, hedger.won["generate_challenge"])
+
+    def test_background_and_rate_limited_calls_are_not_hedged(self):
+        """test background calls never hedge and hedges need a free token"""
+        hedger = Hedger(["generate_challenge"], budget=1, min_delay=0.05)
+        _warm(hedger, "generate_challenge", seconds=0.05)
+        with GeminiStub(responder=canned_responder, delay=0.3) as stub:
+            client = GeminiClient(api_key="test", base_url=stub.base_url, session=create_session(),
+                                  hedger=hedger, limiter=RateLimiter(rate=0.1, burst=1))
+            client.generate_challenge({"balance": 100})  # hedge found no token
+            self.assertEqual(({}, 1), (hedger.fired, hedger.unsent["generate_challenge"]))
+            self.assertEqual(1, len(stub.requests))
+            client.limiter = None
+            with priority(BACKGROUND):
+                client.generate_challenge({"balance": 100})
+            self.assertEqual({}, hedger.fired)
+            self.assertEqual(2, len(stub.requests))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Tests for the pooled HTTP session and shared GeminiClient
+"""
+import unittest
+
+import gemini_client
+import http_session
+from gemini_client import GeminiClient, get_gemini_client
+from tests.gemini_stub import GeminiStub
+
+
+class TestHttpSession(unittest.TestCase):
+    """
+    Test cases for http_session and GeminiClient transport reuse
+    """
+
+    def tearDown(self):
+        http_session.reset_session()
+
+    def test_get_session_returns_same_session(self):
+        """test the session is shared within a process"""
+        self.assertIs(http_session.get_session(), http_session.get_session())
+
+    def test_session_adapter_uses_pool_settings(self):
+        """test the https adapter is sized from the pool settings"""
+        session = http_session.create_session(pool_connections=2, pool_maxsize=7)
+        adapter = session.get_adapter("https://generativelanguage.googleapis.com")
+        self.assertEqual(2, adapter._pool_connections)
+        self.assertEqual(7, adapter._pool_maxsize)
+
+    def test_get_gemini_client_is_singleton(self):
+        """test main.py routes share one client per worker"""
+        gemini_client._shared_client = None
+        self.assertIs(get_gemini_client(), get_gemini_client())
+
+    def test_client_methods_reuse_one_connection(self):
+        """test every GeminiClient call goes over the same keep-alive connection"""
+        with GeminiStub() as stub:
+            client = GeminiClient(api_key="test", base_url=stub.base_url,
+                                  session=http_session.create_session())
+            client.generate_challenge({"balance": 100})
+            client.parse_goal("Save $500 for vacation")
+            client.generate_goal_emoji("Save for a car")
+            client.generate_streak_message({})
+            client.generate_additional_tasks({"balance": 100})
+            self.assertEqual(5, len(stub.requests))
+            self.assertEqual(1, stub.connections)
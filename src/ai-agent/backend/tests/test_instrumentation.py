@@ -0,0 +1,157 @@
+"""
+Tests for Gemini call metrics and spans
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import metrics
+import tracing
+from gemini_client import CALL_SECONDS, FALLBACKS, FINISH_REASONS, PROMPT_CHARS, TOKENS, GeminiClient
+from http_session import create_session
+from response_cache import MemoryCache, ResponseCache
+from tests.gemini_stub import GeminiStub, gemini_response
+
+GOAL_JSON = '{"target_amount": 500, "timeframe_days": 90, "category": "vacation", "goal_type": "savings"}'
+
+
+def with_usage(text, finish_reason="STOP", prompt_tokens=120, output_tokens=30):
+    response = gemini_response(text, finish_reason)
+    response["usageMetadata"] = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                                 "totalTokenCount": prompt_tokens + output_tokens}
+    return response
+
+
+class FakeSpan:
+    def __init__(self, name):
+        self.name = name
+        self.attributes = {}
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes):
+        self.attributes.update(attributes)
+
+
+class FakeTracer:
+    def __init__(self):
+        self.spans = []
+
+    @contextmanager
+    def start_as_current_span(self, name):
+        span = FakeSpan(name)
+        self.spans.append(span)
+        yield span
+
+
+class TestHistogram(unittest.TestCase):
+    """
+    Test cases for the Prometheus histogram
+    """
+
+    def test_buckets_are_cumulative(self):
+        """test observations land in every bucket at or above them"""
+        registry = metrics.Registry()
+        histogram = metrics.Histogram("call_seconds", "Call latency", buckets=(0.1, 1), registry=registry)
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, method="m")
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE call_seconds histogram", lines)
+        self.assertIn('call_seconds_bucket{le="0.1",method="m"} 2', lines)
+        self.assertIn('call_seconds_bucket{le="1.0",method="m"} 3', lines)
+        self.assertIn('call_seconds_bucket{le="+Inf",method="m"} 4', lines)
+        self.assertIn('call_seconds_count{method="m"} 4', lines)
+        self.assertEqual(3.65, histogram.sum(method="m"))
+
+
+class TestGeminiInstrumentation(unittest.TestCase):
+    """
+    Test cases for per-call Gemini metrics
+    """
+
+    def _client(self, stub, cache=None):
+        return GeminiClient(api_key="test", base_url=stub.base_url, session=create_session(), cache=cache)
+
+    def test_tokens_latency_and_prompt_size(self):
+        """test a call records usageMetadata tokens, latency and prompt chars"""
+        before = (TOKENS.value(method="parse_goal", kind="prompt"), TOKENS.value(method="parse_goal", kind="output"),
+                  CALL_SECONDS.count(method="parse_goal", status="200"), PROMPT_CHARS.value(method="parse_goal"))
+        with GeminiStub(responder=lambda path, body: (200, with_usage(GOAL_JSON))) as stub:
+            self._client(stub).parse_goal("Save $500 for vacation")
+            prompt = stub.requests[0]["body"]["contents"][0]["parts"][0]["text"]
+        after = (TOKENS.value(method="parse_goal", kind="prompt"), TOKENS.value(method="parse_goal", kind="output"),
+                 CALL_SECONDS.count(method="parse_goal", status="200"), PROMPT_CHARS.value(method="parse_goal"))
+        self.assertEqual((120, 30, 1, len(prompt)), tuple(a - b for a, b in zip(after, before)))
+
+    def test_finish_reason_and_fallback(self):
+        """test a truncated challenge records MAX_TOKENS and the fallback taken"""
+        before = (FINISH_REASONS.value(method="generate_challenge", reason="MAX_TOKENS"),
+                  FALLBACKS.value(method="generate_challenge"))
+        with GeminiStub(responder=lambda path, body: (200, with_usage('{"title": "Cut', "MAX_TOKENS"))) as stub:
+            challenge = self._client(stub).generate_challenge({"balance": 100})
+        self.assertIn("title", challenge)
+        after = (FINISH_REASONS.value(method="generate_challenge", reason="MAX_TOKENS"),
+                 FALLBACKS.value(method="generate_challenge"))
+        self.assertEqual((1, 1), tuple(a - b for a, b in zip(after, before)))
+
+    def test_failed_call_is_timed_as_error(self):
+        """test a call that never gets a response is recorded with status error"""
+        before = CALL_SECONDS.count(method="parse_goal", status="error")
+        client = GeminiClient(api_key="test", base_url="http://127.0.0.1:9/v1beta", session=create_session())
+        self.assertIsNone(client.parse_goal("Save $500", allow_fallback=False))
+        self.assertEqual(1, CALL_SECONDS.count(method="parse_goal", status="error") - before)
+
+    def test_spans(self):
+        """test spans carry the method, cache hit, tokens and finish reason"""
+        tracer = FakeTracer()
+        with patch.object(tracing, "_tracer", tracer), \
+                GeminiStub(responder=lambda path, body: (200, with_usage(GOAL_JSON))) as stub:
+            client = self._client(stub, ResponseCache([MemoryCache()]))
+            client.parse_goal("Save $500 for vacation")
+            client.parse_goal("Save $500 for vacation")
+        self.assertEqual(["GeminiClient.parse_goal", "gemini.generateContent", "GeminiClient.parse_goal"],
+                         [span.name for span in tracer.spans])
+        logical, upstream, cached = tracer.spans
+        self.assertEqual((False, True), (logical.attributes["gemini.cache_hit"], cached.attributes["gemini.cache_hit"]))
+        self.assertEqual(("parse_goal", "200", 120, 30, "STOP"), tuple(upstream.attributes[key] for key in (
+            "gemini.method", "http.status_code", "gemini.prompt_tokens", "gemini.output_tokens",
+            "gemini.finish_reason")))
+
+    def test_setup_exports_spans(self):
+        """test ENABLE_TRACING installs a provider that exports request and Gemini spans"""
+        # In a fresh interpreter: the global tracer provider can only be set once
+        script = textwrap.dedent("""
+            from unittest.mock import patch
+            from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+            from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+            import main, tracing
+            exporter = InMemorySpanExporter()
+            with patch("opentelemetry.exporter.cloud_trace.CloudTraceSpanExporter", lambda: exporter):
+                with patch("opentelemetry.sdk.trace.export.BatchSpanProcessor", SimpleSpanProcessor):
+                    app = main.create_app()
+
+            @app.route("/traced")
+            def traced():
+                with tracing.span("gemini.generateContent", **{"gemini.method": "parse_goal"}):
+                    return "ok"
+
+            app.test_client().get("/traced")
+            print(sorted(span.name for span in exporter.get_finished_spans()))
+        """)
+        backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            env = dict(os.environ, ENABLE_TRACING="true", DB_PATH=os.path.join(tmpdir, "test.db"))
+            result = subprocess.run([sys.executable, "-c", script], cwd=backend, env=env,
+                                    capture_output=True, text=True, timeout=60)
+        self.assertEqual("['GET /traced', 'gemini.generateContent']", result.stdout.strip().splitlines()[-1],
+                         result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Tests for the materialized XP leaderboard
+"""
+import bisect
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import database
+import main
+from leaderboard import IndexableSkipList, Leaderboard
+from tests.tokens import PUBLIC_KEY, auth_header
+
+CHALLENGE = {"title": "No Takeout", "challenge": "Cook at home for 3 days", "difficulty": "easy",
+             "category": "food", "xp_reward": 60, "time_to_complete": "3 days"}
+
+
+class TestIndexableSkipList(unittest.TestCase):
+    """
+    Test cases for rank and index lookups against a plain sorted list
+    """
+
+    def test_matches_sorted_list(self):
+        """test random inserts and removes keep ranks and slices correct"""
+        rng = random.Random(7)
+        skiplist, reference = IndexableSkipList(seed=1), []
+        for _ in range(3000):
+            key = rng.randrange(1000)
+            if key in reference and rng.random() < 0.5:
+                self.assertTrue(skiplist.remove(key))
+                reference.remove(key)
+            elif key not in reference:
+                skiplist.insert(key)
+                bisect.insort(reference, key)
+        self.assertEqual(len(reference), len(skiplist))
+        self.assertEqual(reference, skiplist.slice(1, len(reference)))
+        for key in rng.sample(reference, 50):
+            self.assertEqual(reference.index(key) + 1, skiplist.rank(key))
+            start = reference.index(key) + 1
+            self.assertEqual(reference[start - 1:start + 4], skiplist.slice(start, 5))
+        self.assertIsNone(skiplist.rank(-1))
+        self.assertFalse(skiplist.remove(-1))
+
+    def test_from_sorted_matches_inserts(self):
+        """test a bulk-built list ranks, slices and accepts updates like an inserted one"""
+        keys = list(range(0, 2000, 2))
+        skiplist = IndexableSkipList.from_sorted(keys, seed=3)
+        self.assertEqual(keys, skiplist.slice(1, len(keys)))
+        self.assertEqual(251, skiplist.rank(500))
+        skiplist.insert(501)
+        self.assertTrue(skiplist.remove(0))
+        self.assertEqual(251, skiplist.rank(501))
+        self.assertEqual([500, 501, 502], skiplist.slice(250, 3))
+
+
+class TestLeaderboard(unittest.TestCase):
+    """
+    Test cases for Leaderboard rankings and refreshes
+    """
+
+    def test_rank_top_and_neighbors(self):
+        """test users are ranked by XP with ties broken by user id"""
+        board = Leaderboard()
+        for user_id, xp in [("ann", 300), ("bob", 100), ("cat", 300), ("dan", 50), ("eve", 200)]:
+            board.update(user_id, xp)
+        board.update("dan", 400)
+        self.assertEqual(["dan", "ann", "cat"], [entry["user_id"] for entry in board.top(3)])
+        self.assertEqual(3, board.rank("cat"))
+        self.assertEqual(["ann", "cat", "eve"], [entry["user_id"] for entry in board.around("cat", 1)])
+        self.assertEqual({"rank": 1, "user_id": "dan", "xp": 400, "level": 5}, board.top(1)[0])
+        self.assertIsNone(board.rank("zed"))
+
+    def test_refresh_applies_only_changes(self):
+        """test a stale board pulls rows updated since its last cursor"""
+        fetch = MagicMock(side_effect=[("t1", [("ann", 10), ("bob", 20)]), ("t2", [("ann", 30)])])
+        board = Leaderboard(refresh_seconds=0)
+        board.load(fetch)
+        self.assertTrue(board.maybe_refresh(fetch))
+        fetch.assert_called_with("t1")
+        self.assertEqual(["ann", "bob"], [entry["user_id"] for entry in board.top(2)])
+
+
+class TestLeaderboardRoutes(unittest.TestCase):
+    """
+    Test cases for the leaderboard routes and completion feed
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_patch = patch("database.DB_PATH", os.path.join(self.tmpdir, "test.db"))
+        self.db_patch.start()
+        self.gemini = MagicMock()
+        self.gemini_patch = patch("main.get_gemini_client", return_value=self.gemini)
+        self.gemini_patch.start()
+        database.init_db()
+        for user_id, xp in [("ann", 60), ("bob", 40)]:
+            database.save_challenge(user_id, dict(CHALLENGE, xp_reward=xp))
+        database.flush_writes(5)
+        for user_id in ("ann", "bob"):
+            database.record_completion(user_id, database.find_user_challenge(user_id))
+        app = main.create_app()
+        app.config["PUBLIC_KEY"] = PUBLIC_KEY
+        self.client = app.test_client()
+
+    def tearDown(self):
+        database.flush_writes(5)
+        self.gemini_patch.stop()
+        database.close_conn()
+        self.db_patch.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_loaded_at_startup_and_fed_by_completions(self):
+        """test existing XP is ranked at startup and completions move users"""
+        self.assertEqual(["ann", "bob"], [e["user_id"] for e in self.client.get("/leaderboard").get_json()["top"]])
+        database.save_challenge("cat", dict(CHALLENGE, xp_reward=90))
+        self.client.post("/challenges/cat/complete", json={"challenge": CHALLENGE["challenge"]},
+                         headers=auth_header("cat"))
+        body = self.client.get("/leaderboard/bob?neighbors=1").get_json()
+        self.assertEqual(3, body["rank"])
+        self.assertEqual(["ann", "bob"], [e["user_id"] for e in body["neighbors"]])
+
+    def test_leaderboard_context_uses_server_rank(self):
+        """test the position sent to Gemini comes from the leaderboard"""
+        self.client.get("/leaderboard-context/bob?position=1")
+        self.assertEqual(2, self.gemini.generate_leaderboard_contexts.call_args[0][0][0][1])
+        self.client.get("/leaderboard-context/newbie")
+        self.assertEqual(3, self.gemini.generate_leaderboard_contexts.call_args[0][0][0][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Tests for the server-side progress engine
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import database
+import main
+from progress import MAX_CHALLENGE_XP, apply_completion, current_stats, empty_stats, xp_for_reward
+from tests.tokens import PUBLIC_KEY, auth_header
+
+MONDAY = date(2024, 6, 3)
+
+CHALLENGE = {"title": "No Takeout", "challenge": "Cook at home for 3 days", "difficulty": "easy",
+             "category": "food", "xp_reward": 60, "time_to_complete": "3 days"}
+
+
+class TestProgressRules(unittest.TestCase):
+    """
+    Test cases for the O(1) aggregate updates
+    """
+
+    def _complete(self, stats, day, xp=60):
+        return apply_completion(stats, xp, day, "Cook at home")
+
+    def test_xp_and_level(self):
+        """test XP accumulates and the level follows 100 XP per level"""
+        stats = self._complete(empty_stats("alice"), MONDAY)
+        self.assertEqual((60, 1), (stats["xp"], stats["level"]))
+        stats = self._complete(stats, MONDAY)
+        self.assertEqual((120, 2), (stats["xp"], stats["level"]))
+        self.assertEqual(2, stats["completed_challenges"])
+
+    def test_reward_is_capped(self):
+        """test a stored reward counts for at most MAX_CHALLENGE_XP, and junk for nothing"""
+        self.assertEqual(MAX_CHALLENGE_XP, xp_for_reward(10 ** 9))
+        self.assertEqual([0, 0, 0, 75], [xp_for_reward(reward) for reward in (None, "lots", -5, "75")])
+        self.assertEqual(MAX_CHALLENGE_XP, self._complete(empty_stats("alice"), MONDAY, xp=5000)["xp"])
+
+    def test_streak_counts_consecutive_days(self):
+        """test the streak grows daily, ignores same-day repeats and resets after a gap"""
+        stats = empty_stats("alice")
+        for offset in (0, 0, 1, 2):
+            stats = self._complete(stats, date.fromordinal(MONDAY.toordinal() + offset))
+        self.assertEqual((3, 3, 3), (stats["current_streak"], stats["longest_streak"], stats["days_active"]))
+        stats = self._complete(stats, date(2024, 6, 7))
+        self.assertEqual((1, 3), (stats["current_streak"], stats["longest_streak"]))
+
+    def test_weekly_count_resets_on_monday(self):
+        """test weekly challenges only count the current week"""
+        stats = self._complete(empty_stats("alice"), date(2024, 6, 9))  # Sunday
+        stats = self._complete(stats, date(2024, 6, 10))  # Monday
+        self.assertEqual(1, stats["weekly_challenges"])
+
+    def test_read_view_decays_without_writes(self):
+        """test a missed day reads as a broken streak and a new week as zero"""
+        stats = self._complete(empty_stats("alice"), MONDAY)
+        self.assertEqual(1, current_stats(stats, date(2024, 6, 4))["current_streak"])
+        later = current_stats(stats, date(2024, 6, 12))
+        self.assertEqual((0, 0, 1), (later["current_streak"], later["weekly_challenges"], later["longest_streak"]))
+
+
+class TestProgressRoutes(unittest.TestCase):
+    """
+    Test cases for completion recording and the routes that read the aggregates
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_patch = patch("database.DB_PATH", os.path.join(self.tmpdir, "test.db"))
+        self.db_patch.start()
+        self.gemini = MagicMock()
+        self.gemini_patch = patch("main.get_gemini_client", return_value=self.gemini)
+        self.gemini_patch.start()
+        app = main.create_app()
+        app.config["PUBLIC_KEY"] = PUBLIC_KEY
+        self.client = app.test_client()
+
+    def tearDown(self):
+        database.flush_writes(5)
+        self.gemini_patch.stop()
+        database.close_conn()
+        self.db_patch.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _complete(self, user_id, body=None, headers=None):
+        return self.client.post(f"/challenges/{user_id}/complete", json=body or {"challenge": CHALLENGE["challenge"]},
+                                headers=headers or auth_header(user_id))
+
+    def test_completion_uses_stored_xp_once(self):
+        """test completing the served challenge grants its stored XP exactly once"""
+        database.save_challenge("alice", CHALLENGE)
+        response = self._complete("alice", {"challenge": CHALLENGE["challenge"], "xp_reward": 10000})
+        self.assertEqual(200, response.status_code)
+        body = response.get_json()
+        self.assertEqual((60, 60, 1, 1), (body["xp"], body["xp_gained"], body["completed_challenges"],
+                                          body["current_streak"]))
+        self.assertFalse(body["level_up"])
+        self.assertEqual(409, self._complete("alice").status_code)
+        self.assertEqual(60, self.client.get("/progress/alice").get_json()["xp"])
+
+    def test_completion_without_challenge_is_rejected(self):
+        """test a user cannot complete a challenge they were never served"""
+        self.assertEqual(404, self._complete("bob", {"challenge": "Anything"}).status_code)
+
+    def test_completion_requires_auth_and_challenge(self):
+        """test completions without a token or a named challenge are refused and grant nothing"""
+        database.save_challenge("dan", CHALLENGE)
+        response = self.client.post("/challenges/dan/complete", json={"challenge": CHALLENGE["challenge"]})
+        self.assertEqual(401, response.status_code)
+        for body in ({}, {"challenge": " "}, {"challenge": 7}):
+            self.assertEqual(400, self.client.post("/challenges/dan/complete", json=body,
+                                                   headers=auth_header("dan")).status_code)
+        self.assertEqual(400, self.client.post("/challenges/dan/complete", headers=auth_header("dan")).status_code)
+        self.assertEqual(0, self.client.get("/progress/dan").get_json()["xp"])
+
+    def test_completion_verifies_the_token(self):
+        """test unsigned, forged and other users' tokens cannot record a completion"""
+        database.save_challenge("dan", CHALLENGE)
+        other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.assertEqual(401, self._complete("dan", headers={"Authorization": "Bearer token"}).status_code)
+        self.assertEqual(401, self._complete("dan", headers=auth_header("dan", other_key)).status_code)
+        self.assertEqual(403, self._complete("dan", headers=auth_header("eve")).status_code)
+        self.assertEqual(0, self.client.get("/progress/dan").get_json()["xp"])
+        self.assertEqual(200, self._complete("dan").status_code)
+
+    def test_routes_ignore_client_stats(self):
+        """test achievements, streak and leaderboard prompts use server stats"""
+        database.set_goal("carol", "Save $100")
+        database.save_challenge("carol", CHALLENGE)
+        self._complete("carol")
+
+        with patch.object(main.achievement_engine, "personalizer", None):
+            body = self.client.get("/achievements/carol?xp=99999&level=50&goals_set=9").get_json()
+        unlocked = {a["id"] for a in body["achievements"] if a["unlocked"]}
+        self.assertEqual({"first_login", "first_challenge", "goal_setter"}, unlocked)
+        self.assertEqual("Earn 40 more XP", body["next_milestone"]["requirement"])
+
+        self.client.get("/streak-message/carol?current_streak=400")
+        [streak] = self.gemini.generate_streak_messages.call_args[0][0]
+        self.assertEqual((1, 1, CHALLENGE["challenge"]),
+                         (streak["current_streak"], streak["longest_streak"], streak["last_challenge"]))
+
+        self.client.get("/leaderboard-context/carol?position=2&xp=5000&weekly_challenges=30")
+        [(stats, position)] = self.gemini.generate_leaderboard_contexts.call_args[0][0]
+        self.assertEqual(({"xp": 60, "level": 1, "weekly_challenges": 1}, 1), (stats, position))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Tests that the hot queries use indexes at a million rows
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import database
+
+ROWS = 1_000_000
+USERS = 50_000
+
+
+class TestQueryPlans(unittest.TestCase):
+    """
+    Test cases for the indexes created by init_db
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.db_patch = patch("database.DB_PATH", os.path.join(cls.tmpdir, "test.db"))
+        cls.db_patch.start()
+        database.init_db()
+        conn = database.get_conn()
+        # Load a pre-index database, then let init_db migrate it
+        conn.executescript("DROP INDEX idx_goals_user; DROP INDEX idx_challenges_user;"
+                           " DROP INDEX idx_challenges_queued; DROP INDEX idx_progress_user_challenge;")
+        # Generate rows inside SQLite; a Python loop would dominate the test time
+        numbers = f"WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < {ROWS - 1}) "
+        conn.execute(f"INSERT INTO goals(user_id, goal_text) {numbers}"
+                     f"SELECT 'user' || (i % {USERS}), 'Save $500' FROM n")
+        conn.execute(f"INSERT INTO challenges(user_id, challenge_text, status, bucket) {numbers}"
+                     f"SELECT 'user' || (i % {USERS}), 'Skip takeout',"
+                     f" CASE WHEN i % 100 = 0 THEN 'queued' ELSE 'active' END, 'b' || (i % 6) FROM n")
+        conn.execute(f"INSERT INTO progress(user_id, challenge_id) {numbers}"
+                     f"SELECT 'user' || (i % {USERS}), i FROM n")
+        conn.commit()
+        database.init_db()
+        # Give the planner real statistics, as a long-running database would have
+        conn.execute("ANALYZE")
+
+    @classmethod
+    def tearDownClass(cls):
+        database.close_conn()
+        cls.db_patch.stop()
+        shutil.rmtree(cls.tmpdir, ignore_errors=True)
+
+    def _plan(self, sql, params):
+        rows = database.get_conn().execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        return " | ".join(row["detail"] for row in rows)
+
+    def test_latest_goal_uses_index(self):
+        """test get_latest_goal searches idx_goals_user without sorting"""
+        plan = self._plan("SELECT id, goal_text, status, parsed_goal, parse_source, parse_attempts, last_parse_attempt,"
+                          " created_at FROM goals"
+                          " WHERE user_id=? ORDER BY id DESC LIMIT 1", ("user7",))
+        self.assertIn("USING INDEX idx_goals_user", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_latest_challenge_uses_index(self):
+        """test per-user challenge lookups search idx_challenges_user"""
+        plan = self._plan("SELECT * FROM challenges WHERE user_id=? ORDER BY id DESC LIMIT 1", ("user7",))
+        self.assertIn("USING INDEX idx_challenges_user", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_progress_lookup_uses_index(self):
+        """test progress for a user's challenge searches idx_progress_user_challenge"""
+        plan = self._plan("SELECT * FROM progress WHERE user_id=? AND challenge_id=?", ("user7", 7))
+        self.assertIn("USING INDEX idx_progress_user_challenge", plan)
+
+    def test_queue_pop_uses_partial_index(self):
+        """test popping a queued challenge only touches queued rows"""
+        plan = self._plan("SELECT id, payload FROM challenges WHERE status='queued' AND bucket=?"
+                          " ORDER BY id LIMIT 1", ("b1",))
+        self.assertIn("idx_challenges_queued", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+Tests for the Gemini rate limiter and quota scheduler
+"""
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from gemini_client import GeminiClient
+from http_session import create_session
+from rate_limiter import (BACKGROUND, EMOJI, INTERACTIVE, RateLimitedError, RateLimiter, priority,
+                          retry_after)
+from tests.gemini_stub import GeminiStub, QuotaResponder, gemini_response
+
+GOAL_JSON = '{"target_amount": 500, "timeframe_days": 90, "category": "vacation", "goal_type": "savings"}'
+
+
+class TestRateLimiter(unittest.TestCase):
+    """
+    Test cases for token bucket scheduling
+    """
+
+    def test_burst_then_rate(self):
+        """test a full bucket is spent at once and then refills at the rate"""
+        limiter = RateLimiter(rate=50, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - start, 0.05)
+        for _ in range(10):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+    def test_priority_order(self):
+        """test queued interactive calls go before background, and emoji last"""
+        limiter = RateLimiter(rate=10, burst=1)
+        limiter.acquire()
+        order = []
+
+        def call(name):
+            limiter.acquire(name)
+            order.append(name)
+
+        threads = []
+        for name in (EMOJI, BACKGROUND, INTERACTIVE):
+            threads.append(threading.Thread(target=call, args=(name,)))
+            threads[-1].start()
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join()
+        self.assertEqual([INTERACTIVE, BACKGROUND, EMOJI], order)
+
+    def test_deadline(self):
+        """test a call gives up once its wait exceeds the deadline"""
+        limiter = RateLimiter(rate=0.1, burst=1)
+        limiter.acquire()
+        start = time.monotonic()
+        with self.assertRaises(RateLimitedError):
+            limiter.acquire(INTERACTIVE, timeout=0.05)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(1, limiter.rejected[INTERACTIVE])
+
+    def test_throttle_pauses_and_recovers(self):
+        """test a 429 pauses callers, halves the rate and successes restore it"""
+        limiter = RateLimiter(rate=100, burst=10, recovery=0.25)
+        limiter.throttled(0.2)
+        limiter.throttled(0.2)  # same spike, counted once
+        self.assertEqual(0.5, limiter.rate_scale)
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+        limiter.throttled(10)
+        with self.assertRaises(RateLimitedError):
+            limiter.acquire(EMOJI)  # told to wait past its 2s deadline
+        for _ in range(3):
+            limiter.succeeded()
+        self.assertEqual(1.0, limiter.rate_scale)
+
+    def test_retry_after(self):
+        """test the delay comes from Retry-After, then from Gemini's RetryInfo"""
+        response = MagicMock(headers={"Retry-After": "3"})
+        self.assertEqual(3.0, retry_after(response))
+        response = MagicMock(headers={})
+        response.json.return_value = {"error": {"details": [{"retryDelay": "12.5s"}]}}
+        self.assertEqual(12.5, retry_after(response))
+        response.json.side_effect = ValueError
+        self.assertIsNone(retry_after(response))
+
+
+class TestQuotaEnforcement(unittest.TestCase):
+    """
+    Test cases for GeminiClient against a stub enforcing a quota
+    """
+
+    def _parse_all(self, client, count):
+        results = [None] * count
+
+        def parse(i):
+            results[i] = client.parse_goal(f"Save ${100 + i} for vacation", allow_fallback=False)
+
+        threads = [threading.Thread(target=parse, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_unlimited_burst_is_throttled(self):
+        """test a burst over quota without a limiter loses calls to 429s"""
+        quota = QuotaResponder(5, 0.5, lambda path, body: (200, gemini_response(GOAL_JSON)))
+        with GeminiStub(responder=quota) as stub:
+            client = GeminiClient(api_key="test", base_url=stub.base_url, session=create_session())
+            results = self._parse_all(client, 20)
+        self.assertEqual(quota.throttled, results.count(None))
+        self.assertGreater(quota.throttled, 0)
+
+    def test_limiter_adapts_to_quota(self):
+        """test the same burst through the limiter gets every call answered"""
+        quota = QuotaResponder(5, 0.5, lambda path, body: (200, gemini_response(GOAL_JSON)))
+        limiter = RateLimiter(rate=10, burst=5, retries=3, max_wait={INTERACTIVE: 10})
+        with GeminiStub(responder=quota) as stub:
+            client = GeminiClient(api_key="test", base_url=stub.base_url, session=create_session(),
+                                  limiter=limiter)
+            results = self._parse_all(client, 20)
+        self.assertNotIn(None, results)
+        self.assertEqual(quota.throttled, limiter.throttled_calls)
+        self.assertLessEqual(quota.throttled, 3)
+
+    def test_method_and_context_priorities(self):
+        """test emoji calls and calls in a background block use their classes"""
+        limiter = RateLimiter(rate=100, burst=10)
+        with GeminiStub(responder=lambda path, body: (200, gemini_response(GOAL_JSON))) as stub:
+            client = GeminiClient(api_key="test", base_url=stub.base_url, session=create_session(),
+                                  limiter=limiter)
+            client.generate_goal_emoji("Save for a car")
+            with priority(BACKGROUND):
+                client.parse_goal("Save $500 for vacation")
+            client.parse_goal("Save $900 for a car")
+        self.assertEqual({INTERACTIVE: 1, BACKGROUND: 1, EMOJI: 1}, limiter.granted)
+
+
+if __name__ == '__main__':
+    unittest.main()
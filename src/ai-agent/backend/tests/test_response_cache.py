@@ -0,0 +1,123 @@
+"""
+Tests for the LLM response cache
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+from unittest.mock import patch
+
+from gemini_client import GeminiClient
+from response_cache import MemoryCache, ResponseCache, SQLiteCache, make_key
+
+
+class TestResponseCache(unittest.TestCase):
+    """
+    Test cases for response_cache and its use in GeminiClient
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ResponseCache([MemoryCache(max_entries=2)])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_key_ignores_case_and_whitespace(self):
+        """test normalized inputs map to the same key"""
+        self.assertEqual(
+            make_key("parse_goal", {"goal": "Save $500  for Vacation "}),
+            make_key("parse_goal", {"goal": "save $500 for vacation"}),
+        )
+
+    def test_get_or_load_counts_hits_and_misses(self):
+        """test the loader runs once and later calls are hits"""
+        calls = []
+        loader = lambda: calls.append(1) or {"ok": True}
+        self.cache.get_or_load("generate_streak_message", {"current_streak": 3}, loader)
+        value = self.cache.get_or_load("generate_streak_message", {"current_streak": 3}, loader)
+        self.assertEqual({"ok": True}, value)
+        self.assertEqual(1, len(calls))
+        self.assertEqual({"hits": 1, "misses": 1}, self.cache.stats()["generate_streak_message"])
+
+    def test_uncacheable_results_are_not_stored(self):
+        """test errors returned by the loader are not cached"""
+        loader = lambda: {"error": "Failed to generate response"}
+        self.cache.get_or_load("generate_achievement_message", {}, loader, lambda r: "error" not in r)
+        hit, _ = self.cache.get("generate_achievement_message", {})
+        self.assertFalse(hit)
+
+    def test_method_without_ttl_bypasses_cache(self):
+        """test generate_challenge is never cached"""
+        calls = []
+        for _ in range(2):
+            self.cache.get_or_load("generate_challenge", {}, lambda: calls.append(1) or {})
+        self.assertEqual(2, len(calls))
+        self.assertEqual({}, self.cache.stats())
+
+    def test_memory_tier_expires_and_evicts(self):
+        """test TTL expiry and LRU eviction"""
+        tier = MemoryCache(max_entries=2)
+        tier.set("a", "1", ttl=60)
+        tier.set("b", "2", ttl=60)
+        tier.get("a")
+        tier.set("c", "3", ttl=60)
+        self.assertIsNone(tier.get("b"))
+        self.assertEqual("1", tier.get("a"))
+        with patch("response_cache.time.time", return_value=time.time() + 120):
+            self.assertIsNone(tier.get("a"))
+
+    def test_sqlite_tier_is_shared_and_promoted(self):
+        """test a value written by one worker is served to another"""
+        path = os.path.join(self.tmpdir, "cache.db")
+        writer = ResponseCache([MemoryCache(), SQLiteCache(path)])
+        writer.set("parse_goal", {"goal": "car"}, {"amount": 0})
+        memory = MemoryCache()
+        reader = ResponseCache([memory, SQLiteCache(path)])
+        self.assertEqual((True, {"amount": 0}), reader.get("parse_goal", {"goal": "car"}))
+        self.assertIsNotNone(memory.get(make_key("parse_goal", {"goal": "car"})))
+
+    def test_promoted_entry_keeps_its_deadline(self):
+        """test a value promoted from disk expires when it was written to, not a full TTL later"""
+        path = os.path.join(self.tmpdir, "cache.db")
+        now = time.time()
+        ttls = {"generate_streak_message": 100}
+        with patch("response_cache.time.time", return_value=now):
+            ResponseCache([SQLiteCache(path)], ttls).set("generate_streak_message", {"n": 1}, {"ok": True})
+        memory = MemoryCache()
+        reader = ResponseCache([memory, SQLiteCache(path)], ttls)
+        with patch("response_cache.time.time", return_value=now + 90):
+            self.assertTrue(reader.get("generate_streak_message", {"n": 1})[0])
+        with patch("response_cache.time.time", return_value=now + 101):
+            self.assertIsNone(memory.get(make_key("generate_streak_message", {"n": 1})))
+            self.assertFalse(reader.get("generate_streak_message", {"n": 1})[0])
+
+    def test_sqlite_tier_shares_a_connection_across_greenlets(self):
+        """test gevent workers open one cache connection per OS thread, not per request"""
+        script = textwrap.dedent("""
+            from gevent import monkey; monkey.patch_all()
+            import sys, gevent
+            from response_cache import SQLiteCache
+            tier = SQLiteCache(sys.argv[1])
+            conns = gevent.joinall([gevent.spawn(lambda: id(tier._conn())) for _ in range(5)])
+            print(len({greenlet.value for greenlet in conns}))
+        """)
+        backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, "-c", script, os.path.join(self.tmpdir, "cache.db")],
+                                cwd=backend, capture_output=True, text=True, timeout=30)
+        self.assertEqual("1", result.stdout.strip(), result.stderr)
+
+    def test_client_parse_goal_is_cached_and_keeps_raw_text(self):
+        """test repeated goals skip Gemini and echo the caller's text"""
+        client = GeminiClient(api_key="test", cache=self.cache)
+        parsed = {"amount": 500, "emoji": "🏖️", "description": "vacation",
+                  "category": "vacation", "raw_text": "Save $500 for vacation"}
+        with patch.object(client, "_request_goal_parsing", return_value=parsed) as request:
+            client.parse_goal("Save $500 for vacation")
+            result = client.parse_goal("SAVE $500 for vacation")
+        self.assertEqual(1, request.call_count)
+        self.assertEqual("SAVE $500 for vacation", result["raw_text"])
@@ -0,0 +1,132 @@
+"""
+Tests for streamed challenge generation
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import requests
+from werkzeug.serving import make_server
+
+import main
+from gemini_client import GeminiClient
+from http_session import create_session
+from streaming import JsonFieldStream
+from tests.gemini_stub import DEFAULT_TEXT, GeminiStub, split_text
+
+PROFILE = {"balance": 2500.0, "transactions": [], "transaction_count": 0, "recent_spending": 0}
+
+
+class TestJsonFieldStream(unittest.TestCase):
+    """
+    Test cases for the incremental JSON field parser
+    """
+
+    def test_fields_emitted_in_order_across_any_split(self):
+        """test every chunking of the text yields the same fields"""
+        text = "```json\n" + DEFAULT_TEXT + "\n```"
+        for size in (1, 3, 7, 50, len(text)):
+            parser = JsonFieldStream()
+            fields = []
+            for i in range(0, len(text), size):
+                fields.extend(parser.feed(text[i:i + size]))
+            self.assertEqual(list(json.loads(DEFAULT_TEXT).items()), fields)
+            self.assertTrue(parser.done)
+
+    def test_field_emitted_before_object_completes(self):
+        """test title is available before the rest of the answer arrives"""
+        parser = JsonFieldStream()
+        self.assertEqual([], parser.feed('{"title": "Save, \\"now\\"'))
+        self.assertEqual([("title", 'Save, "now"')], parser.feed('", "tips": ["a", '))
+        self.assertEqual([("tips", ["a", "b"])], parser.feed('"b"]}'))
+
+
+class TestStreamChallenge(unittest.TestCase):
+    """
+    Test cases for GeminiClient.stream_challenge and the SSE route
+    """
+
+    def _client(self, stub):
+        return GeminiClient(api_key="test", base_url=stub.base_url, session=create_session())
+
+    def test_first_field_arrives_before_stream_ends(self):
+        """test time-to-first-field is shorter than the whole stream"""
+        with GeminiStub(chunk_delay=0.05) as stub:
+            start = time.monotonic()
+            events = []
+            for event in self._client(stub).stream_challenge(PROFILE):
+                events.append((event, time.monotonic() - start))
+        self.assertEqual(("field", "title", "Stub Challenge"), events[0][0])
+        self.assertLess(events[0][1], events[-1][1] - 0.1)
+        self.assertEqual(list(json.loads(DEFAULT_TEXT)), [name for (_, name, _), _ in events])
+
+    def test_truncated_stream_resets_to_fallback(self):
+        """test an incomplete answer is replaced by a fallback challenge"""
+        chunks = split_text(DEFAULT_TEXT, 8)[:4]
+        with GeminiStub(stream_responder=lambda path, body: chunks) as stub:
+            events = list(self._client(stub).stream_challenge(PROFILE))
+        resets = [i for i, (event, _, _) in enumerate(events) if event == "reset"]
+        self.assertEqual(1, len(resets))
+        fallback = dict((name, value) for _, name, value in events[resets[0] + 1:])
+        self.assertEqual(set(GeminiClient.CHALLENGE_FIELDS), set(fallback))
+
+    def test_route_streams_server_sent_events(self):
+        """test /challenges/<id>/stream emits field events then done"""
+        context = {"balance": 2500.0, "transactions": [], "partial": [], "goal": None}
+        with GeminiStub() as stub, tempfile.TemporaryDirectory() as tmpdir, \
+                patch("database.DB_PATH", os.path.join(tmpdir, "test.db")), \
+                patch("main.get_gemini_client", return_value=self._client(stub)), \
+                patch("main.get_user_context", return_value=context), \
+                patch("main.save_challenge") as save, \
+                patch.object(main.challenge_queue, "pop", return_value=None):
+            client = main.create_app().test_client()
+            response = client.get("/challenges/alice/stream", headers={"Authorization": "Bearer token"})
+            body = response.get_data(as_text=True)
+        self.assertEqual("text/event-stream", response.mimetype)
+        events = [block.split("\n") for block in body.strip().split("\n\n")]
+        self.assertEqual("event: field", events[0][0])
+        self.assertEqual({"title": "Stub Challenge"}, json.loads(events[0][1][len("data: "):]))
+        self.assertEqual("event: done", events[-1][0])
+        self.assertEqual(2500.0, json.loads(events[-1][1][len("data: "):])["user_balance"])
+        save.assert_called_once()
+
+    def test_browser_fetch_reads_fields_as_they_arrive(self):
+        """test a cross-origin fetch with the bearer token, as the frontend makes it, gets fields before done"""
+        context = {"balance": 2500.0, "transactions": [], "partial": [], "goal": None}
+        with GeminiStub(chunk_delay=0.05) as stub, tempfile.TemporaryDirectory() as tmpdir, \
+                patch("database.DB_PATH", os.path.join(tmpdir, "test.db")), \
+                patch("main.get_gemini_client", return_value=self._client(stub)), \
+                patch("main.get_user_context", return_value=context), \
+                patch("main.save_challenge"), \
+                patch.object(main.challenge_queue, "pop", return_value=None):
+            server = make_server("127.0.0.1", 0, main.create_app(), threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{server.server_port}/challenges/alice/stream"
+            origin = {"Origin": "http://frontend.example"}
+            try:
+                preflight = requests.options(url, headers={
+                    **origin, "Access-Control-Request-Method": "GET",
+                    "Access-Control-Request-Headers": "authorization"})
+                start = time.monotonic()
+                response = requests.get(url, stream=True, headers={
+                    **origin, "Authorization": "Bearer token", "Accept": "text/event-stream"})
+                # Split frames the way api.js does, noting when each arrives
+                frames, buffer = [], ""
+                for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                    buffer += chunk
+                    while "\n\n" in buffer:
+                        frame, buffer = buffer.split("\n\n", 1)
+                        frames.append((frame.split("\n"), time.monotonic() - start))
+                response.close()
+            finally:
+                server.shutdown()
+        self.assertEqual(200, preflight.status_code)
+        self.assertIn("authorization", preflight.headers["Access-Control-Allow-Headers"].lower())
+        self.assertEqual("http://frontend.example", response.headers["Access-Control-Allow-Origin"])
+        self.assertEqual(["event: field", 'data: {"title": "Stub Challenge"}'], frames[0][0])
+        self.assertEqual("event: done", frames[-1][0][0])
+        self.assertLess(frames[0][1], frames[-1][1] - 0.1)
@@ -0,0 +1,85 @@
+"""
+Tests for transaction feature extraction and the prompts built from it
+"""
+import unittest
+
+from gemini_client import GeminiClient
+from http_session import create_session
+from tests.gemini_stub import GeminiStub, canned_responder
+from transaction_features import TOP_PAYEES, categorize, describe, summarize_transactions
+
+DEMO = [
+    {"amount": 250000, "fromAccountNum": "demo_user", "toAccountNum": "demo_user", "description": "Initial deposit"},
+    {"amount": -1500, "description": "Coffee purchase"},
+    {"amount": -7500, "description": "Lunch"},
+]
+
+
+def ledger(account, to, amount, day, month=1):
+    """A transaction as the ledger returns it: positive cents, no description"""
+    return {"fromAccountNum": account, "toAccountNum": to, "amount": amount,
+            "timestamp": f"2025-{month:02d}-{day:02d}T09:00:00.000+00:00"}
+
+
+class TestSummarizeTransactions(unittest.TestCase):
+    """
+    Test cases for the fixed-size transaction summary
+    """
+
+    def test_demo_history(self):
+        """test described transactions are split into income and categories"""
+        features = summarize_transactions(DEMO)
+        self.assertEqual((3, 2500.0, 90.0), (features["transactions"], features["income"], features["outflow"]))
+        self.assertEqual([["dining", 75.0], ["coffee", 15.0]], features["categories"])
+        self.assertEqual(["lunch", 75.0], features["largest_outflow"])
+
+    def test_ledger_direction_and_recurring(self):
+        """test ledger amounts take their direction from the account and monthly payments recur"""
+        history = [ledger("1011226111", "2000000001", 120000, 1, month) for month in (1, 2, 3)]
+        history += [ledger("3000000002", "1011226111", 300000, 15, month) for month in (1, 2, 3)]
+        history.append(ledger("1011226111", "4000000003", 4000, 20))
+        features = summarize_transactions(history, account_id="1011226111")
+        self.assertEqual((9000.0, 3640.0), (features["income"], features["outflow"]))
+        self.assertEqual([["transfers", 3640.0]], features["categories"])
+        self.assertEqual([{"label": "account ...0001", "amount": 1200.0, "count": 3, "cadence": "monthly"}],
+                         features["recurring"])
+        self.assertEqual(73, features["period_days"])
+
+    def test_size_is_fixed(self):
+        """test a long history gives a summary no bigger than a short one's limits"""
+        history = [{"amount": -(100 + i), "description": f"Shop {i}"} for i in range(1000)]
+        features = summarize_transactions(history)
+        self.assertEqual(1000, features["transactions"])
+        self.assertEqual(TOP_PAYEES, len(features["top_payees"]))
+        self.assertLess(len(describe(features)), 400)
+
+    def test_bad_rows_and_empty_history(self):
+        """test rows without a numeric amount are skipped"""
+        features = summarize_transactions([{"amount": "12"}, "x", None])
+        self.assertEqual(0, features["transactions"])
+        self.assertEqual("No transaction history", describe(features))
+        self.assertEqual("utilities", categorize("Gas bill"))
+        self.assertEqual("transport", categorize("Gas"))
+
+
+class TestPrompts(unittest.TestCase):
+    """
+    Test cases for prompts built from transaction features
+    """
+
+    def test_prompts_use_summary(self):
+        """test task prompts name payees while challenge prompts only give categories"""
+        features = summarize_transactions(DEMO)
+        with GeminiStub(responder=canned_responder) as stub:
+            client = GeminiClient(api_key="test", base_url=stub.base_url, session=create_session())
+            client.generate_additional_tasks({"balance": 2500, "features": features, "user_goal": "Save $500"})
+            client.generate_challenge({"balance": 2500, "recent_spending": -90, "features": features})
+            tasks, challenge = [r["body"]["contents"][0]["parts"][0]["text"] for r in stub.requests]
+        self.assertIn("Top payees: lunch $75.00 (1x)", tasks)
+        self.assertNotIn("'description'", tasks)
+        self.assertIn("Spending by category: dining $75.00 (83%), coffee $15.00 (17%)", challenge)
+        self.assertNotIn("lunch", challenge)
+
+
+if __name__ == '__main__':
+    unittest.main()
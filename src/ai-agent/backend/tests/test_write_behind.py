@@ -0,0 +1,102 @@
+"""
+Tests for write-behind batching of challenge inserts
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import database
+import metrics
+from write_behind import WriteBehindQueue
+
+CHALLENGE = {"title": "No Takeout", "challenge": "Cook at home for 3 days", "difficulty": "easy",
+             "category": "food", "xp_reward": 50, "time_to_complete": "3 days"}
+
+
+def _count_challenges(user_id):
+    return database.get_conn().execute(
+        "SELECT COUNT(*) FROM challenges WHERE user_id=?", (user_id,)).fetchone()[0]
+
+
+class TestWriteBehind(unittest.TestCase):
+    """
+    Test cases for WriteBehindQueue and save_challenge durability modes
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_patch = patch("database.DB_PATH", os.path.join(self.tmpdir, "test.db"))
+        self.db_patch.start()
+        database.init_db()
+
+    def tearDown(self):
+        database.flush_writes(5)
+        database.close_conn()
+        self.db_patch.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_rows_committed_in_one_batch(self):
+        """test writes arriving together share one transaction"""
+        writer = WriteBehindQueue(database.get_conn, max_rows=100, max_delay=0.5)
+        for _ in range(50):
+            writer.submit(database._insert_challenge, "alice", CHALLENGE, 'active')
+        self.assertTrue(writer.flush(5))
+        self.assertEqual(1, writer.batches)
+        self.assertEqual(50, _count_challenges("alice"))
+
+    def test_batch_flushed_at_max_rows(self):
+        """test a full batch is committed without waiting for the delay"""
+        writer = WriteBehindQueue(database.get_conn, max_rows=10, max_delay=30)
+        for _ in range(10):
+            writer.submit(database._insert_challenge, "alice", CHALLENGE, 'active')
+        self.assertTrue(writer.flush(5))
+        self.assertEqual(10, _count_challenges("alice"))
+
+    def test_failing_write_does_not_drop_batch(self):
+        """test a bad write is dropped and the rest of its batch still lands"""
+        def broken(cur, *args):
+            cur.execute("INSERT INTO missing_table VALUES (1)")
+
+        writer = WriteBehindQueue(database.get_conn, max_rows=100, max_delay=0.5)
+        writer.submit(database._insert_challenge, "alice", CHALLENGE, 'active')
+        writer.submit(broken)
+        writer.submit(database._insert_challenge, "alice", CHALLENGE, 'active')
+        self.assertTrue(writer.flush(5))
+        self.assertEqual(1, writer.failed)
+        self.assertEqual(2, _count_challenges("alice"))
+
+    def test_dropped_writes_are_exported(self):
+        """test writes dropped by the storage's queue show up in the metrics"""
+        def broken(cur, *args):
+            cur.execute("INSERT INTO missing_table VALUES (1)")
+
+        def dropped():
+            for line in metrics.REGISTRY.render().splitlines():
+                if line.startswith("db_write_behind_failed_total "):
+                    return float(line.split()[1])
+
+        writer = database.get_storage().write_behind
+        before = dropped()
+        writer.submit(broken)
+        self.assertTrue(database.flush_writes(5))
+        self.assertEqual(before + 1, dropped())
+
+    def test_save_challenge_batched_mode(self):
+        """test save_challenge returns before the row is committed, flush commits it"""
+        with patch("database.DB_DURABILITY", "batched"):
+            database.save_challenge("bob", CHALLENGE)
+        self.assertTrue(database.flush_writes(5))
+        self.assertEqual(1, _count_challenges("bob"))
+
+    def test_save_challenge_sync_mode(self):
+        """test sync durability commits inside the call"""
+        with patch("database.DB_DURABILITY", "sync"):
+            database.save_challenge("carol", CHALLENGE)
+        self.assertEqual(0, database.write_behind.pending())
+        self.assertEqual(1, _count_challenges("carol"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,19 @@
+"""
+Bank of Anthos style JWTs signed with a throwaway key, used by tests
+"""
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+_PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+PUBLIC_KEY = _PRIVATE_KEY.public_key().public_bytes(
+    serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+).decode()
+
+
+def auth_header(account, private_key=_PRIVATE_KEY):
+    """Authorization header carrying a token for ``account``, as the userservice issues"""
+    token = jwt.encode({"user": f"user-{account}", "acct": account, "name": "Test User"},
+                       private_key, algorithm="RS256")
+    return {"Authorization": f"Bearer {token}"}
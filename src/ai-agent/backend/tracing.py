@@ -0,0 +1,61 @@
+import threading
+from contextlib import contextmanager
+
+# Spans are exported to Cloud Trace once setup() has run (ENABLE_TRACING=true,
+# see main.create_app). Without that, or without OpenTelemetry installed,
+# every call here is a no-op.
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+_tracer = trace.get_tracer(__name__) if trace is not None else None
+_provider_lock = threading.Lock()
+_provider_set = False
+
+
+def setup(app):
+    """Export spans to Cloud Trace and trace ``app``'s requests, the same way
+    the Bank of Anthos services do. Runs in each worker, after the fork, so
+    the exporting thread belongs to the worker."""
+    global _provider_set
+    from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+    from opentelemetry.instrumentation.flask import FlaskInstrumentor
+    from opentelemetry.propagate import set_global_textmap
+    from opentelemetry.propagators.cloud_trace_propagator import CloudTraceFormatPropagator
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    with _provider_lock:
+        if not _provider_set:
+            trace.set_tracer_provider(TracerProvider())
+            trace.get_tracer_provider().add_span_processor(BatchSpanProcessor(CloudTraceSpanExporter()))
+            set_global_textmap(CloudTraceFormatPropagator())
+            _provider_set = True
+    FlaskInstrumentor().instrument_app(app)
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name, **attributes):
+    """Start a span as a child of the current one; yields it for attributes"""
+    if _tracer is None:
+        yield _NOOP_SPAN
+        return
+    with _tracer.start_as_current_span(name) as current:
+        current.set_attributes({key: value for key, value in attributes.items() if value is not None})
+        yield current
+
+
+def current_span():
+    return trace.get_current_span() if trace is not None else _NOOP_SPAN
@@ -0,0 +1,168 @@
+from collections import defaultdict
+from datetime import datetime
+
+# Description keywords per spending category, checked in order (so "gas
+# bill" is a utility before "gas" is transport)
+CATEGORY_KEYWORDS = [
+    ("income", ("salary", "payroll", "paycheck", "deposit", "refund", "interest", "dividend")),
+    ("housing", ("rent", "mortgage")),
+    ("utilities", ("utilit", "electric", "water", "gas bill", "internet", "phone")),
+    ("subscriptions", ("subscription", "netflix", "spotify", "hulu", "prime", "gym", "membership")),
+    ("coffee", ("coffee", "starbucks", "cafe")),
+    ("dining", ("lunch", "dinner", "breakfast", "restaurant", "dining", "takeout", "pizza", "burger")),
+    ("groceries", ("grocer", "supermarket", "market")),
+    ("transport", ("gas", "fuel", "uber", "lyft", "transit", "parking", "taxi")),
+    ("entertainment", ("entertainment", "movie", "concert", "game", "bar")),
+    ("shopping", ("shopping", "amazon", "store", "clothes", "purchase")),
+]
+
+# Sizes of the summary's lists, so prompts stay the same size for any history
+TOP_CATEGORIES = 5
+TOP_PAYEES = 3
+TOP_RECURRING = 3
+
+
+def categorize(label):
+    label = label.lower()
+    for category, keywords in CATEGORY_KEYWORDS:
+        if any(keyword in label for keyword in keywords):
+            return category
+    return "other"
+
+
+def _timestamp(value):
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _flow(transaction, account_id):
+    """(label, signed dollars, timestamp) for a ledger transaction, or None.
+
+    Demo and local data carry a description and negative outflows; the
+    ledger itself has positive cent amounts whose direction comes from the
+    account numbers, and no description, so the counterparty labels it.
+    """
+    if not isinstance(transaction, dict) or not isinstance(transaction.get("amount"), (int, float)):
+        return None
+    amount = transaction["amount"] / 100
+    sender, receiver = transaction.get("fromAccountNum"), transaction.get("toAccountNum")
+    if amount > 0 and account_id is not None and sender == str(account_id) and receiver != sender:
+        amount = -amount
+    label = " ".join(str(transaction.get("description") or "").lower().split())[:40]
+    if not label:
+        counterparty = receiver if amount < 0 else sender
+        label = f"account ...{str(counterparty)[-4:]}" if counterparty else "unknown"
+    return label, amount, _timestamp(transaction.get("timestamp"))
+
+
+def _cadence(times):
+    """'weekly', 'monthly' or None for the timestamps of repeated payments"""
+    times = sorted(t for t in times if t is not None)
+    gaps = [(b - a) / 86400 for a, b in zip(times, times[1:])]
+    if not gaps:
+        return None
+    mean = sum(gaps) / len(gaps)
+    if any(abs(gap - mean) > 0.2 * mean for gap in gaps):
+        return None
+    if 5 <= mean <= 9:
+        return "weekly"
+    if 25 <= mean <= 35:
+        return "monthly"
+    return None
+
+
+def summarize_transactions(transactions, account_id=None):
+    """Fixed-size features of a transaction history (ledger cents in, dollars out).
+
+    Category and payee totals, income against outflow, the largest outflow
+    and payments that recur: at least three at the same payee and amount
+    (within 5%), or two or more at a weekly or monthly rhythm.
+    """
+    income = outflow = 0.0
+    by_payee = defaultdict(lambda: [0.0, 0])
+    payments = defaultdict(list)  # label -> [(amount, timestamp)]
+    largest = None
+    times = []
+    count = 0
+    for transaction in transactions or []:
+        flow = _flow(transaction, account_id)
+        if flow is None:
+            continue
+        label, amount, timestamp = flow
+        count += 1
+        if timestamp is not None:
+            times.append(timestamp)
+        if amount >= 0:
+            income += amount
+            continue
+        spent = -amount
+        outflow += spent
+        payee = by_payee[label]
+        payee[0] += spent
+        payee[1] += 1
+        payments[label].append((spent, timestamp))
+        if largest is None or spent > largest[1]:
+            largest = (label, spent)
+
+    # Categorized per payee rather than per transaction: far fewer lookups
+    by_category = defaultdict(float)
+    for label, (total, _) in by_payee.items():
+        category = categorize(label)
+        by_category["transfers" if category == "other" and label.startswith("account ") else category] += total
+
+    recurring = []
+    for label, paid in payments.items():
+        typical = sorted(amount for amount, _ in paid)[len(paid) // 2]
+        similar = [(amount, t) for amount, t in paid if abs(amount - typical) <= 0.05 * typical]
+        cadence = _cadence([t for _, t in similar]) if len(similar) >= 2 else None
+        if len(similar) >= 3 or cadence:
+            recurring.append({"label": label, "amount": round(typical, 2), "count": len(similar),
+                              "cadence": cadence or "repeated"})
+    recurring.sort(key=lambda r: r["amount"] * r["count"], reverse=True)
+
+    return {
+        "transactions": count,
+        "period_days": round((max(times) - min(times)) / 86400) if len(times) > 1 else None,
+        "income": round(income, 2),
+        "outflow": round(outflow, 2),
+        "categories": [[category, round(total, 2)] for category, total in
+                       sorted(by_category.items(), key=lambda item: item[1], reverse=True)[:TOP_CATEGORIES]],
+        "top_payees": [[label, round(total, 2), n] for label, (total, n) in
+                       sorted(by_payee.items(), key=lambda item: item[1][0], reverse=True)[:TOP_PAYEES]],
+        "recurring": recurring[:TOP_RECURRING],
+        "largest_outflow": [largest[0], round(largest[1], 2)] if largest else None,
+    }
+
+
+def describe(features, payees=True):
+    """The summary as a few prompt lines.
+
+    ``payees=False`` leaves out payee names, for prompts whose answers are
+    shared between users with similar finances (queued challenges).
+    """
+    if not features or not features["transactions"]:
+        return "No transaction history"
+    period = f" over {features['period_days']} days" if features.get("period_days") else ""
+    net = features["income"] - features["outflow"]
+    lines = [f"{features['transactions']} transactions{period}: income ${features['income']:,.2f}, "
+             f"spending ${features['outflow']:,.2f} (net {'+' if net >= 0 else '-'}${abs(net):,.2f})"]
+    if features["categories"]:
+        total = features["outflow"] or 1
+        lines.append("Spending by category: " + ", ".join(
+            f"{category} ${amount:,.2f} ({amount / total:.0%})" for category, amount in features["categories"]))
+    if payees and features["top_payees"]:
+        lines.append("Top payees: " + ", ".join(
+            f"{label} ${amount:,.2f} ({n}x)" for label, amount, n in features["top_payees"]))
+    if features["recurring"]:
+        if payees:
+            lines.append("Recurring: " + ", ".join(
+                f"{r['label']} ${r['amount']:,.2f} {r['cadence']}" for r in features["recurring"]))
+        else:
+            lines.append(f"Recurring payments: {len(features['recurring'])} "
+                         f"(${sum(r['amount'] for r in features['recurring']):,.2f} each cycle)")
+    if payees and features["largest_outflow"]:
+        label, amount = features["largest_outflow"]
+        lines.append(f"Largest payment: {label} ${amount:,.2f}")
+    return "\n".join(lines)
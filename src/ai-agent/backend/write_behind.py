@@ -0,0 +1,110 @@
+import os
+import queue
+import threading
+import time
+
+
+class WriteBehindQueue:
+    """Apply database writes on a background thread in batched transactions.
+
+    ``submit(op, *args)`` queues ``op(cursor, *args)`` and returns at once.
+    The writer thread collects up to ``max_rows`` writes, or whatever arrived
+    within ``max_delay`` seconds of the first one, and commits them together,
+    so request threads never wait on a commit. If a batch fails, its writes
+    are retried one at a time and only the failing ones are dropped.
+    ``connect`` returns a DB-API connection; ``release``, if given, is called
+    with it after every batch (e.g. to return it to a pool).
+    """
+
+    def __init__(self, connect, max_rows=100, max_delay=0.05, release=None):
+        self.connect = connect
+        self.release = release
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.batches = 0
+        self.rows = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, op, *args):
+        with self._cond:
+            if self._pid != os.getpid():
+                # First write, or first in a forked worker: the parent's thread
+                # and queued writes did not come with us
+                self._queue = queue.Queue()
+                self._pending = 0
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+                self._thread.start()
+            self._pending += 1
+            self._queue.put((op, args))
+
+    def flush(self, timeout=None):
+        """Wait until every submitted write is committed; False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def pending(self):
+        return self._pending
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                conn = self.connect()
+                try:
+                    self._apply(conn, batch)
+                finally:
+                    if self.release is not None:
+                        self.release(conn)
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"Dropped {len(batch)} writes, no database connection: {e}")
+            finally:
+                with self._cond:
+                    self._pending -= len(batch)
+                    self._cond.notify_all()
+
+    def _apply(self, conn, batch):
+        try:
+            cur = conn.cursor()
+            for op, args in batch:
+                op(cur, *args)
+            conn.commit()
+            self.batches += 1
+            self.rows += len(batch)
+            return
+        except Exception as e:
+            conn.rollback()
+            print(f"Batched write of {len(batch)} rows failed, retrying one by one: {e}")
+        for op, args in batch:
+            try:
+                op(conn.cursor(), *args)
+                conn.commit()
+                self.rows += 1
+            except Exception as e:
+                conn.rollback()
+                self.failed += 1
+                print(f"Dropped write {op.__name__}{args!r}: {e}")
+
+    def collect(self):
+        """Metric families for metrics.REGISTRY"""
+        return [
+            ("db_write_behind_batches_total", "counter", "Batched transactions committed", [("", {}, self.batches)]),
+            ("db_write_behind_rows_total", "counter", "Writes committed by the write-behind queue", [("", {}, self.rows)]),
+            ("db_write_behind_failed_total", "counter", "Writes dropped after failing on their own", [("", {}, self.failed)]),
+            ("db_write_behind_pending", "gauge", "Writes waiting to be committed", [("", {}, self._pending)]),
+        ]
@@ -293,15 +293,23 @@ function ChallengeList({ bankAPI, userProfile, onXPGained, onChallengeCompleted
   const [challenge, setChallenge] = useState(null);
   const [loading, setLoading] = useState(true);
   const [fetchingNew, setFetchingNew] = useState(false);
+  const [streaming, setStreaming] = useState(false);
   const [challengeCompleted, setChallengeCompleted] = useState(false);
   const [showModal, setShowModal] = useState(false);
   const [showDeleteConfirm, setShowDeleteConfirm] = useState(false);
 
   const fetchChallenge = useCallback(async () => {
     setLoading(true);
+    setStreaming(true);
     setChallengeCompleted(false);
     try {
-      const data = await bankAPI.getChallenge();
+      const data = await bankAPI.streamChallenge((partial) => {
+        // Show the challenge as soon as its first fields arrive
+        if (Object.keys(partial).length > 0) {
+          setChallenge(partial);
+          setLoading(false);
+        }
+      });
       setChallenge(data);
     } catch (error) {
       console.error('Error fetching challenge:', error);
@@ -321,6 +329,7 @@ function ChallengeList({ bankAPI, userProfile, onXPGained, onChallengeCompleted
       });
     } finally {
       setLoading(false);
+      setStreaming(false);
     }
   }, [bankAPI]);
 
@@ -339,6 +348,9 @@ function ChallengeList({ bankAPI, userProfile, onXPGained, onChallengeCompleted
 
   const handleCompleteChallenge = () => {
     setChallengeCompleted(true);
+    if (challenge?.challenge) {
+      bankAPI.completeChallenge(challenge.challenge);
+    }
     if (onXPGained && challenge?.xp_reward) {
       onXPGained(challenge.xp_reward);
     }
@@ -428,6 +440,7 @@ function ChallengeList({ bankAPI, userProfile, onXPGained, onChallengeCompleted
               <button 
                 className="challenge-btn primary compact" 
                 onClick={handleCompleteChallenge}
+                disabled={streaming}
               >
                 Complete (+{challenge.xp_reward} XP)
               </button>
@@ -533,6 +546,7 @@ function ChallengeList({ bankAPI, userProfile, onXPGained, onChallengeCompleted
                       handleCompleteChallenge();
                       setShowModal(false);
                     }}
+                    disabled={streaming}
                   >
                     Complete Challenge (+{challenge.xp_reward} XP)
                   </button>
@@ -1,5 +1,19 @@
 import axios from 'axios';
 
+// One Server-Sent Events frame ("event: ...\ndata: {...}") as { event, data }
+function parseEvent(frame) {
+  let event = 'message';
+  const data = [];
+  frame.split('\n').forEach((line) => {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      data.push(line.slice(5).trimStart());
+    }
+  });
+  return { event, data: data.length ? JSON.parse(data.join('\n')) : null };
+}
+
 class BankAPI {
   constructor(config) {
     this.bankUrl = config.bankUrl;
@@ -97,6 +111,71 @@ class BankAPI {
     }
   }
 
+  // Stream a challenge field by field from /challenges/<id>/stream. This reads
+  // the Server-Sent Events with fetch rather than EventSource, which cannot
+  // send the Authorization header. onUpdate gets the challenge as assembled so
+  // far; resolves with the complete challenge, or getChallenge()'s answer if
+  // the stream fails.
+  async streamChallenge(onUpdate) {
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), 30000);
+    try {
+      const response = await fetch(`${this.aiAgentUrl}/challenges/${this.userId}/stream`, {
+        headers: {
+          'Authorization': `Bearer ${this.jwtToken}`,
+          'Accept': 'text/event-stream'
+        },
+        signal: controller.signal
+      });
+      if (!response.ok || !response.body) {
+        throw new Error(`Challenge stream failed with status ${response.status}`);
+      }
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let challenge = {};
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) {
+          throw new Error('Challenge stream ended before the challenge was complete');
+        }
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const { event, data } = parseEvent(buffer.slice(0, boundary));
+          buffer = buffer.slice(boundary + 2);
+          if (event === 'done') {
+            return data;
+          }
+          // 'reset' means the answer so far is being replaced by a fallback
+          challenge = event === 'reset' ? {} : { ...challenge, ...data };
+          if (onUpdate) {
+            onUpdate(challenge);
+          }
+        }
+      }
+    } catch (error) {
+      console.error('Error streaming challenge:', error);
+      return this.getChallenge();
+    } finally {
+      clearTimeout(timer);
+      controller.abort();
+    }
+  }
+
+  // Record a completed challenge; the server awards the stored XP
+  async completeChallenge(challengeText) {
+    try {
+      const response = await this.apiClient.post(`${this.aiAgentUrl}/challenges/${this.userId}/complete`, {
+        challenge: challengeText
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Error recording challenge completion:', error);
+      return null;
+    }
+  }
+
   // Bank of Anthos API calls (optional for additional features)
   async getBalance() {
     try {